@@ -1,8 +1,94 @@
-from django.db import models
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
 
 # Create your models here.
 
-class SiteSettings(models.Model):
+# Process-local copies of singleton rows: {model: (version, loaded_at, instance)}
+_singleton_instances = {}
+
+class SingletonModel(models.Model):
+    """
+    Base for single-row configuration models.
+
+    ``load()`` serves the row from a per-process copy, so reading settings
+    on every request does not touch the database. Writes go through
+    ``load_for_update()`` so they never save a stale copy over a newer row. Saving or deleting bumps
+    a version number in the shared Django cache; each process compares it
+    before reusing its copy, and also reloads after
+    ``SINGLETON_SETTINGS_MAX_AGE`` seconds in case the cache is not shared
+    between processes.
+    """
+    singleton_defaults = {}
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def _version_key(cls):
+        return f'singleton-version:{cls._meta.label_lower}'
+
+    @classmethod
+    def _get_current(cls, create):
+        version = cache.get_or_set(cls._version_key(), 1, timeout=None)
+        cached = _singleton_instances.get(cls)
+        max_age = getattr(settings, 'SINGLETON_SETTINGS_MAX_AGE', 60)
+        if cached is not None and cached[0] == version and time.monotonic() - cached[1] < max_age:
+            return cached[2]
+        instance = cls.objects.order_by('pk').first()
+        if instance is None:
+            if not create:
+                return None
+            instance = cls(**cls.singleton_defaults)
+            instance.save()
+        _singleton_instances[cls] = (version, time.monotonic(), instance)
+        return instance
+
+    @classmethod
+    def load(cls):
+        """Return the settings row, creating it with defaults if missing."""
+        return copy.copy(cls._get_current(create=True))
+
+    @classmethod
+    def load_for_update(cls):
+        """
+        Return the settings row read from the database and locked, for
+        changing it; the process-local copy may be stale. Call inside
+        ``transaction.atomic()``.
+        """
+        instance = cls.objects.select_for_update().order_by('pk').first()
+        if instance is None:
+            instance = cls(**cls.singleton_defaults)
+            instance.save()
+        return instance
+
+    @classmethod
+    def invalidate_cache(cls):
+        _singleton_instances.pop(cls, None)
+        try:
+            cache.incr(cls._version_key())
+        except ValueError:
+            cache.set(cls._version_key(), 1, timeout=None)
+
+    def save(self, *args, **kwargs):
+        # Ensure only one instance exists: update the existing row instead of adding one
+        if self.pk is None:
+            current = type(self)._get_current(create=False)
+            if current is not None:
+                self.pk = current.pk
+                self._state.adding = False
+        super().save(*args, **kwargs)
+        transaction.on_commit(type(self).invalidate_cache)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(type(self).invalidate_cache)
+        return result
+
+class SiteSettings(SingletonModel):
     site_name = models.CharField(max_length=100)
     site_description = models.TextField(blank=True)
     logo = models.ImageField(upload_to='site/', blank=True, null=True)
@@ -27,17 +113,12 @@ class SiteSettings(models.Model):
         verbose_name = 'Site Settings'
         verbose_name_plural = 'Site Settings'
     
+    singleton_defaults = {'site_name': "My Website"}
+
     def __str__(self):
         return self.site_name
-    
-    def save(self, *args, **kwargs):
-        # Ensure only one instance exists
-        if not self.pk and SiteSettings.objects.exists():
-            # Update existing instance instead of creating a new one
-            self.pk = SiteSettings.objects.first().pk
-        super().save(*args, **kwargs)
 
-class SEOSettings(models.Model):
+class SEOSettings(SingletonModel):
     # Default SEO settings
     default_meta_title = models.CharField(max_length=100)
     default_meta_description = models.TextField()
@@ -64,12 +145,10 @@ class SEOSettings(models.Model):
         verbose_name = 'SEO Settings'
         verbose_name_plural = 'SEO Settings'
     
+    singleton_defaults = {
+        'default_meta_title': "My Website",
+        'default_meta_description': "Welcome to my website",
+    }
+
     def __str__(self):
         return "SEO Settings"
-    
-    def save(self, *args, **kwargs):
-        # Ensure only one instance exists
-        if not self.pk and SEOSettings.objects.exists():
-            # Update existing instance instead of creating a new one
-            self.pk = SEOSettings.objects.first().pk
-        super().save(*args, **kwargs)
@@ -1,3 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from rest_framework.test import APIClient
+
+from .models import SiteSettings, SEOSettings, _singleton_instances
+
+class SingletonSettingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _singleton_instances.clear()
+        self.client = APIClient()
+
+    def test_current_settings_are_served_without_queries(self):
+        response = self.client.get('/api/seo-settings/current/')
+        self.assertEqual(response.data['default_meta_title'], 'My Website')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/seo-settings/current/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_save_invalidates_cached_copy(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            SiteSettings.load()
+        self.assertEqual(SiteSettings.load().site_name, 'My Website')
+
+        admin = User.objects.create_superuser(username='admin', password='testpassword')
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/site-settings/update_settings/', {'site_name': 'Kavosh'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(SiteSettings.load().site_name, 'Kavosh')
+
+    def test_saving_new_instance_updates_the_existing_row(self):
+        first = SiteSettings.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            SiteSettings(site_name='Second').save()
+        self.assertEqual(SiteSettings.objects.count(), 1)
+        self.assertEqual(SiteSettings.objects.get().pk, first.pk)
+        self.assertEqual(SiteSettings.load().site_name, 'Second')
+
+    def test_loaded_copy_is_not_shared(self):
+        SEOSettings.load().default_meta_title = 'Changed in memory'
+        self.assertEqual(SEOSettings.load().default_meta_title, 'My Website')
+
+    def test_update_keeps_changes_missing_from_a_stale_copy(self):
+        SEOSettings.load()
+        # Another process changed the row; this process still holds the old copy.
+        SEOSettings.objects.update(default_meta_description='Set elsewhere')
+
+        admin = User.objects.create_superuser(username='admin', password='testpassword')
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/seo-settings/update_settings/', {'default_meta_title': 'Kavosh'})
+        self.assertEqual(response.status_code, 200)
+        row = SEOSettings.objects.get()
+        self.assertEqual(row.default_meta_title, 'Kavosh')
+        self.assertEqual(row.default_meta_description, 'Set elsewhere')
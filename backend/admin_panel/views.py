@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
@@ -19,22 +20,19 @@ class SiteSettingsViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def current(self, request):
-        settings = SiteSettings.objects.first()
-        if not settings:
-            # Create default settings if none exist
-            settings = SiteSettings.objects.create(site_name="My Website")
+        # Served from the process-level copy; creates default settings if none exist
+        settings = SiteSettings.load()
         serializer = self.get_serializer(settings)
         return Response(serializer.data)
     
     @action(detail=False, methods=['post', 'put'], permission_classes=[permissions.IsAdminUser])
     def update_settings(self, request):
-        settings = SiteSettings.objects.first()
-        if not settings:
-            settings = SiteSettings.objects.create(site_name="My Website")
-        
-        serializer = self.get_serializer(settings, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # Change the current row, not the process-level copy, which may be stale
+        with transaction.atomic():
+            settings = SiteSettings.load_for_update()
+            serializer = self.get_serializer(settings, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
         return Response(serializer.data)
 
 class SEOSettingsViewSet(viewsets.ModelViewSet):
@@ -48,26 +46,17 @@ class SEOSettingsViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def current(self, request):
-        settings = SEOSettings.objects.first()
-        if not settings:
-            # Create default settings if none exist
-            settings = SEOSettings.objects.create(
-                default_meta_title="My Website",
-                default_meta_description="Welcome to my website"
-            )
+        # Served from the process-level copy; creates default settings if none exist
+        settings = SEOSettings.load()
         serializer = self.get_serializer(settings)
         return Response(serializer.data)
     
     @action(detail=False, methods=['post', 'put'], permission_classes=[permissions.IsAdminUser])
     def update_settings(self, request):
-        settings = SEOSettings.objects.first()
-        if not settings:
-            settings = SEOSettings.objects.create(
-                default_meta_title="My Website",
-                default_meta_description="Welcome to my website"
-            )
-        
-        serializer = self.get_serializer(settings, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # Change the current row, not the process-level copy, which may be stale
+        with transaction.atomic():
+            settings = SEOSettings.load_for_update()
+            serializer = self.get_serializer(settings, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
         return Response(serializer.data)
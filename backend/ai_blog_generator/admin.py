@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import AIBlogRequest, AIBlogGeneration
+from .models import AIBlogRequest, AIBlogGeneration, LLMCall
+from .telemetry import usage_by_batch, usage_by_user, usage_totals
 
 class AIBlogGenerationInline(admin.StackedInline):
     model = AIBlogGeneration
@@ -76,3 +77,34 @@ class AIBlogGenerationAdmin(admin.ModelAdmin):
         self.message_user(request, f"Successfully published {published_count} blog posts.")
     
     publish_blog_posts.short_description = "Publish selected blog posts"
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    """
+    Per-call LLM telemetry. The changelist also reports usage and cost
+    totals per user and per batch for the calls matching its filters.
+    """
+    list_display = ('created_at', 'purpose', 'model', 'user', 'request', 'prompt_tokens', 'completion_tokens',
+                    'latency_ms', 'ttft_ms', 'retries', 'cache_hit', 'cost_usd', 'success')
+    list_filter = ('purpose', 'model', 'success', 'cache_hit', 'created_at')
+    search_fields = ('user__username', 'request__topic', 'batch__topic')
+    list_select_related = ('user', 'request')
+    raw_id_fields = ('request', 'batch', 'user')
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+        response.context_data['usage_totals'] = usage_totals(queryset)
+        response.context_data['usage_by_user'] = usage_by_user(queryset)[:20]
+        response.context_data['usage_by_batch'] = usage_by_batch(queryset)[:20]
+        return response
@@ -2,6 +2,7 @@ import os
 import json
 import logging
 import re
+import time
 from typing import Dict, List, Optional, Tuple, Any
 
 import aiohttp
@@ -10,15 +11,23 @@ from django.conf import settings
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from django.db import IntegrityError
-from groq import Groq
 
 from blog.models import BlogPost, Category, Tag
 from blog.services import BlogLinkEnhancer
 from .models import AIBlogRequest, AIBlogGeneration, AIBlogBatchRequest
+from . import retrieval
+from .prompts import build_ideas_messages, build_post_messages, estimate_tokens
+from .telemetry import record_call
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TransientLLMError(Exception):
+    """A completion attempt failed in a way that may succeed on retry."""
+
 class AIBlogGeneratorService:
     """
     Service for generating blog posts using AI.
@@ -44,7 +53,7 @@ class AIBlogGeneratorService:
         if os.getenv("GROQ_API_KEY"):
             logger.info("Using Groq API with deepseek model")
             self.use_groq = True
-            # Keep the direct API URL for reference, though we'll use the Groq client
+            # Groq's OpenAI-compatible endpoint, called directly over HTTP
             self.api_url = "https://api.groq.com/openai/v1/chat/completions"
             self.model = "deepseek-r1-distill-llama-70b"
         else:
@@ -53,7 +62,7 @@ class AIBlogGeneratorService:
             self.api_url = "https://api.openai.com/v1/chat/completions"
             self.model = "gpt-4o"
         
-        # Set up API headers for direct HTTP requests (only used for OpenAI now)
+        # API headers for the streamed HTTP completion requests (both providers)
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -63,7 +72,7 @@ class AIBlogGeneratorService:
     
     def search_web(self, query: str) -> List[Dict[str, str]]:
         """
-        Search the web for information related to the query.
+        Search the configured retrieval providers for information related to the query.
         
         Args:
             query: The search query
@@ -71,24 +80,13 @@ class AIBlogGeneratorService:
         Returns:
             List of search results with title, url, and snippet
         """
-        # This is a placeholder for actual web search implementation
-        # In a real implementation, you would use a search API like Google Custom Search, Bing, etc.
-        
-        # Simulated search results
-        return [
-            {
-                "title": f"Search result for: {query}",
-                "url": "https://example.com/result1",
-                "snippet": f"This is a snippet of information about {query}."
-            },
-            {
-                "title": f"Another result for: {query}",
-                "url": "https://example.com/result2",
-                "snippet": f"More information about {query} and related topics."
-            }
-        ]
+        started = time.monotonic()
+        results = retrieval.search(query)
+        logger.info(f"Found {len(results)} search results for '{query}' in {time.monotonic() - started:.2f}s")
+        return results
     
-    def call_ai_service(self, prompt: str, topic: str, keywords: str = "", allow_web_search: bool = False) -> Dict[str, Any]:
+    def call_ai_service(self, prompt: str, topic: str, keywords: str = "", allow_web_search: bool = False,
+                        request: Optional[AIBlogRequest] = None) -> Dict[str, Any]:
         """
         Call the AI service to generate a blog post.
         
@@ -97,6 +95,7 @@ class AIBlogGeneratorService:
             topic: The main topic of the blog post
             keywords: Optional keywords for SEO
             allow_web_search: Whether to search the web for additional context
+            request: The request being generated, for usage accounting
             
         Returns:
             Dictionary containing the generated blog post data
@@ -107,7 +106,8 @@ class AIBlogGeneratorService:
                 "prompt": prompt,
                 "topic": topic,
                 "keywords": keywords,
-                "search_results": []
+                "search_results": [],
+                "request": request
             }
             
             # If web search is allowed, get search results
@@ -140,7 +140,9 @@ class AIBlogGeneratorService:
             request.save()
             
             # Generate the blog post
-            generation_data = self.call_ai_service(request.prompt, request.topic, request.keywords, request.allow_web_search)
+            generation_data = self.call_ai_service(
+                request.prompt, request.topic, request.keywords, request.allow_web_search, request=request
+            )
             
             # Process the result
             if not generation_data:
@@ -164,6 +166,100 @@ class AIBlogGeneratorService:
             # Re-raise the exception
             raise
     
+    def _complete(self, system_message: str, user_message: str, purpose: str,
+                  request: Optional[AIBlogRequest] = None,
+                  batch: Optional[AIBlogBatchRequest] = None) -> Optional[str]:
+        """
+        Run one chat completion and record its telemetry as an ``LLMCall``.
+        
+        The completion is streamed so the time to first token can be measured.
+        Rate limiting, server errors and connection failures are retried up to
+        ``AI_LLM_MAX_RETRIES`` times with exponential backoff.
+        
+        Returns:
+            The completion text, or None if the call failed
+        """
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            "temperature": 0.7,
+            "stream": True
+        }
+        if self.use_groq:
+            payload.update(max_completion_tokens=4000, top_p=0.95)
+        else:
+            payload.update(max_tokens=4000, stream_options={"include_usage": True})
+        
+        max_retries = getattr(settings, 'AI_LLM_MAX_RETRIES', 2)
+        stats = {'model': self.model}
+        content = None
+        started = time.monotonic()
+        for attempt in range(max_retries + 1):
+            stats.update(retries=attempt, success=False)
+            try:
+                content = self._stream_completion(payload, stats)
+                stats.update(success=True, error='')
+                break
+            except TransientLLMError as e:
+                stats['error'] = str(e)
+                logger.warning(f"Completion attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries:
+                    time.sleep(min(2 ** attempt, 10))
+            except Exception as e:
+                stats['error'] = str(e)
+                logger.error(f"API error: {e}")
+                break
+        stats['latency_ms'] = int((time.monotonic() - started) * 1000)
+        record_call(stats, purpose, request=request, batch=batch)
+        return content
+    
+    def _stream_completion(self, payload: Dict[str, Any], stats: Dict[str, Any]) -> str:
+        """
+        Make one streamed completion request, filling in token usage and time
+        to first token in ``stats``.
+        """
+        started = time.monotonic()
+        stats['ttft_ms'] = None
+        timeout = (10, getattr(settings, 'AI_LLM_READ_TIMEOUT', 120))
+        parts = []
+        try:
+            with requests.post(self.api_url, headers=self.headers, json=payload, stream=True, timeout=timeout) as response:
+                if response.status_code in RETRY_STATUSES:
+                    raise TransientLLMError(f"API returned {response.status_code}")
+                if response.status_code != 200:
+                    raise Exception(f"API returned {response.status_code}: {response.text[:500]}")
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed stream chunk: {data[:200]}")
+                        continue
+                    if chunk.get('error'):
+                        raise Exception(str(chunk['error']))
+                    # OpenAI sends usage in a final chunk; Groq under "x_groq"
+                    usage = chunk.get('usage') or (chunk.get('x_groq') or {}).get('usage')
+                    if usage:
+                        stats['prompt_tokens'] = usage.get('prompt_tokens')
+                        stats['completion_tokens'] = usage.get('completion_tokens')
+                        stats['cached_tokens'] = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+                    for choice in chunk.get('choices') or []:
+                        text = (choice.get('delta') or {}).get('content')
+                        if text:
+                            if stats['ttft_ms'] is None:
+                                stats['ttft_ms'] = int((time.monotonic() - started) * 1000)
+                            parts.append(text)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            raise TransientLLMError(str(e))
+        return ''.join(parts)
+    
     def _call_ai_api(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         Call the AI API to generate a blog post.
@@ -174,155 +270,29 @@ class AIBlogGeneratorService:
         Returns:
             Dictionary containing the generated blog post
         """
-        # Different prompts for different models
-        if self.use_groq:
-            # Special prompt for deepseek model to avoid thinking sections
-            system_message = """
-            You are an expert SEO content writer tasked with creating a high-quality blog post optimized for search engines.
-            
-            VERY IMPORTANT: Your response MUST be a valid JSON object WITHOUT any <think> tags, markdown code blocks, or explanations.
-            
-            The blog post should include:
-            1. An engaging title
-            2. Well-structured content with proper HTML styling:
-               - Use heading tags (<h2>, <h3>) for section titles
-               - Use paragraph tags (<p>) for text blocks
-               - Use <strong> and <em> for emphasis
-               - Create styled lists with <ul> and <ol> with proper <li> items
-               - Include styled blockquotes using <blockquote> for important quotes
-               - Add proper spacing between sections
-               - Use <div class="info-box"> for important information
-               - Use <div class="highlight-box"> for highlighting key points
-               - Include <figure> with <img> and <figcaption> for images
-               - Use <code> tags for code examples where relevant
-            3. A compelling meta description
-            4. Relevant keywords naturally incorporated throughout the text
-            5. Include 3-5 potential internal linking opportunities by emphasizing key topic phrases
-               - Identify important topical phrases that could link to other blog posts
-               - Don't create actual links, just identify good candidates for linking
-               - The system will automatically create links post-generation
-            
-            Respond ONLY with the following JSON format and nothing else:
-            {
-                "title": "The blog post title",
-                "content": "The full HTML content of the blog post with proper styling",
-                "excerpt": "A brief summary of the blog post (150-160 characters)",
-                "meta_title": "SEO-optimized title (50-60 characters)",
-                "meta_description": "SEO-optimized description (150-160 characters)",
-                "focus_keywords": "Primary keywords for the post, comma separated",
-                "categories": ["Category1", "Category2"],
-                "tags": ["Tag1", "Tag2", "Tag3"]
-            }
-            """
-        else:
-            # Standard prompt for other models
-            system_message = """
-            You are an expert SEO content writer. Your task is to create a high-quality blog post that is optimized for search engines.
-            The blog post should include:
-            1. An engaging title
-            2. Well-structured content with proper HTML styling:
-               - Use heading tags (<h2>, <h3>) for section titles
-               - Use paragraph tags (<p>) for text blocks
-               - Use <strong> and <em> for emphasis
-               - Create styled lists with <ul> and <ol> with proper <li> items
-               - Include styled blockquotes using <blockquote> for important quotes
-               - Add proper spacing between sections
-               - Use <div class="info-box"> for important information
-               - Use <div class="highlight-box"> for highlighting key points
-               - Include <figure> with <img> and <figcaption> for images
-               - Use <code> tags for code examples where relevant
-            3. A compelling meta description
-            4. Relevant keywords naturally incorporated throughout the text
-            5. Include 3-5 potential internal linking opportunities by emphasizing key topic phrases
-               - Identify important topical phrases that could link to other blog posts
-               - Don't create actual links, just identify good candidates for linking
-               - The system will automatically create links post-generation
-            
-            IMPORTANT: Your response must be ONLY a valid JSON object with the following fields:
-            {
-                "title": "The blog post title",
-                "content": "The full HTML content of the blog post with proper styling",
-                "excerpt": "A brief summary of the blog post (150-160 characters)",
-                "meta_title": "SEO-optimized title (50-60 characters)",
-                "meta_description": "SEO-optimized description (150-160 characters)",
-                "focus_keywords": "Primary keywords for the post, comma separated",
-                "categories": ["Category1", "Category2"],
-                "tags": ["Tag1", "Tag2", "Tag3"]
-            }
-            
-            DO NOT include any explanations, thinking process, or markdown code blocks before or after the JSON. 
-            Just return the raw JSON object.
-            """
-        
-        # Construct the user message based on the context
-        user_message = f"Please write a blog post about: {context['topic']}\n\n"
-        
-        if context.get('prompt'):
-            user_message += f"Additional instructions: {context['prompt']}\n\n"
-        
-        if context.get('keywords'):
-            user_message += f"Please incorporate these keywords: {context['keywords']}\n\n"
-        
-        if context.get('search_results'):
-            user_message += "Here are some search results you can use as references:\n\n"
-            for result in context['search_results']:
-                user_message += f"Title: {result['title']}\nURL: {result['url']}\nSnippet: {result['snippet']}\n\n"
+        # Build the prompts within the input-token budget
+        system_message, user_message = build_post_messages(
+            context['topic'],
+            prompt=context.get('prompt', ''),
+            keywords=context.get('keywords', ''),
+            search_results=context.get('search_results'),
+            use_groq=self.use_groq,
+        )
         
         # Log which API we're using
-        logger.info(f"Calling {'Groq' if self.use_groq else 'OpenAI'} API with model {self.model}")
+        logger.info(
+            f"Calling {'Groq' if self.use_groq else 'OpenAI'} API with model {self.model} "
+            f"(~{estimate_tokens(system_message) + estimate_tokens(user_message)} input tokens)"
+        )
         
         try:
-            if self.use_groq:
-                # Use the Groq client library for deepseek model
-                client = Groq(api_key=self.api_key)
-                
-                # Prepare messages
-                messages = [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ]
-                
-                # Call the API with the correct parameters
-                completion = client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.7,
-                    max_completion_tokens=4000,
-                    top_p=0.95,
-                    stream=False
-                )
-                
-                # Extract content from the response
-                content = completion.choices[0].message.content
-                
-                # Log a sample of the content for debugging
-                content_preview = content[:100] + '...' if len(content) > 100 else content
-                logger.info(f"Received response from Groq API. Preview: {content_preview}")
-                
-            else:
-                # Use the requests library for OpenAI
-                # Prepare the API request
-                payload = {
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 4000
-                }
-                
-                response = requests.post(self.api_url, headers=self.headers, json=payload)
-                if response.status_code != 200:
-                    logger.error(f"API error: {response.text}")
-                    return {}
-                
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                
-                # Log a sample of the content for debugging
-                content_preview = content[:100] + '...' if len(content) > 100 else content
-                logger.info(f"Received response from API. Preview: {content_preview}")
+            content = self._complete(system_message, user_message, 'post', request=context.get('request'))
+            if content is None:
+                return {}
+            
+            # Log a sample of the content for debugging
+            content_preview = content[:100] + '...' if len(content) > 100 else content
+            logger.info(f"Received response from API. Preview: {content_preview}")
             
             # Process the content
             if '<think>' in content:
@@ -634,9 +604,15 @@ class AIBlogGeneratorService:
             logger.warning(f"Failed to create unique slug for category '{category_name}' after 10 attempts")
             return Category.objects.filter(name__iexact=category_name).first() or Category.objects.first()
 
-    def generate_batch_blog_posts(self, batch_request_id):
+    def generate_batch_blog_posts(self, batch_request_id, submit_child=None):
         """
         Generate multiple related blog posts for the given batch request ID.
+        
+        With ``submit_child``, each post's request is handed to it to be
+        generated as its own job (which must call ``finish_batch``
+        afterwards, and fail its post if it stops early); a post it cannot
+        queue is failed here. Otherwise the posts are generated here, one
+        by one.
         """
         try:
             # Get the batch request object
@@ -650,52 +626,50 @@ class AIBlogGeneratorService:
             blog_ideas = self.generate_blog_post_ideas(
                 batch_request.topic, 
                 batch_request.description, 
-                batch_request.num_posts
+                batch_request.num_posts,
+                batch=batch_request
             )
             
             # Save the generated ideas to the batch request
             batch_request.generated_ideas = json.dumps(blog_ideas)
             batch_request.save()
             
-            # Track successful and failed generations
-            successful_generations = 0
-            failed_generations = 0
+            # Create an individual request for each idea
+            child_requests = [
+                AIBlogRequest.objects.create(
+                    user=batch_request.user,
+                    topic=idea['title'],
+                    prompt=f"{batch_request.prompt}\n\nThis post is part of a series about {batch_request.topic}.\n\nPost description: {idea['description']}",
+                    keywords=batch_request.keywords,
+                    allow_web_search=batch_request.allow_web_search,
+                    parent_batch=batch_request
+                )
+                for idea in blog_ideas
+            ]
+            
+            if submit_child and child_requests:
+                for index, blog_request in enumerate(child_requests):
+                    try:
+                        submit_child(blog_request)
+                    except Exception as e:
+                        # No job will run for this post or the ones after it,
+                        # so fail them here or the batch would never finish.
+                        logger.error(f"Error queueing blog post {blog_request.id} for batch {batch_request.id}: {e}")
+                        AIBlogRequest.objects.filter(
+                            pk__in=[child.id for child in child_requests[index:]],
+                            status__in=('pending', 'processing'),
+                        ).update(status='failed', error_message=f"Could not be queued: {e}")
+                        return self.finish_batch(batch_request.id) or batch_request
+                return batch_request
             
             # Generate each blog post from the ideas
-            for idea in blog_ideas:
+            for blog_request in child_requests:
                 try:
-                    # Create an individual request for this idea
-                    blog_request = AIBlogRequest.objects.create(
-                        user=batch_request.user,
-                        topic=idea['title'],
-                        prompt=f"{batch_request.prompt}\n\nThis post is part of a series about {batch_request.topic}.\n\nPost description: {idea['description']}",
-                        keywords=batch_request.keywords,
-                        allow_web_search=batch_request.allow_web_search,
-                        parent_batch=batch_request
-                    )
-                    
-                    # Generate the blog post
                     self.generate_blog_post(blog_request.id)
-                    successful_generations += 1
-                    
                 except Exception as e:
                     logger.error(f"Error generating individual blog post for batch: {e}")
-                    failed_generations += 1
             
-            # Update batch request status based on results
-            if failed_generations == len(blog_ideas):
-                batch_request.status = 'failed'
-                batch_request.error_message = f"All {len(blog_ideas)} blog post generations failed."
-            elif successful_generations > 0:
-                batch_request.status = 'completed'
-                if failed_generations > 0:
-                    batch_request.error_message = f"{failed_generations} out of {len(blog_ideas)} blog post generations failed."
-            else:
-                batch_request.status = 'failed'
-                batch_request.error_message = "Failed to generate blog post ideas."
-            
-            batch_request.save()
-            return batch_request
+            return self.finish_batch(batch_request.id)
             
         except Exception as e:
             logger.error(f"Error in batch blog post generation: {e}")
@@ -712,7 +686,36 @@ class AIBlogGeneratorService:
             # Re-raise the exception
             raise
     
-    def generate_blog_post_ideas(self, topic, description, num_posts=5):
+    def finish_batch(self, batch_request_id):
+        """
+        Set a batch's final status from its posts once none is still in flight.
+        
+        Returns the batch request, or None while posts are still pending.
+        """
+        batch_request = AIBlogBatchRequest.objects.get(id=batch_request_id)
+        statuses = list(batch_request.child_requests.values_list('status', flat=True))
+        if any(status in ('pending', 'processing') for status in statuses):
+            return None
+        
+        failed_generations = statuses.count('failed')
+        successful_generations = statuses.count('completed')
+        
+        # Update batch request status based on results
+        if statuses and failed_generations == len(statuses):
+            batch_request.status = 'failed'
+            batch_request.error_message = f"All {len(statuses)} blog post generations failed."
+        elif successful_generations > 0:
+            batch_request.status = 'completed'
+            if failed_generations > 0:
+                batch_request.error_message = f"{failed_generations} out of {len(statuses)} blog post generations failed."
+        else:
+            batch_request.status = 'failed'
+            batch_request.error_message = "Failed to generate blog post ideas."
+        
+        batch_request.save()
+        return batch_request
+    
+    def generate_blog_post_ideas(self, topic, description, num_posts=5, batch=None):
         """
         Generate a list of blog post ideas related to a central topic.
         
@@ -720,88 +723,22 @@ class AIBlogGeneratorService:
             topic: The main topic for the series of blog posts
             description: Description of what the series should cover
             num_posts: Number of blog post ideas to generate (default: 5)
+            batch: The batch request the ideas are for, for usage accounting
             
         Returns:
             List of dictionaries with blog post titles and descriptions
         """
         try:
-            # Prepare system prompt for idea generation
-            system_message = """
-            You are an expert content strategist specializing in creating cohesive series of blog posts.
-            Your task is to create a list of related blog post ideas on a given topic.
-            
-            Each blog post idea should:
-            1. Have a compelling, SEO-friendly title
-            2. Include a brief description (2-3 sentences) of what the post will cover
-            3. Be closely related to the main topic while covering different aspects
-            4. Together form a comprehensive series that builds reader knowledge
-            
-            IMPORTANT: Your response must be ONLY a valid JSON array of objects with the following structure:
-            [
-                {
-                    "title": "Compelling Blog Post Title",
-                    "description": "Brief description of what this post will cover and why it's valuable."
-                },
-                // more post ideas...
-            ]
-            
-            DO NOT include any explanations, thinking process, or markdown outside the JSON.
-            Just return the raw JSON array.
-            """
-            
-            # Construct the user message
-            user_message = f"Please create {num_posts} blog post ideas for a series about: {topic}\n\n"
-            
-            if description:
-                user_message += f"Series description: {description}\n\n"
-            
-            user_message += f"These posts should form a cohesive series that thoroughly covers different aspects of {topic}."
+            # Build the prompts for idea generation
+            system_message, user_message = build_ideas_messages(topic, description, num_posts)
             
             # Log which API we're using
             logger.info(f"Generating blog post ideas using {'Groq' if self.use_groq else 'OpenAI'} API")
             
             # Call the AI API using the existing pattern
-            if self.use_groq:
-                client = Groq(api_key=self.api_key)
-                
-                # Prepare messages
-                messages = [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ]
-                
-                # Call the API
-                completion = client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.7,
-                    max_completion_tokens=4000,
-                    top_p=0.95,
-                    stream=False
-                )
-                
-                # Extract content from the response
-                content = completion.choices[0].message.content
-                
-            else:
-                # Use the requests library for OpenAI
-                payload = {
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 4000
-                }
-                
-                response = requests.post(self.api_url, headers=self.headers, json=payload)
-                if response.status_code != 200:
-                    logger.error(f"API error: {response.text}")
-                    return []
-                
-                result = response.json()
-                content = result['choices'][0]['message']['content']
+            content = self._complete(system_message, user_message, 'ideas', batch=batch)
+            if content is None:
+                return []
             
             # Log a sample of the content for debugging
             content_preview = content[:100] + '...' if len(content) > 100 else content
@@ -0,0 +1,43 @@
+# Generated by Django 5.1 on 2026-10-19 14:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_blog_generator', '0002_aiblogbatchrequest_aiblogrequest_parent_batch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('post', 'Blog post'), ('ideas', 'Batch ideas')], default='post', max_length=10)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('completion_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('cached_tokens', models.PositiveIntegerField(default=0, help_text="Prompt tokens served from the provider's prompt cache")),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('latency_ms', models.PositiveIntegerField(help_text='Time until the completion finished, including retries')),
+                ('ttft_ms', models.PositiveIntegerField(blank=True, help_text='Time to first token of the successful attempt', null=True)),
+                ('retries', models.PositiveSmallIntegerField(default=0)),
+                ('cost_usd', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('success', models.BooleanField(default=True)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, help_text='The batch, for idea generation and for posts of the batch', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='ai_blog_generator.aiblogbatchrequest')),
+                ('request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='ai_blog_generator.aiblogrequest')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'LLM call',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='llm_call_user_time')],
+            },
+        ),
+    ]
@@ -82,3 +82,40 @@ class AIBlogGeneration(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+
+class LLMCall(models.Model):
+    """
+    Telemetry for one completion call made while generating posts or ideas.
+    """
+    PURPOSE_CHOICES = (
+        ('post', 'Blog post'),
+        ('ideas', 'Batch ideas'),
+    )
+    
+    request = models.ForeignKey(AIBlogRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_calls')
+    batch = models.ForeignKey(AIBlogBatchRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_calls',
+                              help_text="The batch, for idea generation and for posts of the batch")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_calls')
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES, default='post')
+    model = models.CharField(max_length=100)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cached_tokens = models.PositiveIntegerField(default=0, help_text="Prompt tokens served from the provider's prompt cache")
+    cache_hit = models.BooleanField(default=False)
+    latency_ms = models.PositiveIntegerField(help_text="Time until the completion finished, including retries")
+    ttft_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Time to first token of the successful attempt")
+    retries = models.PositiveSmallIntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+    success = models.BooleanField(default=True)
+    error = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"LLM call {self.model} ({self.prompt_tokens}/{self.completion_tokens} tokens)"
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'LLM call'
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='llm_call_user_time'),
+        ]
@@ -0,0 +1,202 @@
+"""
+Prompt building for blog post and idea generation.
+
+System prompts are assembled once, at import, from shared pieces and with
+the source indentation removed, so every call sends the same compact
+strings. User messages are filled from short templates and kept within an
+input-token budget (``AI_PROMPT_INPUT_TOKENS``, system prompt included).
+The topic and instructions are always sent. Keywords are deduplicated and
+capped at ``AI_PROMPT_KEYWORD_TOKENS``. Search results share whatever
+budget remains: duplicates are dropped, snippets are cut to whole
+sentences (or words) and results that no longer fit are left out.
+
+Token counts are estimated at about four characters per token, which is
+close enough for budgeting.
+"""
+import re
+from textwrap import dedent
+
+from django.conf import settings
+
+CHARS_PER_TOKEN = 4
+
+# Smallest snippet worth sending; results that cannot get this much are dropped.
+MIN_SNIPPET_TOKENS = 24
+
+POST_REQUIREMENTS = dedent("""
+    The blog post should include:
+    1. An engaging title
+    2. Well-structured content with proper HTML styling:
+       - Use heading tags (<h2>, <h3>) for section titles
+       - Use paragraph tags (<p>) for text blocks
+       - Use <strong> and <em> for emphasis
+       - Create styled lists with <ul> and <ol> with proper <li> items
+       - Include styled blockquotes using <blockquote> for important quotes
+       - Add proper spacing between sections
+       - Use <div class="info-box"> for important information
+       - Use <div class="highlight-box"> for highlighting key points
+       - Include <figure> with <img> and <figcaption> for images
+       - Use <code> tags for code examples where relevant
+    3. A compelling meta description
+    4. Relevant keywords naturally incorporated throughout the text
+    5. Include 3-5 potential internal linking opportunities by emphasizing key topic phrases
+       - Identify important topical phrases that could link to other blog posts
+       - Don't create actual links, just identify good candidates for linking
+       - The system will automatically create links post-generation
+""").strip()
+
+POST_JSON_FORMAT = dedent("""
+    {
+        "title": "The blog post title",
+        "content": "The full HTML content of the blog post with proper styling",
+        "excerpt": "A brief summary of the blog post (150-160 characters)",
+        "meta_title": "SEO-optimized title (50-60 characters)",
+        "meta_description": "SEO-optimized description (150-160 characters)",
+        "focus_keywords": "Primary keywords for the post, comma separated",
+        "categories": ["Category1", "Category2"],
+        "tags": ["Tag1", "Tag2", "Tag3"]
+    }
+""").strip()
+
+# The deepseek model served by Groq needs to be told up front to skip <think> sections.
+GROQ_POST_SYSTEM_PROMPT = "\n\n".join([
+    "You are an expert SEO content writer tasked with creating a high-quality blog post optimized for search engines.",
+    "VERY IMPORTANT: Your response MUST be a valid JSON object WITHOUT any <think> tags, markdown code blocks, or explanations.",
+    POST_REQUIREMENTS,
+    f"Respond ONLY with the following JSON format and nothing else:\n{POST_JSON_FORMAT}",
+])
+
+POST_SYSTEM_PROMPT = "\n\n".join([
+    "You are an expert SEO content writer. Your task is to create a high-quality blog post that is optimized for search engines.\n"
+    + POST_REQUIREMENTS,
+    f"IMPORTANT: Your response must be ONLY a valid JSON object with the following fields:\n{POST_JSON_FORMAT}",
+    "DO NOT include any explanations, thinking process, or markdown code blocks before or after the JSON.\n"
+    "Just return the raw JSON object.",
+])
+
+IDEAS_SYSTEM_PROMPT = dedent("""
+    You are an expert content strategist specializing in creating cohesive series of blog posts.
+    Your task is to create a list of related blog post ideas on a given topic.
+
+    Each blog post idea should:
+    1. Have a compelling, SEO-friendly title
+    2. Include a brief description (2-3 sentences) of what the post will cover
+    3. Be closely related to the main topic while covering different aspects
+    4. Together form a comprehensive series that builds reader knowledge
+
+    IMPORTANT: Your response must be ONLY a valid JSON array of objects with the following structure:
+    [
+        {
+            "title": "Compelling Blog Post Title",
+            "description": "Brief description of what this post will cover and why it's valuable."
+        },
+        // more post ideas...
+    ]
+
+    DO NOT include any explanations, thinking process, or markdown outside the JSON.
+    Just return the raw JSON array.
+""").strip()
+
+TOPIC_TEMPLATE = "Please write a blog post about: {topic}\n\n"
+INSTRUCTIONS_TEMPLATE = "Additional instructions: {prompt}\n\n"
+KEYWORDS_TEMPLATE = "Please incorporate these keywords: {keywords}\n\n"
+SEARCH_HEADER = "Here are some search results you can use as references:\n\n"
+RESULT_TEMPLATE = "Title: {title}\nURL: {url}\nSnippet: {snippet}\n\n"
+
+IDEAS_TEMPLATE = "Please create {num_posts} blog post ideas for a series about: {topic}\n\n"
+SERIES_TEMPLATE = "Series description: {description}\n\n"
+COHESION_TEMPLATE = "These posts should form a cohesive series that thoroughly covers different aspects of {topic}."
+
+_whitespace = re.compile(r'\s+')
+_sentence_end = re.compile(r'(?<=[.!?])\s')
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut ``text`` to about ``max_tokens``, at a sentence end if one is close, else at a word."""
+    text = _whitespace.sub(' ', text or '').strip()
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    if limit <= 1:
+        return ''
+    cut = text[:limit - 1]
+    sentence_ends = [match.start() for match in _sentence_end.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] >= limit // 2:
+        return cut[:sentence_ends[-1]]
+    return cut.rsplit(' ', 1)[0].rstrip(',;:') + '…'
+
+def compact_keywords(keywords, max_tokens):
+    """Deduplicate comma-separated keywords and keep those that fit in ``max_tokens``."""
+    kept = []
+    seen = set()
+    used = 0
+    for keyword in (keywords or '').split(','):
+        keyword = _whitespace.sub(' ', keyword).strip()
+        if not keyword or keyword.lower() in seen:
+            continue
+        cost = estimate_tokens(keyword + ', ')
+        if used + cost > max_tokens:
+            break
+        seen.add(keyword.lower())
+        kept.append(keyword)
+        used += cost
+    return ', '.join(kept)
+
+def fit_search_results(results, max_tokens):
+    """
+    Render search results into at most ``max_tokens``, sharing the budget
+    evenly between them and trimming snippets to fit.
+    """
+    unique = []
+    seen = set()
+    for result in results or []:
+        key = result.get('url') or result.get('title')
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(result)
+    budget = max_tokens - estimate_tokens(SEARCH_HEADER)
+    while unique:
+        share = budget // len(unique)
+        parts = []
+        for result in unique:
+            title = truncate_to_tokens(result.get('title', ''), 30)
+            url = result.get('url', '')
+            overhead = estimate_tokens(RESULT_TEMPLATE.format(title=title, url=url, snippet=''))
+            snippet_tokens = share - overhead
+            if snippet_tokens < MIN_SNIPPET_TOKENS:
+                break
+            snippet = truncate_to_tokens(result.get('snippet', ''), snippet_tokens)
+            parts.append(RESULT_TEMPLATE.format(title=title, url=url, snippet=snippet))
+        else:
+            return SEARCH_HEADER + ''.join(parts)
+        # Too many results for the budget: drop the last (least relevant) one.
+        unique.pop()
+    return ''
+
+def get_input_budget():
+    return getattr(settings, 'AI_PROMPT_INPUT_TOKENS', 3000)
+
+def build_post_messages(topic, prompt='', keywords='', search_results=None, use_groq=False, budget=None):
+    """Return ``(system_message, user_message)`` for generating one post."""
+    system_message = GROQ_POST_SYSTEM_PROMPT if use_groq else POST_SYSTEM_PROMPT
+    budget = budget or get_input_budget()
+    user_message = TOPIC_TEMPLATE.format(topic=topic)
+    if prompt:
+        user_message += INSTRUCTIONS_TEMPLATE.format(prompt=prompt.strip())
+    keywords = compact_keywords(keywords, getattr(settings, 'AI_PROMPT_KEYWORD_TOKENS', 60))
+    if keywords:
+        user_message += KEYWORDS_TEMPLATE.format(keywords=keywords)
+    remaining = budget - estimate_tokens(system_message) - estimate_tokens(user_message)
+    if search_results and remaining > 0:
+        user_message += fit_search_results(search_results, remaining)
+    return system_message, user_message
+
+def build_ideas_messages(topic, description='', num_posts=5):
+    """Return ``(system_message, user_message)`` for generating a series of post ideas."""
+    user_message = IDEAS_TEMPLATE.format(num_posts=num_posts, topic=topic)
+    if description:
+        user_message += SERIES_TEMPLATE.format(description=description)
+    user_message += COHESION_TEMPLATE.format(topic=topic)
+    return IDEAS_SYSTEM_PROMPT, user_message
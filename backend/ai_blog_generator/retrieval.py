@@ -0,0 +1,174 @@
+"""
+Retrieval of reference material for grounded generation.
+
+A provider turns a query into a list of results (``title``, ``url``,
+``snippet``). The providers in ``AI_SEARCH_PROVIDERS`` (dotted paths to
+``SearchProvider`` subclasses) are queried in parallel, one thread each,
+and ``search`` waits at most ``AI_SEARCH_TIMEOUT`` seconds in total:
+providers that are slower or fail are left out of that answer, so
+grounding adds bounded latency. Results are merged in provider order and
+deduplicated by URL.
+
+A thread cannot be stopped, so a provider call that timed out keeps
+running in the background. Until it returns, that provider is skipped
+(with a warning) rather than queried again. This keeps at most one
+abandoned call per provider, and later searches never queue behind it.
+
+Answers are cached per normalized query for ``AI_SEARCH_CACHE_TIMEOUT``
+seconds. An answer that is missing a provider (timeout or error) is not
+cached, so the next identical query tries again.
+
+``LocalPostProvider`` searches our own published posts through the
+full-text index in ``blog.search``.
+"""
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from blog.search import search_posts
+
+logger = logging.getLogger(__name__)
+
+# Names of providers with a timed-out call still running.
+_lingering = set()
+_lingering_lock = threading.Lock()
+
+_whitespace = re.compile(r'\s+')
+
+class SearchProvider:
+    """Base class for retrieval providers."""
+
+    name = ''
+
+    def search(self, query, limit):
+        """
+        Search for ``query``.
+
+        Args:
+            query: The search query
+            limit: Maximum number of results to return
+
+        Returns:
+            List of search results with title, url, and snippet
+        """
+        raise NotImplementedError
+
+class LocalPostProvider(SearchProvider):
+    """Published posts from this site, through the blog full-text index."""
+
+    name = 'local'
+
+    def search(self, query, limit):
+        site_url = settings.SITE_URL.rstrip('/')
+        return [
+            {
+                'title': post.title,
+                'url': f'{site_url}/blog/{post.slug}',
+                'snippet': snippet or post.excerpt,
+            }
+            for post, snippet in search_posts(query, limit)
+        ]
+
+def get_providers():
+    paths = getattr(settings, 'AI_SEARCH_PROVIDERS', ['ai_blog_generator.retrieval.LocalPostProvider'])
+    return [import_string(path)() for path in paths]
+
+def _provider_name(provider):
+    return provider.name or type(provider).__name__
+
+def _cache_key(query, providers, limit):
+    names = ','.join(_provider_name(provider) for provider in providers)
+    digest = hashlib.sha256(f'{names}|{limit}|{query}'.encode('utf-8')).hexdigest()
+    return f'ai-search:{digest}'
+
+def _run(provider, query, limit):
+    try:
+        return provider.search(query, limit)
+    finally:
+        # Worker threads hold their own database connections.
+        close_old_connections()
+
+def _abandon(provider, future):
+    """Skip ``provider`` until its timed-out call returns."""
+    name = _provider_name(provider)
+    with _lingering_lock:
+        _lingering.add(name)
+
+    def release(_):
+        with _lingering_lock:
+            _lingering.discard(name)
+
+    future.add_done_callback(release)
+
+def search(query, providers=None, limit=None, timeout=None):
+    """
+    Query every provider in parallel and merge their results.
+
+    Args:
+        query: The search query
+        providers: Providers to query (default: ``get_providers()``)
+        limit: Maximum number of results per provider
+        timeout: Seconds to wait for the providers, in total
+
+    Returns:
+        List of search results with title, url, and snippet
+    """
+    query = _whitespace.sub(' ', query or '').strip().lower()
+    if not query:
+        return []
+    providers = get_providers() if providers is None else providers
+    limit = limit or getattr(settings, 'AI_SEARCH_RESULTS_PER_PROVIDER', 5)
+    timeout = timeout if timeout is not None else getattr(settings, 'AI_SEARCH_TIMEOUT', 3)
+
+    key = _cache_key(query, providers, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    with _lingering_lock:
+        busy = [provider for provider in providers if _provider_name(provider) in _lingering]
+    if busy:
+        logger.warning(
+            f"Skipping search providers still running a timed-out call: {', '.join(map(_provider_name, busy))}"
+        )
+    active = [provider for provider in providers if provider not in busy]
+    complete = not busy
+
+    results = []
+    seen = set()
+    if active:
+        executor = ThreadPoolExecutor(max_workers=len(active), thread_name_prefix='ai-search')
+        futures = [executor.submit(_run, provider, query, limit) for provider in active]
+        done, _ = wait(futures, timeout=timeout)
+        # Do not wait for stragglers; their threads exit when their calls return.
+        executor.shutdown(wait=False)
+        for provider, future in zip(active, futures):
+            if future not in done:
+                logger.warning(
+                    f"Search provider {_provider_name(provider)} timed out after {timeout}s for query: {query}"
+                )
+                _abandon(provider, future)
+                complete = False
+                continue
+            try:
+                provider_results = future.result()
+            except Exception as e:
+                logger.error(f"Search provider {_provider_name(provider)} failed for query {query}: {e}")
+                complete = False
+                continue
+            for result in provider_results:
+                url = result.get('url')
+                if url and url not in seen:
+                    seen.add(url)
+                    results.append(result)
+
+    if complete:
+        cache.set(key, results, getattr(settings, 'AI_SEARCH_CACHE_TIMEOUT', 60 * 60))
+    return results
@@ -0,0 +1,171 @@
+"""
+Fair scheduling of generation jobs across users.
+
+Jobs are queued per user in one of two classes: ``interactive`` (single
+requests someone is waiting on) and ``batch`` (batch idea generation and
+batch children). A free worker always takes interactive work first. Within
+a class, users are served by deficit round-robin: each visit grants a user
+``quantum`` units of credit, and their next job runs once its ``cost`` is
+covered. One user's long batch therefore interleaves with everyone else's
+work instead of holding the workers until it is done.
+
+Batch work ages: once a batch job has waited ``batch_max_wait`` seconds
+(``AI_BLOG_BATCH_MAX_WAIT``), the next free worker takes batch work ahead
+of interactive work, so a steady stream of interactive requests delays
+batches by a bounded time instead of starving them.
+
+``metrics()`` reports queue depth and recent queue wait times.
+"""
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# Recent waits kept per priority class for the metrics.
+WAIT_SAMPLES = 500
+
+class Job:
+    __slots__ = ('fn', 'user_id', 'priority', 'cost', 'label', 'queued_at')
+
+    def __init__(self, fn, user_id, priority, cost, label):
+        self.fn = fn
+        self.user_id = user_id
+        self.priority = priority
+        self.cost = cost
+        self.label = label
+        self.queued_at = time.monotonic()
+
+class DeficitRoundRobin:
+    """Per-user FIFO queues served in deficit round-robin order."""
+
+    def __init__(self, quantum=1):
+        self.quantum = quantum
+        self.queues = OrderedDict()  # user_id -> deque of jobs, in visiting order
+        self.deficits = {}
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def push(self, job):
+        if job.user_id not in self.queues:
+            self.queues[job.user_id] = deque()
+            self.deficits[job.user_id] = 0
+        self.queues[job.user_id].append(job)
+
+    def pop(self):
+        while self.queues:
+            user_id, queue = next(iter(self.queues.items()))
+            if self.deficits[user_id] < queue[0].cost:
+                # Not enough credit yet: grant a quantum and move to the back.
+                self.deficits[user_id] += self.quantum
+                self.queues.move_to_end(user_id)
+                continue
+            job = queue.popleft()
+            self.deficits[user_id] -= job.cost
+            if not queue:
+                # Idle users do not bank credit.
+                del self.queues[user_id]
+                del self.deficits[user_id]
+            return job
+        return None
+
+    def oldest_queued_at(self):
+        return min((queue[0].queued_at for queue in self.queues.values()), default=None)
+
+    def depth_for(self, user_id):
+        return len(self.queues.get(user_id, ()))
+
+class FairScheduler:
+    def __init__(self, workers=5, quantum=1, batch_max_wait=60):
+        self.workers = workers
+        self.batch_max_wait = batch_max_wait
+        self.queues = {priority: DeficitRoundRobin(quantum) for priority in PRIORITIES}
+        self.waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITIES}
+        self.running = 0
+        self.completed = 0
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def submit(self, fn, user_id, priority=INTERACTIVE, cost=1, label=''):
+        """Queue ``fn()`` to run on a worker on behalf of ``user_id``."""
+        if priority not in self.queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        job = Job(fn, user_id, priority, cost, label)
+        with self._condition:
+            self._start_workers()
+            self.queues[priority].push(job)
+            self._condition.notify()
+        return job
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work, name=f'ai-blog-worker-{len(self._threads) + 1}', daemon=True,
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        oldest = self.queues[BATCH].oldest_queued_at()
+        if oldest is not None and time.monotonic() - oldest >= self.batch_max_wait:
+            # Aged batch work goes ahead of interactive work.
+            return self.queues[BATCH].pop()
+        for priority in PRIORITIES:
+            job = self.queues[priority].pop()
+            if job is not None:
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+                wait = time.monotonic() - job.queued_at
+                self.waits[job.priority].append(wait)
+                self.running += 1
+            logger.info(f"Starting {job.priority} job {job.label} for user {job.user_id} after {wait:.1f}s in queue")
+            try:
+                job.fn()
+            except Exception as e:
+                logger.error(f"Error in background job {job.label}: {e}")
+                logger.error(traceback.format_exc())
+            finally:
+                with self._condition:
+                    self.running -= 1
+                    self.completed += 1
+
+    def metrics(self, user_id=None):
+        """Queue depth per priority and wait-time statistics over recent jobs."""
+        with self._condition:
+            data = {
+                'workers': self.workers,
+                'running': self.running,
+                'completed': self.completed,
+                'queued': {priority: len(queue) for priority, queue in self.queues.items()},
+                'queued_users': {priority: len(queue.queues) for priority, queue in self.queues.items()},
+                'wait_seconds': {priority: _wait_stats(waits) for priority, waits in self.waits.items()},
+            }
+            if user_id is not None:
+                data['queued_for_user'] = sum(queue.depth_for(user_id) for queue in self.queues.values())
+        return data
+
+def _wait_stats(waits):
+    if not waits:
+        return {'samples': 0, 'mean': None, 'p95': None, 'max': None}
+    ordered = sorted(waits)
+    return {
+        'samples': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p95': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+        'max': round(ordered[-1], 3),
+    }
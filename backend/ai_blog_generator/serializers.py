@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import AIBlogRequest, AIBlogGeneration, AIBlogBatchRequest
+from .telemetry import usage_totals
 from blog.serializers import BlogPostDetailSerializer, CategorySerializer, TagSerializer
 import json
 
@@ -7,14 +8,19 @@ class AIBlogRequestSerializer(serializers.ModelSerializer):
     """
     Serializer for creating and viewing AI blog post requests.
     """
+    usage = serializers.SerializerMethodField()
+    
     class Meta:
         model = AIBlogRequest
         fields = [
             'id', 'user', 'prompt', 'topic', 'keywords', 
             'allow_web_search', 'status', 'created_at', 
-            'updated_at', 'error_message'
+            'updated_at', 'error_message', 'usage'
         ]
         read_only_fields = ['user', 'status', 'created_at', 'updated_at', 'error_message']
+    
+    def get_usage(self, obj):
+        return usage_totals(obj.llm_calls.all())
 
 class AIBlogGenerationSerializer(serializers.ModelSerializer):
     """
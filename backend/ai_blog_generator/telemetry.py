@@ -0,0 +1,93 @@
+"""
+Usage and cost accounting for completion calls.
+
+Every call made by ``AIBlogGeneratorService`` is stored as an ``LLMCall``
+(model, prompt/completion tokens, latency, time to first token, retries,
+prompt-cache use and an estimated cost). ``usage_totals`` aggregates any
+set of calls; ``usage_by_user`` and ``usage_by_batch`` group them for the
+admin report and the usage endpoints.
+
+Cost is estimated from ``AI_LLM_PRICING``: USD per million prompt and
+completion tokens, by model. Calls to unpriced models have no cost.
+"""
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Avg, Count, F, Q, Sum
+
+from .models import LLMCall
+
+logger = logging.getLogger(__name__)
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prices = getattr(settings, 'AI_LLM_PRICING', {}).get(model)
+    if not prices or prompt_tokens is None or completion_tokens is None:
+        return None
+    prompt_price, completion_price = (Decimal(str(price)) for price in prices)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / Decimal(1_000_000)
+
+def record_call(stats, purpose, request=None, batch=None):
+    """Persist the ``stats`` of one completion call; never fails the generation."""
+    try:
+        if request is not None and batch is None and request.parent_batch_id:
+            batch = request.parent_batch
+        user_id = request.user_id if request is not None else (batch.user_id if batch is not None else None)
+        return LLMCall.objects.create(
+            request=request,
+            batch=batch,
+            user_id=user_id,
+            purpose=purpose,
+            model=stats['model'],
+            prompt_tokens=stats.get('prompt_tokens'),
+            completion_tokens=stats.get('completion_tokens'),
+            cached_tokens=stats.get('cached_tokens') or 0,
+            cache_hit=bool(stats.get('cached_tokens')),
+            latency_ms=stats['latency_ms'],
+            ttft_ms=stats.get('ttft_ms'),
+            retries=stats.get('retries', 0),
+            cost_usd=estimate_cost(stats['model'], stats.get('prompt_tokens'), stats.get('completion_tokens')),
+            success=stats.get('success', True),
+            error=(stats.get('error') or '')[:500],
+        )
+    except Exception as e:
+        logger.error(f"Error recording LLM call telemetry: {e}")
+        return None
+
+USAGE_AGGREGATES = {
+    'calls': Count('id'),
+    'failed_calls': Count('id', filter=Q(success=False)),
+    'tokens_in': Sum('prompt_tokens'),
+    'tokens_out': Sum('completion_tokens'),
+    'tokens_cached': Sum('cached_tokens'),
+    'cache_hits': Count('id', filter=Q(cache_hit=True)),
+    'retry_count': Sum('retries'),
+    'cost': Sum('cost_usd'),
+    'avg_latency_ms': Avg('latency_ms'),
+    'avg_ttft_ms': Avg('ttft_ms'),
+}
+
+def _clean(row):
+    for key in ('avg_latency_ms', 'avg_ttft_ms'):
+        if row.get(key) is not None:
+            row[key] = round(row[key])
+    for key in ('tokens_in', 'tokens_out', 'tokens_cached', 'retry_count'):
+        row[key] = row.get(key) or 0
+    return row
+
+def usage_totals(queryset):
+    return _clean(queryset.aggregate(**USAGE_AGGREGATES))
+
+def usage_by_user(queryset):
+    rows = (
+        queryset.values('user_id', 'user__username')
+        .annotate(**USAGE_AGGREGATES).order_by(F('cost').desc(nulls_last=True), '-calls')
+    )
+    return [_clean(row) for row in rows]
+
+def usage_by_batch(queryset):
+    rows = (
+        queryset.filter(batch__isnull=False).values('batch_id', 'batch__topic')
+        .annotate(**USAGE_AGGREGATES).order_by(F('cost').desc(nulls_last=True), '-calls')
+    )
+    return [_clean(row) for row in rows]
@@ -1,11 +1,23 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 from rest_framework import status
 
-from .models import AIBlogRequest, AIBlogGeneration
-from .views import AIBlogRequestViewSet, AIBlogGenerationViewSet
+from .ai_service import ai_service
+from .models import AIBlogRequest, AIBlogGeneration, AIBlogBatchRequest, LLMCall
+from . import retrieval
+from blog.models import BlogPost
+from .prompts import build_post_messages, compact_keywords, estimate_tokens, truncate_to_tokens
+from .scheduler import FairScheduler
+from .views import AIBlogRequestViewSet, AIBlogGenerationViewSet, queue_batch, queue_generation
 
 class AIBlogGeneratorTests(TestCase):
     def setUp(self):
@@ -92,3 +104,377 @@ class AIBlogGeneratorTests(TestCase):
         user_requests = AIBlogRequest.objects.filter(user=self.user)
         self.assertEqual(user_requests.count(), 1)
         self.assertEqual(user_requests[0].topic, 'Artificial Intelligence')
+
+@override_settings(
+    TESTING=True,
+    AI_BLOG_THROTTLE_USER_CAPACITY=2, AI_BLOG_THROTTLE_USER_REFILL=60,
+    AI_BLOG_THROTTLE_GLOBAL_CAPACITY=3, AI_BLOG_THROTTLE_GLOBAL_REFILL=60,
+)
+class GenerationThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create(self, topic, client=None):
+        return (client or self.client).post('/api/ai-blog/requests/', {
+            'prompt': 'Write about it', 'topic': topic, 'keywords': 'a, b', 'allow_web_search': False,
+        }, format='json')
+
+    def test_user_bucket(self):
+        self.assertEqual(self._create('One').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._create('Two').status_code, status.HTTP_201_CREATED)
+        response = self._create('Three')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        state = self.client.get('/api/ai-blog/requests/throttle/').data
+        self.assertEqual(state['user']['capacity'], 2)
+        self.assertLess(state['user']['tokens'], 1)
+        self.assertGreater(state['user']['retry_after'], 0)
+        self.assertLess(state['global']['tokens'], 2)
+
+    def test_global_bucket(self):
+        self._create('One')
+        self._create('Two')
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='testpassword'))
+        self.assertEqual(self._create('Three', other).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._create('Four', other).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_duplicate_requests_are_coalesced(self):
+        first = self._create('Same')
+        second = self._create('Same')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(AIBlogRequest.objects.count(), 1)
+        # Joining a job in flight costs nothing.
+        self.assertEqual(self._create('Other').status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(f"/api/ai-blog/requests/{first.data['id']}/regenerate/")
+        self.assertEqual(response.data, {'status': 'regenerating'})
+        self.assertEqual(self._create('Third').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_batch_create_is_throttled_and_coalesced(self):
+        data = {'topic': 'Series', 'description': 'd', 'prompt': 'p', 'num_posts': 1}
+        first = self.client.post('/api/ai-blog/batch-requests/', data, format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        second = self.client.post('/api/ai-blog/batch-requests/', data, format='json')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(AIBlogBatchRequest.objects.count(), 1)
+        # Ideas plus one post took both of the user's tokens.
+        self.assertEqual(self._create('After batch').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_batch_larger_than_allowance_takes_all_of_it(self):
+        data = {'topic': 'Series', 'description': 'd', 'prompt': 'p', 'num_posts': 2}
+        response = self.client.post('/api/ai-blog/batch-requests/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._create('Single').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+@override_settings(TESTING=True)
+class DefaultBatchThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_default_batch_is_admitted(self):
+        data = {'topic': 'Series', 'description': 'd', 'prompt': 'p', 'num_posts': 5}
+        response = self.client.post('/api/ai-blog/batch-requests/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+class FairSchedulerTests(TestCase):
+    def _run(self, jobs, scheduler=None, before_release=None):
+        """Run ``(user, priority)`` jobs queued behind a blocker on one worker; returns the run order."""
+        scheduler = scheduler or FairScheduler(workers=1)
+        release, done = threading.Event(), threading.Event()
+        order = []
+
+        def job(user, priority):
+            order.append((user, priority))
+            if len(order) == len(jobs):
+                done.set()
+
+        scheduler.submit(release.wait, user_id=0)
+        for user, priority in jobs:
+            scheduler.submit(lambda user=user, priority=priority: job(user, priority), user, priority=priority)
+        self.assertEqual(scheduler.metrics(user_id='a')['queued_for_user'], sum(1 for user, _ in jobs if user == 'a'))
+        if before_release:
+            before_release()
+        release.set()
+        self.assertTrue(done.wait(5))
+        return order, scheduler.metrics()
+
+    def test_users_take_turns_and_interactive_goes_first(self):
+        order, metrics = self._run(
+            [('a', 'batch')] * 3 + [('b', 'batch')] + [('c', 'interactive')]
+        )
+        self.assertEqual(order, [
+            ('c', 'interactive'), ('a', 'batch'), ('b', 'batch'), ('a', 'batch'), ('a', 'batch'),
+        ])
+        self.assertEqual(metrics['queued'], {'interactive': 0, 'batch': 0})
+        self.assertEqual(metrics['wait_seconds']['batch']['samples'], 4)
+
+    def test_aged_batch_work_is_not_starved(self):
+        order, _ = self._run(
+            [('a', 'batch')] + [('b', 'interactive')] * 2,
+            scheduler=FairScheduler(workers=1, batch_max_wait=0.05), before_release=lambda: time.sleep(0.1),
+        )
+        self.assertEqual(order[0], ('a', 'batch'))
+
+class BatchGenerationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+        self.batch = AIBlogBatchRequest.objects.create(
+            user=self.user, topic='Series', description='d', prompt='p', num_posts=2,
+        )
+
+    def test_batch_posts_are_queued_as_separate_jobs(self):
+        ideas = [{'title': 'One', 'description': 'first'}, {'title': 'Two', 'description': 'second'}]
+        queued = []
+        outcomes = iter(['failed', 'completed'])
+
+        def generate(request_id):
+            AIBlogRequest.objects.filter(pk=request_id).update(status=next(outcomes))
+
+        with mock.patch('ai_blog_generator.views.scheduler.submit', lambda fn, *args, **kwargs: queued.append((fn, kwargs))), \
+                mock.patch('ai_blog_generator.views.ai_service.generate_blog_post_ideas', return_value=ideas), \
+                mock.patch('ai_blog_generator.views.ai_service.generate_blog_post', side_effect=generate):
+            queue_batch(self.batch)
+            queued.pop(0)[0]()
+            self.assertEqual([kwargs['priority'] for _, kwargs in queued], ['batch', 'batch'])
+            self.assertEqual(self.batch.child_requests.count(), 2)
+
+            queued[0][0]()
+            self.batch.refresh_from_db()
+            self.assertEqual(self.batch.status, 'processing')
+            queued[1][0]()
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'completed')
+        self.assertEqual(self.batch.error_message, '1 out of 2 blog post generations failed.')
+
+    def test_batch_finishes_when_a_child_cannot_be_queued(self):
+        ideas = [{'title': 'One', 'description': 'first'}, {'title': 'Two', 'description': 'second'}]
+        queued = []
+
+        def submit_child(blog_request):
+            if queued:
+                raise RuntimeError('scheduler stopped')
+            queued.append(blog_request)
+
+        with mock.patch.object(ai_service, 'generate_blog_post_ideas', return_value=ideas):
+            ai_service.generate_batch_blog_posts(self.batch.id, submit_child=submit_child)
+        second = self.batch.child_requests.get(topic='Two')
+        self.assertEqual(second.status, 'failed')
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'processing')
+
+        # The queued post finishing completes the batch.
+        AIBlogRequest.objects.filter(pk=queued[0].pk).update(status='completed')
+        ai_service.finish_batch(self.batch.id)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'completed')
+        self.assertEqual(self.batch.error_message, '1 out of 2 blog post generations failed.')
+
+    def test_batch_finishes_when_a_child_dies_while_pending(self):
+        queued = []
+        with mock.patch('ai_blog_generator.views.scheduler.submit', lambda fn, *args, **kwargs: queued.append(fn)), \
+                mock.patch('ai_blog_generator.views.ai_service.generate_blog_post', side_effect=RuntimeError('db down')):
+            child = AIBlogRequest.objects.create(
+                user=self.user, prompt='p', topic='One', parent_batch=self.batch,
+            )
+            self.batch.status = 'processing'
+            self.batch.save()
+            queue_generation(child)
+            with self.assertRaises(RuntimeError):
+                queued[0]()
+        child.refresh_from_db()
+        self.assertEqual(child.status, 'failed')
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'failed')
+
+class FakeStream:
+    def __init__(self, status_code=200, chunks=()):
+        self.status_code = status_code
+        self.text = ''
+        self.lines = [f'data: {json.dumps(chunk)}' for chunk in chunks] + ['data: [DONE]']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+def completion_chunks(text, prompt_tokens=1200, completion_tokens=800, cached_tokens=0):
+    return [{'choices': [{'delta': {'content': piece}}]} for piece in (text[:5], text[5:])] + [{
+        'choices': [],
+        'usage': {
+            'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': cached_tokens},
+        },
+    }]
+
+@override_settings(AI_LLM_PRICING={'test-model': (1.0, 2.0)}, AI_LLM_MAX_RETRIES=2)
+class LLMTelemetryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+        self.batch = AIBlogBatchRequest.objects.create(user=self.user, topic='Series', description='d', prompt='p')
+        self.request = AIBlogRequest.objects.create(
+            user=self.user, prompt='p', topic='Caching', parent_batch=self.batch,
+        )
+        patcher = mock.patch.multiple(ai_service, model='test-model', use_groq=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('ai_blog_generator.ai_service.time.sleep')
+    def test_call_is_recorded_with_usage_and_retries(self, sleep):
+        body = json.dumps({'title': 'Caching', 'content': '<p>x</p>'})
+        responses = [FakeStream(429), FakeStream(chunks=completion_chunks(body, cached_tokens=1024))]
+        with mock.patch('ai_blog_generator.ai_service.requests.post', side_effect=responses):
+            data = ai_service.call_ai_service('p', 'Caching', request=self.request)
+
+        self.assertEqual(data['title'], 'Caching')
+        call = LLMCall.objects.get()
+        self.assertEqual((call.request, call.batch, call.user), (self.request, self.batch, self.user))
+        self.assertEqual((call.purpose, call.model), ('post', 'test-model'))
+        self.assertEqual((call.prompt_tokens, call.completion_tokens, call.cached_tokens), (1200, 800, 1024))
+        self.assertTrue(call.cache_hit)
+        self.assertTrue(call.success)
+        self.assertEqual(call.retries, 1)
+        self.assertIsNotNone(call.ttft_ms)
+        self.assertEqual(call.cost_usd, Decimal('0.002800'))
+        sleep.assert_called_once_with(1)
+
+    @mock.patch('ai_blog_generator.ai_service.time.sleep')
+    def test_failed_call_is_recorded(self, sleep):
+        with mock.patch('ai_blog_generator.ai_service.requests.post', return_value=FakeStream(503)):
+            ideas = ai_service.generate_blog_post_ideas('Series', 'd', batch=self.batch)
+
+        self.assertEqual(ideas, [])
+        call = LLMCall.objects.get()
+        self.assertEqual((call.purpose, call.batch, call.success, call.retries), ('ideas', self.batch, False, 2))
+        self.assertIn('503', call.error)
+
+    def test_usage_is_aggregated(self):
+        for tokens_in in (100, 300):
+            LLMCall.objects.create(
+                request=self.request, batch=self.batch, user=self.user, model='test-model', prompt_tokens=tokens_in,
+                completion_tokens=50, latency_ms=1000, ttft_ms=200, cost_usd=Decimal('0.01'),
+            )
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        totals = client.get('/api/ai-blog/requests/usage/').data
+        self.assertEqual((totals['calls'], totals['tokens_in'], totals['tokens_out']), (2, 400, 100))
+        self.assertEqual(totals['cost'], Decimal('0.02'))
+        self.assertEqual(client.get(f'/api/ai-blog/batch-requests/{self.batch.pk}/usage/').data['calls'], 2)
+        self.assertEqual(client.get(f'/api/ai-blog/requests/{self.request.pk}/').data['usage']['avg_ttft_ms'], 200)
+
+        admin = User.objects.create_superuser(username='admin', password='adminpassword', email='admin@example.com')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/ai_blog_generator/llmcall/')
+        self.assertContains(response, 'Usage report')
+        self.assertContains(response, 'Batch #')
+
+class PromptBuilderTests(TestCase):
+    def _results(self, count, sentences=60):
+        return [
+            {'title': f'Result {i}', 'url': f'https://example.com/{i}', 'snippet': 'Caches store results. ' * sentences}
+            for i in range(count)
+        ]
+
+    def test_prompt_fits_budget(self):
+        system, user = build_post_messages('Caching', 'Be concise', 'cache', self._results(8), budget=1200)
+        self.assertLessEqual(estimate_tokens(system) + estimate_tokens(user), 1200)
+        self.assertIn('Please write a blog post about: Caching', user)
+        self.assertIn('Additional instructions: Be concise', user)
+        self.assertIn('URL: https://example.com/0', user)
+        self.assertIn('\nThe blog post should include:\n1. An engaging title', system)
+
+    def test_results_that_do_not_fit_are_dropped(self):
+        system, user = build_post_messages('Caching', search_results=self._results(3), budget=600)
+        self.assertLessEqual(estimate_tokens(system) + estimate_tokens(user), 600)
+        self.assertIn('https://example.com/0', user)
+        self.assertNotIn('https://example.com/2', user)
+
+        _, user = build_post_messages('Caching', search_results=self._results(2) * 2, budget=5000)
+        self.assertEqual(user.count('https://example.com/0'), 1)
+
+    def test_snippets_and_keywords_are_compacted(self):
+        self.assertEqual(truncate_to_tokens('One two.  Three   four five six seven.', 4), 'One two.')
+        self.assertEqual(truncate_to_tokens('alpha beta gamma delta epsilon', 5), 'alpha beta gamma…')
+        self.assertEqual(compact_keywords(' AI, ml,ai , , deep  learning', 60), 'AI, ml, deep learning')
+        self.assertEqual(compact_keywords('one, two, three', 4), 'one, two')
+
+class FakeProvider(retrieval.SearchProvider):
+    def __init__(self, name, results=(), delay=0, error=None):
+        self.name = name
+        self.results = list(results)
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def search(self, query, limit):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.results[:limit]
+
+class RetrievalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _result(self, url):
+        return {'title': url, 'url': url, 'snippet': f'About {url}'}
+
+    def test_providers_are_queried_in_parallel_and_merged(self):
+        first = FakeProvider('first', [self._result('a'), self._result('b')], delay=0.2)
+        second = FakeProvider('second', [self._result('b'), self._result('c')], delay=0.2)
+        started = time.monotonic()
+        results = retrieval.search('Vector  Search', [first, second], limit=5, timeout=2)
+        self.assertLess(time.monotonic() - started, 0.38)
+        self.assertEqual([result['url'] for result in results], ['a', 'b', 'c'])
+
+        # Cached per normalized query.
+        self.assertEqual(retrieval.search('vector search', [first, second], limit=5), results)
+        self.assertEqual((first.calls, second.calls), (1, 1))
+
+    def test_slow_and_failing_providers_are_skipped_and_not_cached(self):
+        fast = FakeProvider('fast', [self._result('a')])
+        slow = FakeProvider('slow', [self._result('b')], delay=0.5)
+        broken = FakeProvider('broken', error=RuntimeError('down'))
+        started = time.monotonic()
+        results = retrieval.search('query', [fast, slow, broken], timeout=0.1)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(results, [self._result('a')])
+        # The timed-out call is still running: the provider is skipped, not queued behind it.
+        started = time.monotonic()
+        retrieval.search('query', [fast, slow, broken], timeout=0.1)
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual((fast.calls, slow.calls, broken.calls), (2, 1, 2))
+
+        time.sleep(0.5)
+        retrieval.search('query', [fast, slow, broken], timeout=0.1)
+        self.assertEqual(slow.calls, 2)
+
+    @override_settings(SITE_URL='https://example.com')
+    def test_local_provider_searches_published_posts(self):
+        author = User.objects.create_user(username='author', password='testpassword')
+        BlogPost.objects.create(
+            title='Retrieval augmented generation', slug='rag', author=author, status='published',
+            content='<p>Grounding answers in documents.</p>',
+        )
+        BlogPost.objects.create(title='Retrieval drafts', author=author, content='x')
+        results = retrieval.LocalPostProvider().search('retrieval', 5)
+        self.assertEqual(results, [{
+            'title': 'Retrieval augmented generation',
+            'url': 'https://example.com/blog/rag',
+            'snippet': 'Grounding answers in documents.',
+        }])
@@ -0,0 +1,108 @@
+"""
+Token-bucket throttling for the endpoints that queue LLM work.
+
+Each user has a bucket of ``AI_BLOG_THROTTLE_USER_CAPACITY`` tokens that
+refills one token every ``AI_BLOG_THROTTLE_USER_REFILL`` seconds, and all
+users share a global bucket (``AI_BLOG_THROTTLE_GLOBAL_*``). Submitting a
+job takes one token from both, so one user can burst up to their
+capacity but not drain the shared worker pool. Actions that queue several
+jobs take one token per job (a batch takes one for idea generation plus
+one per post), capped at the smaller capacity: a batch bigger than the
+allowance waits for a full bucket and then empties it, rather than being
+refused forever.
+
+Bucket state lives in the Django cache as ``(tokens, timestamp)`` and is
+refilled lazily on read; an absent entry is a full bucket.
+
+Read-modify-write of the buckets is serialized by a process lock, which
+makes it exact with a per-process cache and approximate (it may admit a
+few extra requests under races) with a shared one.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+_lock = threading.Lock()
+
+class TokenBucket:
+    def __init__(self, key, capacity, refill_seconds):
+        self.key = f'ai-blog-throttle:{key}'
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+
+    def level(self, now):
+        state = cache.get(self.key)
+        if state is None:
+            return float(self.capacity)
+        tokens, stamp = state
+        return min(float(self.capacity), tokens + max(now - stamp, 0) / self.refill_seconds)
+
+    def save(self, tokens, now):
+        # Once full again the entry is indistinguishable from an absent one.
+        timeout = max(int((self.capacity - tokens) * self.refill_seconds) + 1, 1)
+        cache.set(self.key, (tokens, now), timeout)
+
+    def wait(self, tokens, cost=1):
+        return max(cost - tokens, 0) * self.refill_seconds
+
+    def state(self, now=None):
+        tokens = self.level(now or time.time())
+        return {
+            'capacity': self.capacity,
+            'tokens': round(tokens, 2),
+            'refill_seconds': self.refill_seconds,
+            'retry_after': round(self.wait(tokens), 1),
+        }
+
+def user_bucket(user):
+    return TokenBucket(
+        f'user:{user.pk}',
+        getattr(settings, 'AI_BLOG_THROTTLE_USER_CAPACITY', 5),
+        getattr(settings, 'AI_BLOG_THROTTLE_USER_REFILL', 60),
+    )
+
+def global_bucket():
+    return TokenBucket(
+        'global',
+        getattr(settings, 'AI_BLOG_THROTTLE_GLOBAL_CAPACITY', 30),
+        getattr(settings, 'AI_BLOG_THROTTLE_GLOBAL_REFILL', 6),
+    )
+
+def take(buckets, cost=1):
+    """
+    Take ``cost`` tokens from every bucket, or from none of them.
+
+    Returns ``(allowed, wait)`` where ``wait`` is the number of seconds
+    until the request would be allowed.
+    """
+    with _lock:
+        now = time.time()
+        levels = [bucket.level(now) for bucket in buckets]
+        if all(tokens >= cost for tokens in levels):
+            for bucket, tokens in zip(buckets, levels):
+                bucket.save(tokens - cost, now)
+            return True, 0
+        return False, max(bucket.wait(tokens, cost) for bucket, tokens in zip(buckets, levels))
+
+def capacity(user):
+    """Largest cost a request from ``user`` can ever be allowed."""
+    return min(user_bucket(user).capacity, global_bucket().capacity)
+
+def throttle_state(user):
+    now = time.time()
+    return {'user': user_bucket(user).state(now), 'global': global_bucket().state(now)}
+
+class AIGenerationThrottle(BaseThrottle):
+    """Per-user and global token buckets for requests that queue generation jobs."""
+
+    def allow_request(self, request, view):
+        cost = view.throttle_cost() if hasattr(view, 'throttle_cost') else 1
+        cost = min(cost, capacity(request.user))
+        allowed, self._wait = take([user_bucket(request.user), global_bucket()], cost)
+        return allowed
+
+    def wait(self):
+        return self._wait
@@ -1,21 +1,21 @@
 import logging
-import traceback
-from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, authentication_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
-from rest_framework.authtoken.models import Token
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
+from django.utils import timezone
 
+from authentication.authentication import CachedTokenAuthentication
+from authentication.models import AuthToken
 from blog.models import BlogPost
 
-from .models import AIBlogRequest, AIBlogGeneration, AIBlogBatchRequest
+from .models import AIBlogRequest, AIBlogGeneration, AIBlogBatchRequest, LLMCall
 from .serializers import (
     AIBlogRequestSerializer,
     AIBlogGenerationSerializer,
@@ -24,20 +24,116 @@ from .serializers import (
     AIBlogBatchRequestDetailSerializer
 )
 from .ai_service import ai_service
+from .scheduler import BATCH, INTERACTIVE, FairScheduler
+from .telemetry import usage_totals
+from .throttling import AIGenerationThrottle, throttle_state
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-# Thread pool for running background tasks
-thread_pool = ThreadPoolExecutor(max_workers=5)
+# Workers for running generation jobs, shared fairly between users
+scheduler = FairScheduler(
+    workers=getattr(settings, 'AI_BLOG_WORKERS', 5),
+    batch_max_wait=getattr(settings, 'AI_BLOG_BATCH_MAX_WAIT', 60),
+)
+
+def queue_generation(blog_request):
+    """Queue generation of one post; batch children queue behind interactive requests."""
+    def run_background_task():
+        try:
+            ai_service.generate_blog_post(blog_request.id)
+        finally:
+            if blog_request.parent_batch_id:
+                # The job is over: a child it left in flight (e.g. after a database
+                # error) has failed, or the batch would never finish.
+                AIBlogRequest.objects.filter(pk=blog_request.id, status__in=IN_FLIGHT_STATUSES).update(
+                    status='failed', error_message='Generation stopped before completing.',
+                )
+                ai_service.finish_batch(blog_request.parent_batch_id)
+    
+    scheduler.submit(
+        run_background_task, blog_request.user_id,
+        priority=BATCH if blog_request.parent_batch_id else INTERACTIVE,
+        label=f'request {blog_request.id}',
+    )
+
+def queue_batch(batch_request):
+    """Queue idea generation for a batch; its posts are then queued one job each."""
+    def run_background_task():
+        ai_service.generate_batch_blog_posts(batch_request.id, submit_child=queue_generation)
+    
+    scheduler.submit(run_background_task, batch_request.user_id, priority=BATCH, label=f'batch {batch_request.id}')
+
+IN_FLIGHT_STATUSES = ('pending', 'processing')
+
+def in_flight(queryset):
+    """The newest job in ``queryset`` that is queued or running, if any."""
+    window = timedelta(seconds=getattr(settings, 'AI_BLOG_COALESCE_WINDOW', 15 * 60))
+    return (
+        queryset.filter(status__in=IN_FLIGHT_STATUSES, updated_at__gte=timezone.now() - window)
+        .order_by('-created_at').first()
+    )
+
+class GenerationThrottleMixin:
+    """
+    Throttle the actions that queue generation jobs, and coalesce a request
+    that duplicates a job still in flight onto that job instead of queueing
+    another. Coalesced requests cost no throttle tokens; others take one
+    token per generation job they queue (see ``throttle_cost``), at most the
+    user's whole allowance.
+    """
+    throttled_actions = ('create', 'regenerate')
+
+    def get_throttles(self):
+        if self.action in self.throttled_actions:
+            return [AIGenerationThrottle()]
+        return super().get_throttles()
+
+    def check_throttles(self, request):
+        if self.find_in_flight() is None:
+            super().check_throttles(request)
+
+    def throttle_cost(self):
+        """Throttle tokens taken by the current action: one per generation job it queues."""
+        return 1
+
+    def coalesce_filter(self, validated_data):
+        return validated_data
+
+    def get_validated_data(self):
+        """The create payload, validated once per request; None if invalid."""
+        if not hasattr(self, '_validated_data'):
+            serializer = self.get_serializer(data=self.request.data)
+            self._validated_data = serializer.validated_data if serializer.is_valid() else None
+        return self._validated_data
+
+    def find_in_flight(self):
+        if not hasattr(self, '_in_flight'):
+            self._in_flight = None
+            if self.action == 'create':
+                validated_data = self.get_validated_data()
+                if validated_data is not None:
+                    self._in_flight = in_flight(
+                        self.get_queryset().filter(**self.coalesce_filter(validated_data))
+                    )
+            elif self.action == 'regenerate':
+                self._in_flight = in_flight(self.get_queryset().filter(pk=self.kwargs.get('pk')))
+        return self._in_flight
+
+    def create(self, request, *args, **kwargs):
+        existing = self.find_in_flight()
+        if existing is not None:
+            logger.info(f"Coalesced duplicate request from {request.user.username} onto job {existing.pk}")
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+        return super().create(request, *args, **kwargs)
 
 # Add CORS middleware for preflight requests
 @method_decorator(csrf_exempt, name='dispatch')
-class AIBlogRequestViewSet(viewsets.ModelViewSet):
+class AIBlogRequestViewSet(GenerationThrottleMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing AI blog post requests.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
@@ -78,12 +174,7 @@ class AIBlogRequestViewSet(viewsets.ModelViewSet):
             token_key = auth_header.split(' ')[1]
         
         # Try to get the token from the database
-        token = None
-        if token_key:
-            try:
-                token = Token.objects.get(key=token_key)
-            except Token.DoesNotExist:
-                pass
+        token = AuthToken.lookup(token_key) if token_key else None
         
         # Get the user from the token
         user = None
@@ -101,6 +192,27 @@ class AIBlogRequestViewSet(viewsets.ModelViewSet):
             'auth_header': auth_header,
         })
     
+    @action(detail=False, methods=['get'])
+    def throttle(self, request):
+        """
+        Current state of the caller's and the global generation throttles.
+        """
+        return Response(throttle_state(request.user))
+    
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        """
+        Depth of the generation queues and recent queue wait times.
+        """
+        return Response(scheduler.metrics(user_id=request.user.pk))
+    
+    @action(detail=False, methods=['get'])
+    def usage(self, request):
+        """
+        Token usage, latency and estimated cost of the current user's LLM calls.
+        """
+        return Response(usage_totals(LLMCall.objects.filter(user=request.user)))
+    
     def get_serializer_class(self):
         """
         Return the appropriate serializer class.
@@ -109,6 +221,10 @@ class AIBlogRequestViewSet(viewsets.ModelViewSet):
             return AIBlogRequestListSerializer
         return AIBlogRequestSerializer
     
+    def coalesce_filter(self, validated_data):
+        # Batch children are queued by their batch, not by clients.
+        return {**validated_data, 'parent_batch__isnull': True}
+    
     def perform_create(self, serializer):
         """
         Set the user when creating a request.
@@ -117,15 +233,8 @@ class AIBlogRequestViewSet(viewsets.ModelViewSet):
         
         # Skip blog generation in test environment
         if not self._is_test_environment():
-            # Start the blog generation process in a background thread
-            def run_background_task():
-                try:
-                    ai_service.generate_blog_post(request.id)
-                except Exception as e:
-                    logger.error(f"Error in background task: {e}")
-                    logger.error(traceback.format_exc())
-            
-            thread_pool.submit(run_background_task)
+            # Queue the blog generation process for a background worker
+            queue_generation(request)
     
     def _is_test_environment(self):
         """
@@ -162,6 +271,10 @@ class AIBlogRequestViewSet(viewsets.ModelViewSet):
             # Get the request
             blog_request = self.get_object()
             
+            # Already queued or running: join that run instead of starting another
+            if self.find_in_flight() is not None:
+                return Response({'status': 'regenerating'})
+            
             # Check if the request is already completed
             if blog_request.status == 'completed':
                 # Delete the existing generation
@@ -184,15 +297,8 @@ class AIBlogRequestViewSet(viewsets.ModelViewSet):
             
             # Skip blog generation in test environment
             if not self._is_test_environment():
-                # Start the blog generation process in a background thread
-                def run_background_task():
-                    try:
-                        ai_service.generate_blog_post(blog_request.id)
-                    except Exception as e:
-                        logger.error(f"Error in background task: {e}")
-                        logger.error(traceback.format_exc())
-                
-                thread_pool.submit(run_background_task)
+                # Queue the blog generation process for a background worker
+                queue_generation(blog_request)
             
             return Response({'status': 'regenerating'})
         except Exception as e:
@@ -204,7 +310,7 @@ class AIBlogGenerationViewSet(viewsets.ReadOnlyModelViewSet):
     ViewSet for viewing AI-generated blog posts.
     """
     serializer_class = AIBlogGenerationSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
@@ -258,11 +364,11 @@ class AIBlogGenerationViewSet(viewsets.ReadOnlyModelViewSet):
             logger.error(f"Error publishing blog post: {e}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class AIBlogBatchRequestViewSet(viewsets.ModelViewSet):
+class AIBlogBatchRequestViewSet(GenerationThrottleMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing batch AI blog post requests.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
@@ -279,6 +385,23 @@ class AIBlogBatchRequestViewSet(viewsets.ModelViewSet):
             return AIBlogBatchRequestDetailSerializer
         return AIBlogBatchRequestSerializer
     
+    def throttle_cost(self):
+        """
+        Idea generation plus one generation per post.
+        """
+        if not hasattr(self, '_throttle_cost'):
+            num_posts = 0
+            if self.action == 'create':
+                # An invalid payload is rejected by validation, not the throttle.
+                validated_data = self.get_validated_data()
+                if validated_data is not None:
+                    num_posts = validated_data.get('num_posts', AIBlogBatchRequest._meta.get_field('num_posts').default)
+            elif self.action == 'regenerate':
+                batch = self.get_queryset().filter(pk=self.kwargs.get('pk'))
+                num_posts = batch.values_list('num_posts', flat=True).first() or 0
+            self._throttle_cost = 1 + max(num_posts, 0)
+        return self._throttle_cost
+    
     def perform_create(self, serializer):
         """
         Set the user when creating a batch request.
@@ -287,15 +410,8 @@ class AIBlogBatchRequestViewSet(viewsets.ModelViewSet):
         
         # Skip blog generation in test environment
         if not self._is_test_environment():
-            # Start the batch blog generation process in a background thread
-            def run_background_task():
-                try:
-                    ai_service.generate_batch_blog_posts(batch_request.id)
-                except Exception as e:
-                    logger.error(f"Error in batch background task: {e}")
-                    logger.error(traceback.format_exc())
-            
-            thread_pool.submit(run_background_task)
+            # Queue the batch blog generation process for a background worker
+            queue_batch(batch_request)
     
     def _is_test_environment(self):
         """
@@ -303,6 +419,14 @@ class AIBlogBatchRequestViewSet(viewsets.ModelViewSet):
         """
         return getattr(settings, 'TESTING', False)
     
+    @action(detail=True, methods=['get'])
+    def usage(self, request, pk=None):
+        """
+        Token usage, latency and estimated cost of a batch's LLM calls.
+        """
+        batch_request = self.get_object()
+        return Response(usage_totals(batch_request.llm_calls.all()))
+    
     @action(detail=True, methods=['post'])
     def regenerate(self, request, pk=None):
         """
@@ -312,6 +436,10 @@ class AIBlogBatchRequestViewSet(viewsets.ModelViewSet):
             # Get the batch request
             batch_request = self.get_object()
             
+            # Already queued or running: join that run instead of starting another
+            if self.find_in_flight() is not None:
+                return Response({'status': 'regenerating'})
+            
             # Delete the existing child requests and their generations
             for child_request in batch_request.child_requests.all():
                 try:
@@ -335,15 +463,8 @@ class AIBlogBatchRequestViewSet(viewsets.ModelViewSet):
             
             # Skip blog generation in test environment
             if not self._is_test_environment():
-                # Start the batch blog generation process in a background thread
-                def run_background_task():
-                    try:
-                        ai_service.generate_batch_blog_posts(batch_request.id)
-                    except Exception as e:
-                        logger.error(f"Error in batch background task: {e}")
-                        logger.error(traceback.format_exc())
-                
-                thread_pool.submit(run_background_task)
+                # Queue the batch blog generation process for a background worker
+                queue_batch(batch_request)
             
             return Response({'status': 'regenerating'})
         except Exception as e:
@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import AuthToken
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ('prefix', 'user', 'created', 'expires_at')
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('prefix', 'created', 'expires_at')
+    ordering = ('-created',)
+
+    def has_add_permission(self, request):
+        # Keys are only known when issued; use the login endpoint or create_auth_token
+        return False
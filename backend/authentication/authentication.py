@@ -0,0 +1,53 @@
+"""
+Token authentication against ``AuthToken`` with the lookup cached.
+
+Each request carries ``Authorization: Token <key>``. The resolved token
+(with its user) is kept in the Django cache for
+``AUTH_TOKEN_CACHE_TIMEOUT`` seconds under the key's digest, so raw keys
+never end up in cache keys and a cached request costs no queries. Entries
+are dropped as soon as a token is deleted (``RegenerateAuthToken``,
+expiry cleanup) or its user is saved, e.g. deactivated (see
+``authentication.signals``). The short TTL bounds staleness in processes
+that do not share the cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import AuthToken, hash_key
+
+def get_cache_timeout():
+    return getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 60)
+
+def token_cache_key(digest):
+    return f"auth-token:{digest}"
+
+def invalidate_token(token):
+    cache.delete(token_cache_key(token.digest))
+
+def invalidate_user_tokens(user):
+    digests = AuthToken.objects.filter(user=user).values_list('digest', flat=True)
+    cache.delete_many([token_cache_key(digest) for digest in digests])
+
+class CachedTokenAuthentication(TokenAuthentication):
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(hash_key(key))
+        token = cache.get(cache_key)
+        changed = False
+        if token is None or token.is_expired():
+            token = AuthToken.lookup(key)
+            if token is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            changed = True
+
+        if not token.user.is_active:
+            cache.delete(cache_key)
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        if token.refresh() or changed:
+            cache.set(cache_key, token, get_cache_timeout())
+        return (token.user, token)
@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from authentication.authentication import CachedTokenAuthentication, invalidate_token
+from authentication.models import AuthToken
+
+class UncachedTokenAuthentication(TokenAuthentication):
+    """Baseline: resolve the token from the database on every request."""
+    def authenticate_credentials(self, key):
+        token = AuthToken.lookup(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return (token.user, token)
+
+class Command(BaseCommand):
+    help = 'Measure per-request token authentication overhead, uncached vs cached'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Authenticated requests to time per backend',
+        )
+
+    def _run(self, backend, key, count):
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key}'))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(count):
+                backend.authenticate(request)
+            elapsed = time.perf_counter() - started
+        return elapsed / count * 1e6, len(queries) / count
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        # Work on a throwaway user and token, rolled back at the end.
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'auth-benchmark-{time.time_ns()}')
+            token, key = AuthToken.issue(user)
+            for name, backend in (
+                ('Uncached', UncachedTokenAuthentication()),
+                ('CachedTokenAuthentication', CachedTokenAuthentication()),
+            ):
+                micros, queries = self._run(backend, key, count)
+                self.stdout.write(f'{name:<28} {micros:8.1f} us/request  {queries:.3f} queries/request')
+            invalidate_token(token)
+            transaction.set_rollback(True)
+        backend = caches['default'].__class__.__name__
+        self.stdout.write(self.style.SUCCESS(f'Timed {count} requests per backend using the {backend} cache'))
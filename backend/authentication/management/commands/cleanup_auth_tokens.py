@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from authentication.models import AuthToken
+
+class Command(BaseCommand):
+    help = 'Delete expired auth tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Tokens deleted per transaction',
+        )
+
+    def handle(self, *args, **options):
+        deleted = AuthToken.delete_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired auth tokens'))
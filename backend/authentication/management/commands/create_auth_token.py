@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import AuthToken
+
+class Command(BaseCommand):
+    help = 'Issue an API auth token for a user and print its key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+        token, key = AuthToken.issue(user)
+        self.stdout.write(key)
+        self.stdout.write(self.style.SUCCESS(f'Issued token for {user.username}, valid until {token.expires_at:%Y-%m-%d %H:%M}'))
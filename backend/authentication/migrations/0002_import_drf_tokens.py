@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def import_drf_tokens(apps, schema_editor):
+    """Carry existing plaintext DRF tokens over as digests, then drop them."""
+    from django.utils import timezone
+    from authentication.models import PREFIX_LENGTH, get_token_ttl, hash_key
+
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('authentication', 'AuthToken')
+    expires_at = timezone.now() + get_token_ttl()
+    seen = set()
+    tokens = []
+    for key, user_id in Token.objects.values_list('key', 'user_id').iterator(chunk_size=500):
+        prefix = key[:PREFIX_LENGTH]
+        if prefix in seen:
+            continue  # colliding prefix: that user logs in again
+        seen.add(prefix)
+        tokens.append(AuthToken(user_id=user_id, prefix=prefix, digest=hash_key(key), expires_at=expires_at))
+    AuthToken.objects.bulk_create(tokens, batch_size=500)
+    Token.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(import_drf_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+"""
+API auth tokens stored as digests.
+
+Only a SHA-256 digest of each key is kept; the key itself is shown once,
+when the token is issued. Keys are random, so a fast digest is enough. A
+request's token is found through the unique index on the key's first
+``PREFIX_LENGTH`` characters and the digest is then compared in constant
+time. Tokens expire ``AUTH_TOKEN_TTL`` seconds after they were last
+extended; use pushes the expiry forward, at most once per
+``AUTH_TOKEN_REFRESH_INTERVAL`` so that reads do not each cause a write.
+"""
+import hashlib
+import hmac
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+PREFIX_LENGTH = 8
+
+def get_token_ttl():
+    return timedelta(seconds=getattr(settings, 'AUTH_TOKEN_TTL', 60 * 60 * 24 * 14))
+
+def get_refresh_interval():
+    return timedelta(seconds=getattr(settings, 'AUTH_TOKEN_REFRESH_INTERVAL', 60 * 60))
+
+def hash_key(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+class AuthToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    prefix = models.CharField(max_length=PREFIX_LENGTH, unique=True, editable=False)
+    digest = models.CharField(max_length=64, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return f"{self.prefix}… ({self.user.username})"
+
+    @classmethod
+    def issue(cls, user):
+        """Create a token for ``user``; returns ``(token, key)``."""
+        for _ in range(5):
+            key = secrets.token_hex(20)
+            try:
+                with transaction.atomic():
+                    token = cls.objects.create(
+                        user=user,
+                        prefix=key[:PREFIX_LENGTH],
+                        digest=hash_key(key),
+                        expires_at=timezone.now() + get_token_ttl(),
+                    )
+                break
+            except IntegrityError:
+                continue  # prefix collision
+        else:
+            raise IntegrityError("Could not generate a unique token prefix")
+        cls.trim(user)
+        return token, key
+
+    @classmethod
+    def trim(cls, user):
+        """Keep only the newest ``AUTH_TOKEN_MAX_PER_USER`` tokens of ``user``."""
+        limit = getattr(settings, 'AUTH_TOKEN_MAX_PER_USER', 10)
+        stale = list(cls.objects.filter(user=user).order_by('-created', '-pk').values_list('pk', flat=True)[limit:])
+        if stale:
+            cls.objects.filter(pk__in=stale).delete()
+
+    @classmethod
+    def delete_expired(cls, batch_size=1000):
+        """Delete expired tokens ``batch_size`` at a time; returns how many were deleted."""
+        deleted = 0
+        now = timezone.now()
+        while True:
+            with transaction.atomic():
+                batch = list(cls.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    return deleted
+                deleted += cls.objects.filter(pk__in=batch).delete()[0]
+
+    @classmethod
+    def lookup(cls, key):
+        """The unexpired token for ``key``, with its user, or None."""
+        if len(key) < PREFIX_LENGTH:
+            return None
+        token = cls.objects.select_related('user').filter(prefix=key[:PREFIX_LENGTH]).first()
+        if token is None or not token.matches(key) or token.is_expired():
+            return None
+        return token
+
+    def matches(self, key):
+        return hmac.compare_digest(self.digest, hash_key(key))
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def refresh(self):
+        """Slide the expiry forward if it was last extended over a refresh interval ago."""
+        now = timezone.now()
+        if self.expires_at - get_token_ttl() > now - get_refresh_interval():
+            return False
+        expires_at = now + get_token_ttl()
+        # Only move forward from the expiry we read, so concurrent requests write once.
+        AuthToken.objects.filter(pk=self.pk, expires_at=self.expires_at).update(expires_at=expires_at)
+        self.expires_at = expires_at
+        return True
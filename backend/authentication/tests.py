@@ -0,0 +1,107 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import AuthToken, hash_key
+
+class AuthTokenTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+        self.token, self.key = AuthToken.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def _auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/ai-blog/requests/')
+        return response, [q['sql'] for q in queries if 'authentication_authtoken' in q['sql']]
+
+class CachedTokenAuthenticationTests(AuthTokenTestCase):
+    def test_lookup_is_cached(self):
+        response, token_queries = self._auth_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_queries), 1)
+
+        response, token_queries = self._auth_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_queries, [])
+
+    def test_regenerated_token_is_rejected_immediately(self):
+        self._auth_queries()
+        response = self.client.post('/api/auth/token/regenerate/')
+        self.assertEqual(response.status_code, 200)
+        new_key = response.data['token']
+
+        response, _ = self._auth_queries()
+        self.assertEqual(response.status_code, 401)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new_key}')
+        response, _ = self._auth_queries()
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        self._auth_queries()
+        self.user.is_active = False
+        self.user.save()
+
+        response, _ = self._auth_queries()
+        self.assertEqual(response.status_code, 401)
+
+class AuthTokenTests(AuthTokenTestCase):
+    def test_key_is_stored_hashed(self):
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.prefix, self.key[:8])
+        self.assertEqual(self.token.digest, hash_key(self.key))
+        self.assertFalse(AuthToken.objects.filter(digest=self.key).exists())
+        self.assertIsNone(AuthToken.lookup(self.key[:8] + 'x' * 32))
+
+    def test_login_issues_a_new_token(self):
+        client = APIClient()
+        keys = [
+            client.post('/api/auth-token/', {'username': 'writer', 'password': 'testpassword'}).data['token']
+            for _ in range(2)
+        ]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 3)
+
+    @override_settings(AUTH_TOKEN_MAX_PER_USER=2)
+    def test_oldest_tokens_are_trimmed(self):
+        AuthToken.issue(self.user)
+        AuthToken.issue(self.user)
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(AuthToken.objects.filter(pk=self.token.pk).exists())
+
+    def test_expired_token_is_rejected(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response, _ = self._auth_queries()
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(AUTH_TOKEN_TTL=3600, AUTH_TOKEN_REFRESH_INTERVAL=600)
+    def test_expiry_slides_at_most_once_per_interval(self):
+        recent = timezone.now() + timedelta(seconds=3300)
+        AuthToken.objects.filter(pk=self.token.pk).update(expires_at=recent)
+        self._auth_queries()
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.expires_at, recent)
+
+        cache.clear()
+        stale = timezone.now() + timedelta(seconds=2000)
+        AuthToken.objects.filter(pk=self.token.pk).update(expires_at=stale)
+        self._auth_queries()
+        self.token.refresh_from_db()
+        self.assertGreater(self.token.expires_at, timezone.now() + timedelta(seconds=3500))
+
+    def test_cleanup_deletes_expired_tokens(self):
+        expired = [AuthToken.issue(self.user)[0].pk for _ in range(3)]
+        AuthToken.objects.filter(pk__in=expired).update(expires_at=timezone.now() - timedelta(days=1))
+        call_command('cleanup_auth_tokens', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(list(AuthToken.objects.values_list('pk', flat=True)), [self.token.pk])
@@ -1,7 +1,7 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
+from .models import AuthToken
 from .serializers import RegisterSerializer
 import logging
 
@@ -27,7 +27,7 @@ class RegisterView(generics.CreateAPIView):
             user = serializer.save()
             
             # Create auth token
-            token, _ = Token.objects.get_or_create(user=user)
+            _, key = AuthToken.issue(user)
             
             # Log successful registration
             logger.info(f"New user registered: {user.username} (ID: {user.id})")
@@ -40,7 +40,7 @@ class RegisterView(generics.CreateAPIView):
                     "first_name": user.first_name,
                     "last_name": user.last_name
                 },
-                "token": token.key
+                "token": key
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
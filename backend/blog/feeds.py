@@ -0,0 +1,208 @@
+"""
+RSS and Atom feeds for published blog posts.
+
+Each feed (all posts, or one category or tag) is backed by a cached list
+of its newest ``BLOG_FEED_ITEMS`` entries. Signals keep the cached lists
+current incrementally: a saved post is upserted into the lists it belongs
+to, and a list is only dropped for rebuilding when removing a post leaves
+it short. Responses carry an ``ETag`` and ``Last-Modified`` derived from
+the entry list, so polling aggregators mostly get a 304 without the feed
+being queried or rendered.
+
+Scheduled posts (``published_at`` in the future) are kept out of the feeds
+until they go live. Each cached list records when the next scheduled post
+in it goes live, and is rebuilt on the first read after that time.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import feedgenerator, timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+
+from .models import BlogPost, Category, Tag
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+FEED_FORMATS = {
+    'xml': feedgenerator.Rss201rev2Feed,
+    'atom': feedgenerator.Atom1Feed,
+}
+
+def get_feed_size():
+    return getattr(settings, 'BLOG_FEED_ITEMS', 20)
+
+def _cache_key(scope):
+    return f'blog-feed:{scope}'
+
+def _refresh_key(scope):
+    return f'blog-feed-refresh:{scope}'
+
+def _entry(post):
+    return {
+        'id': post['id'],
+        'title': post['title'],
+        'slug': post['slug'],
+        'description': post['excerpt'] or post['meta_description'],
+        'author': post['author__username'],
+        'published_at': post['published_at'].isoformat(),
+        'updated_at': post['updated_at'].isoformat(),
+    }
+
+ENTRY_FIELDS = ('id', 'title', 'slug', 'excerpt', 'meta_description', 'author__username', 'published_at', 'updated_at')
+
+def _scope_queryset(scope, live=True):
+    queryset = BlogPost.objects.filter(status='published')
+    now = timezone.now()
+    queryset = queryset.filter(published_at__lte=now) if live else queryset.filter(published_at__gt=now)
+    if scope.startswith('category:'):
+        queryset = queryset.filter(categories__id=int(scope.split(':')[1]))
+    elif scope.startswith('tag:'):
+        queryset = queryset.filter(tags__id=int(scope.split(':')[1]))
+    return queryset
+
+def get_entries(scope):
+    """Newest entries for ``scope`` ('posts', 'category:<id>' or 'tag:<id>')."""
+    key, refresh_key = _cache_key(scope), _refresh_key(scope)
+    cached = cache.get_many([key, refresh_key])
+    entries = cached.get(key)
+    refresh_at = cached.get(refresh_key)
+    if entries is None or (refresh_at is not None and refresh_at <= timezone.now()):
+        rows = _scope_queryset(scope).order_by('-published_at', '-id').values(*ENTRY_FIELDS)[:get_feed_size()]
+        entries = [_entry(row) for row in rows]
+        refresh_at = _scope_queryset(scope, live=False).order_by('published_at').values_list(
+            'published_at', flat=True,
+        ).first()
+        cache.set(key, entries, CACHE_TIMEOUT)
+        if refresh_at is None:
+            cache.delete(refresh_key)
+        else:
+            cache.set(refresh_key, refresh_at, CACHE_TIMEOUT)
+    return entries
+
+def _sort_key(entry):
+    return (entry['published_at'], entry['id'])
+
+def upsert_entry(scope, post):
+    """Insert or refresh ``post`` in a cached entry list, if that list is cached."""
+    key = _cache_key(scope)
+    entries = cache.get(key)
+    if entries is None:
+        return
+    size = get_feed_size()
+    full = len(entries) >= size
+    entries = [entry for entry in entries if entry['id'] != post['id']]
+    entry = _entry(post)
+    if full and len(entries) < size and (not entries or _sort_key(entry) < _sort_key(entries[-1])):
+        # The post moved below the cut-off; the next-newest post is unknown.
+        cache.delete(key)
+        return
+    entries.append(entry)
+    entries.sort(key=_sort_key, reverse=True)
+    cache.set(key, entries[:size], CACHE_TIMEOUT)
+
+def remove_entry(scope, post_id):
+    """Drop a post from a cached entry list; a full list is rebuilt lazily."""
+    key = _cache_key(scope)
+    entries = cache.get(key)
+    if entries is None or not any(entry['id'] == post_id for entry in entries):
+        return
+    if len(entries) >= get_feed_size():
+        cache.delete(key)
+    else:
+        cache.set(key, [entry for entry in entries if entry['id'] != post_id], CACHE_TIMEOUT)
+
+def schedule_refresh(scope, when):
+    """Have a cached entry list rebuilt on the first read after ``when``."""
+    if cache.get(_cache_key(scope)) is None:
+        return
+    refresh_at = cache.get(_refresh_key(scope))
+    if refresh_at is None or when < refresh_at:
+        cache.set(_refresh_key(scope), when, CACHE_TIMEOUT)
+
+def post_scopes(post):
+    return (
+        ['posts']
+        + [f'category:{pk}' for pk in post.categories.values_list('pk', flat=True)]
+        + [f'tag:{pk}' for pk in post.tags.values_list('pk', flat=True)]
+    )
+
+def apply_post_change(post, scopes=None, deleted=False):
+    """Bring cached feeds in line with a saved or deleted post."""
+    scopes = scopes if scopes is not None else post_scopes(post)
+    scheduled = not deleted and post.status == 'published' and post.published_at > timezone.now()
+    if deleted or post.status != 'published' or scheduled:
+        for scope in scopes:
+            remove_entry(scope, post.pk)
+            if scheduled:
+                schedule_refresh(scope, post.published_at)
+        return
+    row = BlogPost.objects.filter(pk=post.pk).values(*ENTRY_FIELDS).first()
+    if row is None:
+        return
+    for scope in scopes:
+        upsert_entry(scope, row)
+
+def _validators(entries, *feed_fields):
+    digest = hashlib.sha256(json.dumps([feed_fields, entries], sort_keys=True).encode('utf-8')).hexdigest()
+    last_modified = max((parse_datetime(entry['updated_at']) for entry in entries), default=None)
+    return f'"{digest[:32]}"', last_modified
+
+def _feed_response(request, ext, scope, title, link, description):
+    entries = get_entries(scope)
+    etag, last_modified = _validators(entries, ext, title, description)
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if response is None:
+        site_url = settings.SITE_URL.rstrip('/')
+        feed = FEED_FORMATS[ext](
+            title=title,
+            link=f'{site_url}{link}',
+            description=description,
+            feed_url=request.build_absolute_uri(),
+            language=settings.LANGUAGE_CODE,
+        )
+        for entry in entries:
+            feed.add_item(
+                title=entry['title'],
+                link=f"{site_url}/blog/{entry['slug']}",
+                description=entry['description'],
+                author_name=entry['author'],
+                pubdate=parse_datetime(entry['published_at']),
+                updateddate=parse_datetime(entry['updated_at']),
+                unique_id=f"{site_url}/blog/{entry['slug']}",
+            )
+        response = HttpResponse(content_type=feed.content_type)
+        feed.write(response, 'utf-8')
+    response['ETag'] = etag
+    if last_modified_ts:
+        response['Last-Modified'] = http_date(last_modified_ts)
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
+def posts_feed(request, ext):
+    if ext not in FEED_FORMATS:
+        raise Http404("Unknown feed format")
+    return _feed_response(request, ext, 'posts', 'Latest posts', '/blog', 'Latest published blog posts')
+
+def category_feed(request, slug, ext):
+    if ext not in FEED_FORMATS:
+        raise Http404("Unknown feed format")
+    category = get_object_or_404(Category.objects.only('id', 'name', 'slug', 'description'), slug=slug)
+    return _feed_response(
+        request, ext, f'category:{category.pk}', f'{category.name} posts',
+        f'/blog/category/{category.slug}', category.description or f'Latest posts in {category.name}',
+    )
+
+def tag_feed(request, slug, ext):
+    if ext not in FEED_FORMATS:
+        raise Http404("Unknown feed format")
+    tag = get_object_or_404(Tag.objects.only('id', 'name', 'slug'), slug=slug)
+    return _feed_response(
+        request, ext, f'tag:{tag.pk}', f'{tag.name} posts', f'/blog/tag/{tag.slug}', f'Latest posts tagged {tag.name}',
+    )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import index_available, rebuild_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of published blog posts'
+
+    def handle(self, *args, **options):
+        if not index_available():
+            self.stdout.write(self.style.WARNING('No full-text index on this database; search uses the fallback'))
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} published posts'))
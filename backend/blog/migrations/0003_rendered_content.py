@@ -0,0 +1,40 @@
+# Generated by Django 5.1 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+def render_existing_posts(apps, schema_editor):
+    from blog.rendering import content_hash, render_content
+
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    batch = []
+    for post in BlogPost.objects.only('id', 'content', 'content_format').iterator(chunk_size=200):
+        post.rendered_content = render_content(post.content, post.content_format)
+        post.rendered_hash = content_hash(post.content, post.content_format)
+        batch.append(post)
+        if len(batch) >= 200:
+            BlogPost.objects.bulk_update(batch, ['rendered_content', 'rendered_hash'])
+            batch = []
+    if batch:
+        BlogPost.objects.bulk_update(batch, ['rendered_content', 'rendered_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_blogpost_canonical_url_blogpost_content_format_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='rendered_content',
+            field=models.TextField(blank=True, editable=False, help_text='Sanitized HTML rendered from content'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='rendered_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the content revision rendered_content was built from', max_length=64),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1 on 2026-10-19 16:05
+
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases use the icontains fallback in blog.search.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_search "
+            "USING fts5(title, excerpt, keywords, body, tokenize='porter unicode61')"
+        )
+        for post in BlogPost.objects.filter(status='published').iterator(chunk_size=200):
+            body = re.sub(r'\s+', ' ', strip_tags(post.rendered_content or post.content)).strip()
+            cursor.execute(
+                'INSERT INTO blog_post_search (rowid, title, excerpt, keywords, body) VALUES (%s, %s, %s, %s, %s)',
+                [post.pk, post.title, post.excerpt, post.focus_keywords, body],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS blog_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_rendered_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -51,6 +51,10 @@ class BlogPost(models.Model):
     content = models.TextField()
     content_format = models.CharField(max_length=10, choices=CONTENT_FORMAT_CHOICES, default='html', 
                                        help_text="Format of the content field")
+    rendered_content = models.TextField(blank=True, editable=False,
+                                        help_text="Sanitized HTML rendered from content")
+    rendered_hash = models.CharField(max_length=64, blank=True, editable=False,
+                                     help_text="Hash of the content revision rendered_content was built from")
     featured_image = models.ImageField(upload_to='blog/images/', blank=True, null=True)
     excerpt = models.TextField(blank=True, help_text="A short description of the post for SEO and previews")
     
@@ -97,8 +101,24 @@ class BlogPost(models.Model):
             domain_pattern = re.compile(r'^https?://(?:www\.)?kavoshai\.com')
             self.internal_links_count = sum(1 for link in links if domain_pattern.match(link['href']) or link['href'].startswith('/'))
             self.external_links_count = len(links) - self.internal_links_count
-        
+
+        # Render to HTML once per content revision instead of on every read
+        update_fields = kwargs.get('update_fields')
+        if self.render_content() and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'rendered_content', 'rendered_hash'}
+
         super().save(*args, **kwargs)
+
+    def render_content(self):
+        """Refresh rendered_content if content or its format changed; returns True if it did."""
+        from .rendering import content_hash, render_content
+
+        digest = content_hash(self.content, self.content_format)
+        if digest == self.rendered_hash:
+            return False
+        self.rendered_content = render_content(self.content, self.content_format)
+        self.rendered_hash = digest
+        return True
     
     def __str__(self):
         return self.title
@@ -0,0 +1,144 @@
+"""
+Rendering of blog post content to sanitized HTML.
+
+Posts store their source in ``content`` in one of three formats: HTML,
+Markdown, or rich-text JSON (a ProseMirror/TipTap style document tree of
+``{"type": ..., "content": [...], "marks": [...], "attrs": {...}}``
+nodes). ``render_content`` turns any of them into HTML limited to an
+allowlist of tags and attributes. ``BlogPost.save`` calls it only when the
+source hash changes, so the work happens once per revision rather than on
+every read.
+"""
+import hashlib
+import json
+import re
+from html import escape
+
+import markdown
+from bs4 import BeautifulSoup, Comment
+
+# Bump to re-render every post when the renderer or allowlist changes.
+RENDERER_VERSION = 1
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'del', 'div', 'em', 'figcaption',
+    'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'mark', 'ol', 'p',
+    'pre', 's', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead',
+    'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'id', 'title'},
+    'a': {'href', 'rel', 'target'},
+    'img': {'src', 'alt', 'width', 'height', 'loading'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_URL_SCHEMES = {'http', 'https', 'mailto', 'tel'}
+# Dropped together with everything inside them rather than unwrapped.
+REMOVED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'form', 'input', 'button', 'textarea', 'select'}
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+
+def content_hash(content, content_format):
+    payload = f'{RENDERER_VERSION}\0{content_format}\0{content}'
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _is_safe_url(value):
+    # Browsers ignore whitespace and control characters inside the scheme.
+    value = re.sub(r'[\x00-\x20]', '', value)
+    if ':' not in value.split('/', 1)[0]:
+        return True  # relative URL or fragment
+    return value.split(':', 1)[0].lower() in ALLOWED_URL_SCHEMES
+
+def sanitize_html(html):
+    """Strip tags, attributes and URL schemes outside the allowlist."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in soup.find_all(True):
+        if tag.name in REMOVED_TAGS:
+            tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.name not in ALLOWED_TAGS:
+            tag.unwrap()
+            continue
+        allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag.name, set())
+        for name in list(tag.attrs):
+            if name not in allowed or (name in URL_ATTRIBUTES and not _is_safe_url(tag[name])):
+                del tag[name]
+        if tag.name == 'a' and tag.get('target') == '_blank':
+            tag['rel'] = 'noopener noreferrer'
+    return str(soup)
+
+MARK_TAGS = {
+    'bold': 'strong', 'strong': 'strong', 'italic': 'em', 'em': 'em', 'underline': 'u',
+    'strike': 's', 'code': 'code', 'highlight': 'mark', 'subscript': 'sub', 'superscript': 'sup',
+}
+BLOCK_TAGS = {
+    'paragraph': 'p', 'blockquote': 'blockquote', 'bulletList': 'ul', 'bullet_list': 'ul',
+    'orderedList': 'ol', 'ordered_list': 'ol', 'listItem': 'li', 'list_item': 'li',
+    'table': 'table', 'tableRow': 'tr', 'table_row': 'tr', 'tableCell': 'td', 'table_cell': 'td',
+    'tableHeader': 'th', 'table_header': 'th',
+}
+
+def _render_text(node):
+    html = escape(node.get('text', ''))
+    for mark in node.get('marks') or []:
+        mark_type = mark.get('type')
+        if mark_type == 'link':
+            href = (mark.get('attrs') or {}).get('href', '')
+            html = f'<a href="{escape(href)}">{html}</a>'
+        elif mark_type in MARK_TAGS:
+            tag = MARK_TAGS[mark_type]
+            html = f'<{tag}>{html}</{tag}>'
+    return html
+
+def _render_node(node):
+    if not isinstance(node, dict):
+        return ''
+    node_type = node.get('type')
+    attrs = node.get('attrs') or {}
+    if node_type == 'text':
+        return _render_text(node)
+    if node_type in ('hardBreak', 'hard_break'):
+        return '<br>'
+    if node_type in ('horizontalRule', 'horizontal_rule'):
+        return '<hr>'
+    if node_type == 'image':
+        return f'<img src="{escape(attrs.get("src", ""))}" alt="{escape(attrs.get("alt") or "")}">'
+    children = ''.join(_render_node(child) for child in node.get('content') or [])
+    if node_type == 'heading':
+        try:
+            level = min(max(int(attrs.get('level', 2)), 1), 6)
+        except (TypeError, ValueError):
+            level = 2
+        return f'<h{level}>{children}</h{level}>'
+    if node_type in ('codeBlock', 'code_block'):
+        return f'<pre><code>{children}</code></pre>'
+    if node_type in BLOCK_TAGS:
+        tag = BLOCK_TAGS[node_type]
+        return f'<{tag}>{children}</{tag}>'
+    # 'doc' and unknown wrappers render their children only.
+    return children
+
+def render_rich_text(content):
+    try:
+        document = json.loads(content) if content else {}
+    except json.JSONDecodeError:
+        # Not JSON after all: show it as plain text rather than failing the save.
+        return f'<p>{escape(content)}</p>'
+    if isinstance(document, list):
+        document = {'type': 'doc', 'content': document}
+    return _render_node(document)
+
+def render_content(content, content_format):
+    """Return sanitized HTML for post ``content`` in ``content_format``."""
+    if content_format == 'markdown':
+        html = markdown.markdown(content, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+    elif content_format == 'rich_text':
+        html = render_rich_text(content)
+    else:
+        html = content
+    return sanitize_html(html)
@@ -0,0 +1,130 @@
+"""
+Full-text search over published blog posts.
+
+On SQLite the posts are indexed in an FTS5 table, ``blog_post_search``
+(created by migration 0004), keyed by post id with the title, excerpt,
+focus keywords and plain-text body as columns. Signals keep it current:
+a saved post is re-indexed if published and removed otherwise, and a
+deleted post is removed. Queries are ranked by bm25 with the title
+weighted highest, and each hit carries a snippet of the body around the
+matched terms. Scheduled posts are indexed but only returned once their
+``published_at`` has passed.
+
+On other databases, or if the index is missing, ``search_posts`` falls
+back to ``icontains`` matching on title, excerpt and keywords. Whether the
+index exists is probed once per database per process, so run
+``rebuild_search_index`` (or restart) after creating it in a running one.
+"""
+import logging
+import re
+from functools import lru_cache
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+INDEX_TABLE = 'blog_post_search'
+
+# bm25 weights for the title, excerpt, keywords and body columns.
+COLUMN_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+SNIPPET_TOKENS = 48
+
+_term = re.compile(r'\w+')
+_whitespace = re.compile(r'\s+')
+
+@lru_cache(maxsize=None)
+def _probe_index(database_name):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM {INDEX_TABLE} LIMIT 0')
+        return True
+    except DatabaseError:
+        return False
+
+def index_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return _probe_index(str(connection.settings_dict['NAME']))
+
+def _document(post):
+    body = strip_tags(post.rendered_content or post.content)
+    return [post.title, post.excerpt, post.focus_keywords, _whitespace.sub(' ', body).strip()]
+
+def index_post(post):
+    """Add, update or remove ``post`` in the index according to its status."""
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [post.pk])
+        if post.status == 'published':
+            cursor.execute(
+                f'INSERT INTO {INDEX_TABLE} (rowid, title, excerpt, keywords, body) VALUES (%s, %s, %s, %s, %s)',
+                [post.pk, *_document(post)],
+            )
+
+def remove_post(post_id):
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [post_id])
+
+def rebuild_index():
+    """Re-index every published post; returns how many were indexed."""
+    _probe_index.cache_clear()
+    if not index_available():
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+        for post in BlogPost.objects.filter(status='published').iterator(chunk_size=200):
+            cursor.execute(
+                f'INSERT INTO {INDEX_TABLE} (rowid, title, excerpt, keywords, body) VALUES (%s, %s, %s, %s, %s)',
+                [post.pk, *_document(post)],
+            )
+            count += 1
+    return count
+
+def _match_expression(query):
+    # Quote every term so user input cannot use FTS5 query syntax.
+    terms = dict.fromkeys(term.lower() for term in _term.findall(query))
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+def search_posts(query, limit=5):
+    """
+    Published posts matching ``query``, best first.
+
+    Returns a list of ``(post, snippet)`` pairs.
+    """
+    if index_available():
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        with connection.cursor() as cursor:
+            # Over-fetch a little: scheduled posts are filtered out below.
+            cursor.execute(
+                f"SELECT rowid, snippet({INDEX_TABLE}, 3, '', '', '…', {SNIPPET_TOKENS}) "
+                f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s "
+                f"ORDER BY bm25({INDEX_TABLE}, {weights}) LIMIT %s",
+                [expression, limit * 2],
+            )
+            hits = cursor.fetchall()
+        posts = BlogPost.objects.filter(
+            pk__in=[post_id for post_id, _ in hits], status='published', published_at__lte=timezone.now(),
+        ).in_bulk()
+        return [(posts[post_id], snippet) for post_id, snippet in hits if post_id in posts][:limit]
+
+    terms = list(dict.fromkeys(_term.findall(query)))
+    if not terms:
+        return []
+    condition = Q()
+    for term in terms:
+        condition |= Q(title__icontains=term) | Q(excerpt__icontains=term) | Q(focus_keywords__icontains=term)
+    posts = BlogPost.objects.filter(condition, status='published', published_at__lte=timezone.now())[:limit]
+    return [(post, post.excerpt) for post in posts]
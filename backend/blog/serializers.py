@@ -40,7 +40,7 @@ class BlogPostDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = BlogPost
         fields = [
-            'id', 'title', 'slug', 'author', 'content', 'content_format', 'excerpt', 
+            'id', 'title', 'slug', 'author', 'content', 'content_format', 'rendered_content', 'excerpt',
             'featured_image', 'created_at', 'updated_at', 'published_at', 
             'status', 'categories', 'tags', 'is_featured',
             'meta_title', 'meta_description', 'canonical_url', 'focus_keywords',
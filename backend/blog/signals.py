@@ -0,0 +1,60 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import BlogPost, Category, Tag
+from .feeds import apply_post_change, post_scopes
+from .search import index_post, remove_post
+from .sitemaps import bump_version
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_sitemaps(sender, **kwargs):
+    """Drop cached sitemaps whenever published content may have changed."""
+    bump_version()
+
+@receiver(m2m_changed, sender=BlogPost.categories.through)
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def invalidate_sitemaps_on_relations(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version()
+
+@receiver(post_save, sender=BlogPost)
+def update_feeds(sender, instance, **kwargs):
+    apply_post_change(instance)
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_feed_scopes(sender, instance, **kwargs):
+    # Relations are gone by post_delete, so look up the post's feeds first.
+    instance._feed_scopes = post_scopes(instance)
+
+@receiver(post_delete, sender=BlogPost)
+def remove_from_feeds(sender, instance, **kwargs):
+    apply_post_change(instance, getattr(instance, '_feed_scopes', ['posts']), deleted=True)
+
+@receiver(m2m_changed, sender=BlogPost.categories.through)
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_feeds_on_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Add or drop posts in category and tag feeds as their relations change."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    field = 'categories' if sender is BlogPost.categories.through else 'tags'
+    prefix = 'category' if field == 'categories' else 'tag'
+    deleted = action != 'post_add'
+    if reverse:
+        post_ids = instance.posts.values_list('pk', flat=True) if action == 'pre_clear' else pk_set
+        for post in BlogPost.objects.filter(pk__in=list(post_ids)):
+            apply_post_change(post, [f'{prefix}:{instance.pk}'], deleted=deleted)
+    else:
+        related_ids = getattr(instance, field).values_list('pk', flat=True) if action == 'pre_clear' else pk_set
+        apply_post_change(instance, [f'{prefix}:{pk}' for pk in related_ids], deleted=deleted)
+
+@receiver(post_save, sender=BlogPost)
+def update_search_index(sender, instance, **kwargs):
+    index_post(instance)
+
+@receiver(post_delete, sender=BlogPost)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_post(instance.pk)
@@ -0,0 +1,153 @@
+"""
+Sitemap index, sharded sitemaps and robots.txt served from the database.
+
+Entries (published posts, then categories and tags) are read with one
+``values_list`` query per model, streamed straight into the response and
+split into shards of ``SITEMAP_SHARD_SIZE`` URLs. Category and tag
+``lastmod`` values are the newest ``updated_at`` of their published posts.
+Scheduled posts (``published_at`` in the future) are left out until they
+go live.
+
+Rendered documents are cached under a content version that is bumped
+whenever a post, category or tag changes (see ``blog.signals``), and never
+past the next scheduled post's ``published_at``.
+"""
+import math
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+from django.http import HttpResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
+from django.utils import timezone
+
+from admin_panel.models import SEOSettings
+from .models import BlogPost, Category, Tag
+
+VERSION_KEY = 'blog-sitemap-version'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+DEFAULT_ROBOTS_TXT = "User-agent: *\nAllow: /\nDisallow: /admin\nDisallow: /api\n"
+
+# (model label, URL path prefix, changefreq, priority)
+SECTIONS = [
+    ('post', '/blog/', 'weekly', '0.8'),
+    ('category', '/blog/category/', 'daily', '0.7'),
+    ('tag', '/blog/tag/', 'daily', '0.6'),
+]
+
+def get_shard_size():
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 50000)
+
+def get_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+def bump_version():
+    """Invalidate every cached sitemap document."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+def _live_posts():
+    return BlogPost.objects.filter(status='published', published_at__lte=timezone.now())
+
+def _cache_timeout():
+    """Cache until the next scheduled post goes live, at most ``CACHE_TIMEOUT``."""
+    now = timezone.now()
+    next_post = BlogPost.objects.filter(status='published', published_at__gt=now).aggregate(
+        next=Min('published_at'),
+    )['next']
+    if next_post is None:
+        return CACHE_TIMEOUT
+    return min(CACHE_TIMEOUT, int((next_post - now).total_seconds()) + 1)
+
+def _section_queryset(section):
+    published = Q(posts__status='published', posts__published_at__lte=timezone.now())
+    if section == 'post':
+        return _live_posts().order_by('pk').values_list('slug', 'updated_at')
+    model = Category if section == 'category' else Tag
+    return (
+        model.objects.annotate(published_count=Count('posts', filter=published))
+        .filter(published_count__gt=0)
+        .annotate(lastmod=Max('posts__updated_at', filter=published))
+        .order_by('pk').values_list('slug', 'lastmod')
+    )
+
+def _section_counts():
+    return [(section, _section_queryset(section).count()) for section, *_ in SECTIONS]
+
+def iter_entries(start, stop, counts):
+    """Yield ``(path, lastmod, changefreq, priority)`` for entries ``start``..``stop``."""
+    offset = 0
+    counts = dict(counts)
+    for section, prefix, changefreq, priority in SECTIONS:
+        count = counts[section]
+        if start < offset + count and stop > offset:
+            rows = _section_queryset(section)[max(start - offset, 0):stop - offset]
+            for slug, lastmod in rows.iterator(chunk_size=2000):
+                yield f'{prefix}{slug}', lastmod, changefreq, priority
+        offset += count
+
+def _cached_stream(key, chunks):
+    """Stream ``chunks`` and cache the joined document once fully produced."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), _cache_timeout())
+
+def _absolute_url(path):
+    """Every loc is on ``SITE_URL``, whichever host the request came in on."""
+    return settings.SITE_URL.rstrip('/') + path
+
+def _xml_response(content):
+    if isinstance(content, str):
+        return HttpResponse(content, content_type='application/xml; charset=utf-8')
+    return StreamingHttpResponse(content, content_type='application/xml; charset=utf-8')
+
+def _render_shard(shard, counts):
+    size = get_shard_size()
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for path, lastmod, changefreq, priority in iter_entries(shard * size, (shard + 1) * size, counts):
+        lastmod_tag = f'<lastmod>{lastmod.isoformat()}</lastmod>' if lastmod else ''
+        yield (
+            f'<url><loc>{escape(_absolute_url(path))}</loc>{lastmod_tag}'
+            f'<changefreq>{changefreq}</changefreq><priority>{priority}</priority></url>\n'
+        )
+    yield '</urlset>\n'
+
+def sitemap_index(request):
+    key = f'blog-sitemap:{get_version()}:index'
+    cached = cache.get(key)
+    if cached is not None:
+        return _xml_response(cached)
+
+    total = sum(count for _, count in _section_counts())
+    lastmod = _live_posts().aggregate(lastmod=Max('updated_at'))['lastmod']
+    lastmod_tag = f'<lastmod>{lastmod.isoformat()}</lastmod>' if lastmod else ''
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for shard in range(max(math.ceil(total / get_shard_size()), 1)):
+        loc = _absolute_url(reverse('sitemap-shard', args=[shard]))
+        parts.append(f'<sitemap><loc>{escape(loc)}</loc>{lastmod_tag}</sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    content = ''.join(parts)
+    cache.set(key, content, _cache_timeout())
+    return _xml_response(content)
+
+def sitemap_shard(request, shard):
+    key = f'blog-sitemap:{get_version()}:shard:{shard}'
+    cached = cache.get(key)
+    if cached is not None:
+        return _xml_response(cached)
+    counts = _section_counts()
+    if shard > 0 and shard * get_shard_size() >= sum(count for _, count in counts):
+        raise Http404("No such sitemap")
+    return _xml_response(_cached_stream(key, _render_shard(shard, counts)))
+
+def robots_txt(request):
+    content = SEOSettings.load().robots_txt.strip() or DEFAULT_ROBOTS_TXT.strip()
+    if 'sitemap:' not in content.lower():
+        content += f"\n\nSitemap: {_absolute_url(reverse('sitemap-index'))}"
+    return HttpResponse(content + '\n', content_type='text/plain; charset=utf-8')
@@ -1,3 +1,244 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from admin_panel.models import SEOSettings, _singleton_instances
+from .models import BlogPost, Category, Tag
+from .search import search_posts
+
+@override_settings(SITE_URL='https://example.com', SITEMAP_SHARD_SIZE=2)
+class SitemapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _singleton_instances.clear()
+        self.author = User.objects.create_user(username='author', password='testpassword')
+        self.category = Category.objects.create(name='News')
+        self.empty_category = Category.objects.create(name='Empty')
+        self.tag = Tag.objects.create(name='Python')
+        self.posts = []
+        for i in range(3):
+            post = BlogPost.objects.create(title=f'Post {i}', author=self.author, content='x', status='published')
+            post.categories.add(self.category)
+            self.posts.append(post)
+        self.posts[0].tags.add(self.tag)
+        BlogPost.objects.create(title='Draft', author=self.author, content='x')
+
+    def test_index_lists_shards(self):
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        # 3 posts + 1 category + 1 tag in shards of 2
+        self.assertEqual(content.count('<sitemap>'), 3)
+        self.assertIn('https://example.com/sitemaps/2.xml', content)
+        # Another host gets the same locs, on SITE_URL like the shard entries.
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_HOST='localhost').content.decode(), content)
+
+    def test_shards_contain_published_content_with_real_lastmod(self):
+        pages = [b''.join(self.client.get(f'/sitemaps/{n}.xml').streaming_content).decode() for n in range(3)]
+        self.assertIn('https://example.com/blog/post-0', pages[0])
+        self.assertIn(self.posts[0].updated_at.isoformat(), pages[0])
+        self.assertIn('https://example.com/blog/post-2', pages[1])
+        self.assertIn('https://example.com/blog/category/news', pages[1])
+        self.assertIn('https://example.com/blog/tag/python', pages[2])
+        self.assertNotIn('draft', ''.join(pages))
+        self.assertNotIn('category/empty', ''.join(pages))
+        self.assertEqual(self.client.get('/sitemaps/3.xml').status_code, 404)
+
+    def test_cached_until_content_changes(self):
+        b''.join(self.client.get('/sitemaps/0.xml').streaming_content)
+        with self.assertNumQueries(0):
+            self.assertIn(b'post-0', self.client.get('/sitemaps/0.xml').content)
+
+        self.posts[0].slug = 'renamed'
+        self.posts[0].save()
+        content = b''.join(self.client.get('/sitemaps/0.xml').streaming_content)
+        self.assertIn(b'/blog/renamed', content)
+
+    def test_scheduled_posts_are_left_out_until_live(self):
+        scheduled = BlogPost.objects.create(
+            title='Later', author=self.author, content='x', status='published',
+            published_at=timezone.now() + timedelta(hours=1),
+        )
+        scheduled.categories.add(self.category)
+        scheduled.tags.add(Tag.objects.create(name='Upcoming'))
+        with mock.patch('blog.sitemaps.cache.set', wraps=cache.set) as cache_set:
+            pages = ''.join(
+                b''.join(self.client.get(f'/sitemaps/{n}.xml').streaming_content).decode() for n in range(3)
+            )
+        self.assertNotIn('/blog/later', pages)
+        self.assertNotIn('tag/upcoming', pages)
+        self.assertNotIn(scheduled.updated_at.isoformat(), pages)
+        # Cached only until the scheduled post goes live.
+        self.assertTrue(all(call.args[2] <= 3601 for call in cache_set.call_args_list))
+
+    def test_robots_txt_from_seo_settings(self):
+        response = self.client.get('/robots.txt')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('Disallow: /admin', response.content.decode())
+        self.assertIn('Sitemap: https://example.com/sitemap.xml', response.content.decode())
+
+        seo = SEOSettings.load()
+        seo.robots_txt = 'User-agent: *\nDisallow: /private'
+        with self.captureOnCommitCallbacks(execute=True):
+            seo.save()
+        self.assertTrue(self.client.get('/robots.txt').content.decode().startswith('User-agent: *\nDisallow: /private'))
+
+@override_settings(SITE_URL='https://example.com', BLOG_FEED_ITEMS=2)
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpassword')
+        self.category = Category.objects.create(name='News')
+        self.tag = Tag.objects.create(name='Python')
+        self.posts = [
+            BlogPost.objects.create(
+                title=f'Post {i}', author=self.author, content='x', status='published',
+                published_at=timezone.now() - timedelta(days=10 - i),
+            )
+            for i in range(3)
+        ]
+        self.posts[0].categories.add(self.category)
+
+    def test_rss_and_atom_feeds(self):
+        rss = self.client.get('/api/feeds/posts.xml')
+        self.assertEqual(rss.status_code, 200)
+        self.assertIn('rss', rss['Content-Type'])
+        content = rss.content.decode()
+        self.assertIn('https://example.com/blog/post-2', content)
+        self.assertNotIn('post-0', content)
+
+        atom = self.client.get('/api/feeds/posts.atom')
+        self.assertIn('atom', atom['Content-Type'])
+        self.assertIn('https://example.com/blog/category/news', self.client.get('/api/feeds/categories/news.xml').content.decode())
+
+    def test_conditional_get_returns_304_without_queries(self):
+        response = self.client.get('/api/feeds/posts.xml')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/feeds/posts.xml', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        since = self.client.get('/api/feeds/posts.xml', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_entry_lists_follow_content_changes(self):
+        etag = self.client.get('/api/feeds/posts.xml')['ETag']
+        self.client.get('/api/feeds/categories/news.xml')
+
+        new = BlogPost.objects.create(title='Breaking', author=self.author, content='x', status='published')
+        self.assertEqual([e['slug'] for e in cache.get('blog-feed:posts')], ['breaking', 'post-2'])
+        response = self.client.get('/api/feeds/posts.xml', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        new.categories.add(self.category)
+        self.assertEqual([e['slug'] for e in cache.get(f'blog-feed:category:{self.category.pk}')], ['breaking', 'post-0'])
+        new.categories.remove(self.category)
+        self.assertIsNone(cache.get(f'blog-feed:category:{self.category.pk}'))
+
+        new.delete()
+        self.assertIn('post-1', self.client.get('/api/feeds/posts.xml').content.decode())
+
+    def test_scheduled_posts_enter_feeds_when_live(self):
+        self.client.get('/api/feeds/posts.xml')
+        go_live = timezone.now() + timedelta(hours=1)
+        later = {'author': self.author, 'content': 'x', 'status': 'published', 'published_at': go_live}
+        BlogPost.objects.create(title='Later', **later)
+        self.assertNotIn('/blog/later', self.client.get('/api/feeds/posts.xml').content.decode())
+        with mock.patch('django.utils.timezone.now', return_value=go_live + timedelta(seconds=1)):
+            self.assertIn('/blog/later', self.client.get('/api/feeds/posts.xml').content.decode())
+
+        # A list built while a post is scheduled is rebuilt once it goes live.
+        BlogPost.objects.create(title='Much later', **{**later, 'published_at': go_live + timedelta(hours=1)})
+        cache.clear()
+        self.assertNotIn('/blog/much-later', self.client.get('/api/feeds/posts.xml').content.decode())
+        with mock.patch('django.utils.timezone.now', return_value=go_live + timedelta(hours=2)):
+            self.assertIn('/blog/much-later', self.client.get('/api/feeds/posts.xml').content.decode())
+
+class ContentRenderingTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpassword')
+
+    def _post(self, content, content_format):
+        return BlogPost.objects.create(
+            title='Rendered', author=self.author, content=content, content_format=content_format, status='published',
+        )
+
+    def test_markdown_is_rendered_and_sanitized(self):
+        post = self._post('# Title\n\nSome *text* <script>alert(1)</script> [x](javascript:alert(1))', 'markdown')
+        self.assertIn('<h1>Title</h1>', post.rendered_content)
+        self.assertIn('<em>text</em>', post.rendered_content)
+        self.assertNotIn('script', post.rendered_content)
+        self.assertNotIn('javascript', post.rendered_content)
+
+    def test_rich_text_json(self):
+        document = {'type': 'doc', 'content': [
+            {'type': 'heading', 'attrs': {'level': 2}, 'content': [{'type': 'text', 'text': 'Hi'}]},
+            {'type': 'paragraph', 'content': [
+                {'type': 'text', 'text': 'bold', 'marks': [{'type': 'bold'}]},
+                {'type': 'text', 'text': ' <b>', 'marks': [{'type': 'link', 'attrs': {'href': 'https://example.com'}}]},
+            ]},
+        ]}
+        post = self._post(json.dumps(document), 'rich_text')
+        self.assertEqual(
+            post.rendered_content,
+            '<h2>Hi</h2><p><strong>bold</strong><a href="https://example.com"> &lt;b&gt;</a></p>',
+        )
+
+    def test_rendered_once_per_revision(self):
+        post = self._post('<p onclick="x()">Hello</p>', 'html')
+        self.assertEqual(post.rendered_content, '<p>Hello</p>')
+        with mock.patch('blog.rendering.render_content') as render:
+            post.title = 'Retitled'
+            post.save()
+        render.assert_not_called()
+
+        post.content = 'Changed'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual(post.rendered_content, 'Changed')
+
+        response = self.client.get(f'/api/posts/{post.slug}/')
+        self.assertEqual(response.data['rendered_content'], 'Changed')
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpassword')
+
+    def _post(self, title, content, **kwargs):
+        kwargs.setdefault('status', 'published')
+        return BlogPost.objects.create(title=title, author=self.author, content=content, **kwargs)
+
+    def test_ranked_matches_with_snippets(self):
+        body = self._post('Gardening tips', '<p>Vector databases come up once. Then we talk about tomatoes.</p>')
+        title = self._post('Vector databases explained', '<p>Indexes for embeddings.</p>')
+        self._post('Unrelated', '<p>Nothing to see here.</p>')
+        results = search_posts('vector databases', limit=5)
+        self.assertEqual([post for post, _ in results], [title, body])
+        self.assertIn('Vector databases come up once', results[1][1])
+        self.assertNotIn('<p>', results[1][1])
+        # Query syntax in user input is matched literally rather than raising.
+        self.assertEqual(search_posts('"vector" AND (NEAR databases*', limit=1)[0][0], title)
+        self.assertEqual(search_posts('!!!'), [])
+
+    def test_index_follows_publishing(self):
+        post = self._post('Kubernetes operators', '<p>Reconcile loops.</p>', status='draft')
+        self.assertEqual(search_posts('kubernetes'), [])
+        post.status = 'published'
+        post.save()
+        self.assertEqual([hit for hit, _ in search_posts('kubernetes')], [post])
+        post.title = 'Container orchestration'
+        post.save()
+        self.assertEqual(search_posts('kubernetes'), [])
+        post.delete()
+        self.assertEqual(search_posts('orchestration'), [])
+        # The index is probed once, not on every save.
+        with CaptureQueriesContext(connection) as queries:
+            self._post('Probe', 'x')
+        self.assertFalse(any('LIMIT 0' in query['sql'] for query in queries))
+        self._post('Kubernetes soon', 'x', published_at=timezone.now() + timedelta(days=1))
+        self.assertEqual(search_posts('kubernetes'), [])
@@ -9,7 +9,9 @@ class ChatSessionAdmin(admin.ModelAdmin):
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ('session_id', 'is_user_message', 'timestamp')
+    list_display = ('session', 'is_user_message', 'timestamp')
     list_filter = ('is_user_message', 'timestamp')
-    search_fields = ('session_id', 'content')
+    search_fields = ('session__session_id', 'content')
+    list_select_related = ('session',)
+    raw_id_fields = ('session',)
     ordering = ('-timestamp',) 
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Bounded prompt context for chat sessions.
+
+Each reply is generated from the system prompt, the session's rolling
+summary and as many of the most recent messages as fit in
+``CHAT_CONTEXT_TOKENS``. Messages that fall out of that window are folded
+into ``ChatSession.summary`` a batch at a time (once at least
+``CHAT_SUMMARY_TRIGGER_TOKENS`` of them have accumulated), so the prompt
+size stays bounded however long the session runs.
+
+Token counts are estimated (about four characters per token plus a small
+per-message overhead), which is close enough for budgeting.
+"""
+import logging
+
+from django.conf import settings
+
+from .llm import ChatLLMError, complete_chat
+from .models import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages. Keep names, facts, decisions and open "
+    "questions; drop small talk. Reply with the updated summary only, in at most "
+    "{max_words} words."
+)
+
+def estimate_tokens(text):
+    return MESSAGE_OVERHEAD_TOKENS + (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _prompt_message(message):
+    return {'role': 'user' if message.is_user_message else 'assistant', 'content': message.content}
+
+def _system_prompt():
+    return getattr(settings, 'CHAT_SYSTEM_PROMPT', 'You are a helpful assistant.')
+
+def _summary_prompt(session):
+    return f"Summary of the earlier conversation:\n{session.summary}"
+
+async def select_window(session, budget):
+    """
+    Return the newest unsummarized messages (oldest first) whose estimated
+    size fits in ``budget`` tokens. The newest message is always included,
+    truncated if it alone exceeds the budget.
+    """
+    window = []
+    used = 0
+    messages = (
+        ChatMessage.objects.filter(session_id=session.pk, id__gt=session.summarized_through)
+        .order_by('-timestamp', '-id').only('id', 'content', 'is_user_message')
+    )
+    async for message in messages.aiterator(chunk_size=50):
+        cost = estimate_tokens(message.content)
+        if used + cost > budget:
+            if not window:
+                message.content = message.content[:max(budget - MESSAGE_OVERHEAD_TOKENS, 0) * CHARS_PER_TOKEN]
+                window.append(message)
+            break
+        window.append(message)
+        used += cost
+    window.reverse()
+    return window
+
+def _window_budget(session):
+    budget = getattr(settings, 'CHAT_CONTEXT_TOKENS', 3000) - estimate_tokens(_system_prompt())
+    if session.summary:
+        budget -= estimate_tokens(_summary_prompt(session))
+    return budget
+
+async def build_context(session):
+    """Prompt messages for the next reply in ``session``."""
+    messages = [{'role': 'system', 'content': _system_prompt()}]
+    if session.summary:
+        messages.append({'role': 'system', 'content': _summary_prompt(session)})
+    messages.extend(_prompt_message(message) for message in await select_window(session, _window_budget(session)))
+    return messages
+
+async def update_summary(session):
+    """
+    Fold messages that have left the context window into the session summary.
+
+    Does nothing until enough of them have built up to be worth a model
+    call. Returns True when the summary was updated.
+    """
+    window = await select_window(session, _window_budget(session))
+    if not window:
+        return False
+    trigger = getattr(settings, 'CHAT_SUMMARY_TRIGGER_TOKENS', 500)
+    batch_limit = trigger * 4
+    pending = []
+    pending_tokens = 0
+    older = (
+        ChatMessage.objects.filter(session_id=session.pk, id__gt=session.summarized_through, id__lt=window[0].id)
+        .order_by('timestamp', 'id').only('id', 'content', 'is_user_message')
+    )
+    async for message in older.aiterator(chunk_size=50):
+        pending.append(message)
+        pending_tokens += estimate_tokens(message.content)
+        if pending_tokens >= batch_limit:
+            break
+    if pending_tokens < trigger:
+        return False
+
+    max_tokens = getattr(settings, 'CHAT_SUMMARY_MAX_TOKENS', 300)
+    transcript = '\n'.join(
+        f"{'User' if message.is_user_message else 'Assistant'}: {message.content}" for message in pending
+    )
+    prompt = [
+        {'role': 'system', 'content': SUMMARY_INSTRUCTIONS.format(max_words=max_tokens * 3 // 4)},
+        {'role': 'user', 'content': f"Current summary:\n{session.summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+    try:
+        summary = await complete_chat(prompt, max_tokens=max_tokens)
+    except (ChatLLMError, OSError) as e:
+        logger.warning(f"Could not update summary for chat session {session.session_id}: {e}")
+        return False
+    if not summary:
+        return False
+
+    # Only advance from the state we read, so concurrent replies cannot
+    # fold the same messages twice or overwrite a newer summary.
+    updated = await ChatSession.objects.filter(
+        pk=session.pk, summarized_through=session.summarized_through,
+    ).aupdate(summary=summary, summarized_through=pending[-1].id)
+    if updated:
+        session.summary, session.summarized_through = summary, pending[-1].id
+        logger.info(f"Folded {len(pending)} messages into summary for chat session {session.session_id}")
+    return bool(updated)
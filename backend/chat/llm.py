@@ -0,0 +1,123 @@
+"""
+Streaming chat completions for the chat app.
+
+Talks to the same OpenAI-compatible endpoints as the blog generator (Groq
+when ``GROQ_API_KEY`` is set, OpenAI otherwise) but with ``stream: true``
+over aiohttp, so a reply is relayed token by token from an async view
+without tying up a worker thread for the length of the generation.
+"""
+import json
+import logging
+import os
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+
+class ChatLLMError(Exception):
+    """Raised when the model endpoint rejects or aborts a completion."""
+
+def get_llm_config():
+    """Return ``(api_url, api_key, model)`` for chat completions."""
+    if os.getenv("GROQ_API_KEY"):
+        api_url, api_key, model = GROQ_API_URL, os.getenv("GROQ_API_KEY"), "deepseek-r1-distill-llama-70b"
+    else:
+        api_url = OPENAI_API_URL
+        api_key = os.getenv("OPENAI_API_KEY") or getattr(settings, 'OPENAI_API_KEY', '')
+        model = "gpt-4o"
+    return api_url, api_key, getattr(settings, 'CHAT_LLM_MODEL', None) or model
+
+class ThinkFilter:
+    """
+    Drop ``<think>...</think>`` sections from a token stream.
+
+    Tags may be split across chunks, so a possible partial tag at the end of
+    a chunk is held back until the next one arrives.
+    """
+    OPEN = '<think>'
+    CLOSE = '</think>'
+
+    def __init__(self):
+        self.buffer = ''
+        self.thinking = False
+
+    def feed(self, text):
+        self.buffer += text
+        visible = []
+        while True:
+            tag = self.CLOSE if self.thinking else self.OPEN
+            index = self.buffer.find(tag)
+            if index == -1:
+                keep = next((n for n in range(len(tag) - 1, 0, -1) if self.buffer.endswith(tag[:n])), 0)
+                if not self.thinking:
+                    visible.append(self.buffer[:len(self.buffer) - keep])
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                return ''.join(visible)
+            if not self.thinking:
+                visible.append(self.buffer[:index])
+            self.buffer = self.buffer[index + len(tag):]
+            self.thinking = not self.thinking
+
+    def flush(self):
+        rest = '' if self.thinking else self.buffer
+        self.buffer = ''
+        return rest
+
+async def stream_chat_completion(messages, max_tokens=None):
+    """
+    Yield the visible text of a chat completion as it is generated.
+
+    ``messages`` is a list of ``{'role': ..., 'content': ...}`` dicts.
+    """
+    api_url, api_key, model = get_llm_config()
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": getattr(settings, 'CHAT_LLM_TEMPERATURE', 0.7),
+        "max_tokens": max_tokens or getattr(settings, 'CHAT_LLM_MAX_TOKENS', 1024),
+        "stream": True,
+    }
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    }
+    timeout = aiohttp.ClientTimeout(
+        total=getattr(settings, 'CHAT_LLM_TIMEOUT', 120),
+        sock_read=getattr(settings, 'CHAT_LLM_READ_TIMEOUT', 30),
+    )
+    think_filter = ThinkFilter()
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(api_url, headers=headers, json=payload) as response:
+            if response.status != 200:
+                body = await response.text()
+                logger.error(f"Chat completion error {response.status}: {body[:500]}")
+                raise ChatLLMError(f"Model endpoint returned {response.status}")
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed stream chunk: {data[:200]}")
+                    continue
+                if chunk.get('error'):
+                    raise ChatLLMError(str(chunk['error']))
+                choices = chunk.get('choices') or [{}]
+                text = think_filter.feed((choices[0].get('delta') or {}).get('content') or '')
+                if text:
+                    yield text
+    rest = think_filter.flush()
+    if rest:
+        yield rest
+
+async def complete_chat(messages, max_tokens=None):
+    """Return a whole (non-interactive) completion as one string."""
+    return ''.join([text async for text in stream_chat_completion(messages, max_tokens=max_tokens)]).strip()
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.retention import archive_sessions, get_archive_dir
+
+class Command(BaseCommand):
+    help = 'Archive inactive chat sessions to compressed JSON-lines files and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'CHAT_RETENTION_DAYS', 90),
+            help='Archive sessions with no activity for this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Sessions per archive file',
+        )
+        parser.add_argument(
+            '--delete-chunk',
+            type=int,
+            default=5000,
+            help='Messages deleted per transaction',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Directory for archive files (default: CHAT_ARCHIVE_DIR)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how much would be archived',
+        )
+
+    def handle(self, *args, **options):
+        sessions, messages, paths = archive_sessions(
+            options['days'],
+            batch_size=options['batch_size'],
+            delete_chunk=options['delete_chunk'],
+            archive_dir=options['archive_dir'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Would archive {sessions} sessions ({messages} messages)')
+            return
+        for path in paths:
+            self.stdout.write(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sessions} sessions ({messages} messages) to {options['archive_dir'] or get_archive_dir()}"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from chat.retention import restore_archive
+
+class Command(BaseCommand):
+    help = 'Restore chat sessions from archive files written by archive_chat_sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Archive files (.jsonl.gz) to restore')
+
+    def handle(self, *args, **options):
+        total = 0
+        for path in options['paths']:
+            restored, skipped = restore_archive(path)
+            total += restored
+            self.stdout.write(f'{path}: restored {restored} sessions, skipped {skipped} already present')
+        self.stdout.write(self.style.SUCCESS(f'Restored {total} sessions'))
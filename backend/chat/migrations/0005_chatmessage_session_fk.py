@@ -0,0 +1,53 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_messages_to_sessions(apps, schema_editor):
+    ChatSession = apps.get_model('chat', 'ChatSession')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+
+    known = set(ChatSession.objects.values_list('session_id', flat=True))
+    orphaned = (
+        ChatMessage.objects.exclude(legacy_session_id__in=known)
+        .values_list('legacy_session_id', flat=True).distinct()
+    )
+    ChatSession.objects.bulk_create(
+        [ChatSession(session_id=session_id) for session_id in orphaned], batch_size=500,
+    )
+    ChatMessage.objects.update(session=models.Subquery(
+        ChatSession.objects.filter(session_id=models.OuterRef('legacy_session_id')).values('pk')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='chatmessage',
+            old_name='session_id',
+            new_name='legacy_session_id',
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='session',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.chatsession'),
+        ),
+        migrations.RunPython(link_messages_to_sessions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='legacy_session_id',
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='session',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.chatsession'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp'], name='chat_message_session_time'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_chatmessage_session_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='summarized_through',
+            field=models.PositiveBigIntegerField(default=0, help_text='ID of the newest message folded into the summary'),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='summary',
+            field=models.TextField(blank=True, help_text='Rolling summary of messages older than the context window'),
+        ),
+    ]
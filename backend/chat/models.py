@@ -3,6 +3,10 @@ from django.contrib.auth.models import User
 
 class ChatSession(models.Model):
     session_id = models.CharField(max_length=50, unique=True)
+    summary = models.TextField(blank=True, help_text="Rolling summary of messages older than the context window")
+    summarized_through = models.PositiveBigIntegerField(
+        default=0, help_text="ID of the newest message folded into the summary"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -10,13 +14,17 @@ class ChatSession(models.Model):
         return f"Chat Session {self.session_id}"
 
 class ChatMessage(models.Model):
-    session_id = models.CharField(max_length=50)
+    # Covered by the (session, timestamp) index below.
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages', db_index=False)
     content = models.TextField()
     is_user_message = models.BooleanField(default=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['session', 'timestamp'], name='chat_message_session_time'),
+        ]
 
     def __str__(self):
         return f"{'User' if self.is_user_message else 'AI'} message at {self.timestamp}" 
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Archival of inactive chat sessions.
+
+Sessions with no activity for a given number of days are written, with
+their messages, to gzip-compressed JSON-lines files (one session per
+line, one file per batch) and then deleted from the database. Each batch
+is written and fsynced before its rows are deleted, and rows are deleted
+in short transactions of about ``delete_chunk`` messages so the chat
+tables are never locked for long. A session is never split across
+transactions: each one locks its sessions and re-checks that they are
+still inactive, so a session that became active again after its batch was
+written is kept whole (its archived copy is then skipped on restore).
+Only the messages actually written to the archive are deleted, so a
+message that arrived after the write is never lost. ``restore_archive``
+loads a file back.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+
+def get_archive_dir():
+    return str(getattr(settings, 'CHAT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'chat_archives')))
+
+def inactive_sessions(days):
+    """Sessions neither updated nor sent a message in the last ``days`` days."""
+    cutoff = timezone.now() - timedelta(days=days)
+    recent = ChatMessage.objects.filter(session_id=models.OuterRef('pk'), timestamp__gte=cutoff)
+    return ChatSession.objects.filter(updated_at__lt=cutoff).exclude(models.Exists(recent))
+
+def _session_record(session, messages):
+    return {
+        'version': ARCHIVE_VERSION,
+        'session_id': session.session_id,
+        'summary': session.summary,
+        'summarized_through': session.summarized_through,
+        'created_at': session.created_at.isoformat(),
+        'updated_at': session.updated_at.isoformat(),
+        'messages': [
+            {
+                'id': message.id,
+                'content': message.content,
+                'is_user_message': message.is_user_message,
+                'timestamp': message.timestamp.isoformat(),
+            }
+            for message in messages
+        ],
+    }
+
+def _write_batch(path, sessions):
+    """Write one archive file atomically; returns the written message pks by session pk."""
+    messages_by_session = {session.pk: [] for session in sessions}
+    messages = ChatMessage.objects.filter(session_id__in=[s.pk for s in sessions]).order_by('timestamp', 'id')
+    for message in messages.iterator(chunk_size=2000):
+        messages_by_session.setdefault(message.session_id, []).append(message)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as fh:
+            for session in sessions:
+                record = _session_record(session, messages_by_session[session.pk])
+                fh.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return {
+        session_pk: [message.pk for message in messages] for session_pk, messages in messages_by_session.items()
+    }
+
+def _delete_batch(archived, days, delete_chunk):
+    """
+    Delete the archived sessions that are still inactive, with their
+    archived messages. Each session is locked, re-checked and deleted in one
+    transaction, so it is either removed or kept whole; a transaction covers
+    sessions totalling up to ``delete_chunk`` messages (or one larger
+    session). Returns the number of sessions deleted.
+    """
+    groups, group, size = [], [], 0
+    for session_pk, message_pks in archived.items():
+        if group and size + len(message_pks) > delete_chunk:
+            groups.append(group)
+            group, size = [], 0
+        group.append(session_pk)
+        size += len(message_pks)
+    if group:
+        groups.append(group)
+
+    deleted = 0
+    for group in groups:
+        with transaction.atomic():
+            # Lock first so no message can be added, then re-check in a new query.
+            locked = list(ChatSession.objects.select_for_update().filter(pk__in=group).values_list('pk', flat=True))
+            inactive = list(inactive_sessions(days).filter(pk__in=locked).values_list('pk', flat=True))
+            ChatMessage.objects.filter(
+                pk__in=[message_pk for session_pk in inactive for message_pk in archived[session_pk]]
+            ).delete()
+            remaining = ChatMessage.objects.filter(session_id=models.OuterRef('pk'))
+            sessions = ChatSession.objects.filter(pk__in=inactive).exclude(models.Exists(remaining))
+            deleted += sessions.delete()[1].get(ChatSession._meta.label, 0)
+    if deleted < len(archived):
+        logger.warning(f"Kept {len(archived) - deleted} archived chat sessions that became active again")
+    return deleted
+
+def archive_sessions(days, batch_size=500, delete_chunk=5000, archive_dir=None, dry_run=False):
+    """
+    Archive and delete sessions inactive for ``days`` days.
+
+    Returns ``(sessions, messages, paths)`` for what was (or, with
+    ``dry_run``, would be) archived.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    queryset = inactive_sessions(days).order_by('pk')
+    if dry_run:
+        return (
+            queryset.count(),
+            ChatMessage.objects.filter(session__in=queryset).count(),
+            [],
+        )
+
+    os.makedirs(archive_dir, exist_ok=True)
+    run_stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    total_sessions = total_messages = 0
+    paths = []
+    last_pk = 0
+    while True:
+        sessions = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not sessions:
+            break
+        last_pk = sessions[-1].pk
+        path = os.path.join(archive_dir, f'chat-sessions-{run_stamp}-{len(paths) + 1:04d}.jsonl.gz')
+        archived = _write_batch(path, sessions)
+        total_messages += sum(len(message_pks) for message_pks in archived.values())
+        total_sessions += _delete_batch(archived, days, delete_chunk)
+        paths.append(path)
+        logger.info(f"Archived {len(sessions)} chat sessions to {path}")
+    return total_sessions, total_messages, paths
+
+def restore_archive(path):
+    """
+    Load sessions from an archive file back into the database.
+
+    Sessions whose ``session_id`` already exists are skipped. Restored
+    sessions count as updated now, so the next retention run keeps them.
+    Returns ``(restored, skipped)``.
+    """
+    restored = skipped = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            with transaction.atomic():
+                if ChatSession.objects.filter(session_id=record['session_id']).exists():
+                    skipped += 1
+                    continue
+                _restore_session(record)
+            restored += 1
+    logger.info(f"Restored {restored} chat sessions from {path} ({skipped} already present)")
+    return restored, skipped
+
+def _restore_session(record):
+    session = ChatSession.objects.create(session_id=record['session_id'], summary=record.get('summary', ''))
+    messages = [
+        ChatMessage(session=session, content=item['content'], is_user_message=item['is_user_message'])
+        for item in record['messages']
+    ]
+    ChatMessage.objects.bulk_create(messages, batch_size=1000)
+    # auto_now_add stamped the restored rows with the current time.
+    for message, item in zip(messages, record['messages']):
+        message.timestamp = parse_datetime(item['timestamp'])
+    ChatMessage.objects.bulk_update(messages, ['timestamp'], batch_size=1000)
+
+    # Message ids change on restore, so re-point the summary boundary.
+    summarized_through = 0
+    for message, item in zip(messages, record['messages']):
+        if item['id'] <= record.get('summarized_through', 0):
+            summarized_through = message.pk
+    ChatSession.objects.filter(pk=session.pk).update(
+        summarized_through=summarized_through,
+        created_at=parse_datetime(record['created_at']),
+    )
+    return session
@@ -4,10 +4,14 @@ from .models import ChatSession, ChatMessage
 class ChatSessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatSession
-        fields = ['id', 'session_id', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'session_id', 'summary', 'created_at', 'updated_at']
+        read_only_fields = ['summary', 'created_at', 'updated_at']
 
 class ChatMessageSerializer(serializers.ModelSerializer):
+    session_id = serializers.SlugRelatedField(
+        source='session', slug_field='session_id', queryset=ChatSession.objects.all()
+    )
+
     class Meta:
         model = ChatMessage
         fields = ['id', 'session_id', 'content', 'is_user_message', 'timestamp']
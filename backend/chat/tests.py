@@ -0,0 +1,290 @@
+import asyncio
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import AuthToken
+from .context import build_context, estimate_tokens, update_summary
+from .llm import ChatLLMError, ThinkFilter
+from .models import ChatSession, ChatMessage
+from . import retention, views
+from .retention import archive_sessions, restore_archive
+
+class ChatMessageStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatter', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = ChatSession.objects.create(session_id='session-a')
+        self.other = ChatSession.objects.create(session_id='session-b')
+        for i in range(3):
+            ChatMessage.objects.create(session=self.session, content=f'a{i}')
+        ChatMessage.objects.create(session=self.other, content='b0')
+
+    def test_create_and_filter_by_session_id(self):
+        response = self.client.post('/api/chat/messages/', {'session_id': 'session-b', 'content': 'b1'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ChatMessage.objects.get(pk=response.data['id']).session, self.other)
+
+        response = self.client.get('/api/chat/messages/', {'session_id': 'session-b'})
+        self.assertEqual([m['content'] for m in response.data['results']], ['b0', 'b1'])
+        self.assertEqual(response.data['results'][0]['session_id'], 'session-b')
+
+    def test_listing_requires_session_id(self):
+        self.assertEqual(self.client.get('/api/chat/messages/').status_code, 400)
+
+    def test_session_messages_use_keyset_pages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/chat/sessions/{self.session.pk}/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['content'] for m in response.data['results']], ['a0', 'a1', 'a2'])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+    def test_message_lookup_uses_composite_index(self):
+        sql, params = ChatMessage.objects.filter(session_id=self.session.pk).order_by('timestamp').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('chat_message_session_time', plan)
+
+def fake_completion(*tokens, error=None):
+    async def stream(messages):
+        fake_completion.messages = messages
+        for token in tokens:
+            yield token
+        if error:
+            raise error
+    return stream
+
+class ChatStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatter', password='testpassword')
+        _, self.token_key = AuthToken.issue(self.user)
+        self.session = ChatSession.objects.create(session_id='session-a')
+        ChatMessage.objects.create(session=self.session, content='earlier question')
+
+    async def _stream(self, content='Hello?'):
+        response = await self.async_client.post(
+            f'/api/chat/sessions/{self.session.session_id}/stream/',
+            json.dumps({'content': content}), content_type='application/json',
+            headers={'Authorization': f'Token {self.token_key}'},
+        )
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = [
+            (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in body.strip().split('\n\n')
+        ]
+        return response, events
+
+    async def test_reply_is_streamed_and_persisted(self):
+        with mock.patch('chat.views.stream_chat_completion', fake_completion('Hi', ' there')):
+            response, events = await self._stream()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual([name for name, _ in events], ['message', 'token', 'token', 'done'])
+        self.assertEqual(events[-1][1]['content'], 'Hi there')
+        self.assertEqual(fake_completion.messages[-2:], [
+            {'role': 'user', 'content': 'earlier question'}, {'role': 'user', 'content': 'Hello?'},
+        ])
+        contents = [m async for m in ChatMessage.objects.filter(session=self.session).values_list('content', 'is_user_message')]
+        self.assertEqual(contents[-2:], [('Hello?', True), ('Hi there', False)])
+
+    async def test_summary_runs_after_the_stream_closes(self):
+        summary_started = asyncio.Event()
+        release = asyncio.Event()
+        async def slow_failing_summary(session):
+            summary_started.set()
+            await release.wait()
+            raise ChatLLMError('summary failed')
+        with mock.patch('chat.views.stream_chat_completion', fake_completion('Hi')), \
+                mock.patch('chat.views.update_summary', side_effect=slow_failing_summary):
+            _, events = await self._stream()
+            self.assertEqual(events[-1][0], 'done')
+            await asyncio.wait_for(summary_started.wait(), 1)
+            release.set()
+            await asyncio.sleep(0)
+
+    async def test_summary_backlog_is_folded_in_one_go(self):
+        passes = iter([True, True, False])
+        finished = asyncio.Event()
+        async def fold(session):
+            folded = next(passes)
+            if not folded:
+                finished.set()
+            return folded
+        with mock.patch('chat.views.stream_chat_completion', fake_completion('Hi')), \
+                mock.patch('chat.views.update_summary', side_effect=fold) as update:
+            await self._stream()
+            await asyncio.wait_for(finished.wait(), 1)
+        self.assertEqual(update.call_count, 3)
+
+    async def test_cancelled_summary_is_logged(self):
+        with self.assertLogs('chat.views', level='WARNING') as logs:
+            task = views._detach(asyncio.sleep(10), name='chat summary for session x')
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.assertIn('chat summary for session x was cancelled', logs.output[0])
+
+    async def test_model_error_ends_stream_without_reply(self):
+        with mock.patch('chat.views.stream_chat_completion', fake_completion('Hi', error=ChatLLMError('boom'))):
+            _, events = await self._stream()
+        self.assertEqual(events[-1][0], 'error')
+        self.assertEqual(await ChatMessage.objects.filter(is_user_message=False).acount(), 0)
+
+    async def test_requires_token(self):
+        response = await self.async_client.post(
+            f'/api/chat/sessions/{self.session.session_id}/stream/',
+            json.dumps({'content': 'Hi'}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_session_auth_requires_csrf_token(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        await client.aforce_login(self.user)
+        url = f'/api/chat/sessions/{self.session.session_id}/stream/'
+        response = await client.post(url, json.dumps({'content': 'Hi'}), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(await ChatMessage.objects.filter(content='Hi').acount(), 0)
+
+        client.cookies['csrftoken'] = 'a' * 32
+        with mock.patch('chat.views.stream_chat_completion', fake_completion('Ok')):
+            response = await client.post(
+                url, json.dumps({'content': 'Hi'}), content_type='application/json',
+                headers={'X-CSRFToken': 'a' * 32},
+            )
+            self.assertEqual(response.status_code, 200)
+            b''.join([chunk async for chunk in response.streaming_content])
+
+    def test_think_sections_are_filtered_across_chunks(self):
+        think_filter = ThinkFilter()
+        chunks = ['<thi', 'nk>plan</th', 'ink>Ans', 'wer <', 'b>']
+        text = ''.join(think_filter.feed(chunk) for chunk in chunks) + think_filter.flush()
+        self.assertEqual(text, 'Answer <b>')
+
+@override_settings(CHAT_SYSTEM_PROMPT='sys', CHAT_CONTEXT_TOKENS=100, CHAT_SUMMARY_TRIGGER_TOKENS=60)
+class ChatContextTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create(session_id='long')
+        # 40 characters each: 14 estimated tokens per message.
+        self.messages = [
+            ChatMessage.objects.create(session=self.session, content=f'{i:02d}' + 'x' * 38, is_user_message=i % 2 == 0)
+            for i in range(20)
+        ]
+
+    async def test_context_is_bounded_to_recent_messages(self):
+        context = await build_context(self.session)
+        self.assertEqual(context[0], {'role': 'system', 'content': 'sys'})
+        self.assertLessEqual(sum(estimate_tokens(m['content']) for m in context), 100)
+        self.assertEqual(context[-1]['content'], self.messages[-1].content)
+        self.assertEqual(len(context), 1 + 6)
+
+    async def test_old_messages_fold_into_rolling_summary(self):
+        with mock.patch('chat.context.complete_chat', mock.AsyncMock(return_value='They counted to thirteen.')) as complete:
+            self.assertTrue(await update_summary(self.session))
+        transcript = complete.call_args.args[0][1]['content']
+        self.assertIn(self.messages[0].content, transcript)
+        self.assertNotIn(self.messages[-1].content, transcript)
+
+        session = await ChatSession.objects.aget(pk=self.session.pk)
+        self.assertEqual(session.summary, 'They counted to thirteen.')
+        self.assertGreater(session.summarized_through, self.messages[0].id)
+
+        context = await build_context(session)
+        self.assertEqual(context[1]['content'], 'Summary of the earlier conversation:\nThey counted to thirteen.')
+        self.assertLessEqual(sum(estimate_tokens(m['content']) for m in context), 100)
+
+    async def test_summary_waits_for_enough_overflow(self):
+        session = await ChatSession.objects.acreate(session_id='short')
+        for i in range(7):
+            await ChatMessage.objects.acreate(session=session, content='y' * 40)
+        with mock.patch('chat.context.complete_chat', mock.AsyncMock()) as complete:
+            self.assertFalse(await update_summary(session))
+        complete.assert_not_called()
+
+class ChatRetentionTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        old = timezone.now() - timedelta(days=120)
+        self.stale = []
+        for i in range(3):
+            session = ChatSession.objects.create(session_id=f'stale-{i}', summary='s')
+            messages = [ChatMessage.objects.create(session=session, content=f'm{j}') for j in range(2)]
+            ChatMessage.objects.filter(session=session).update(timestamp=old)
+            ChatSession.objects.filter(pk=session.pk).update(updated_at=old, created_at=old, summarized_through=messages[0].pk)
+            self.stale.append(session)
+        self.active = ChatSession.objects.create(session_id='active')
+        ChatMessage.objects.create(session=self.active, content='recent')
+        # Idle session record but a recent message: still active.
+        self.recent_message = ChatSession.objects.create(session_id='recent-message')
+        ChatSession.objects.filter(pk=self.recent_message.pk).update(updated_at=old)
+        ChatMessage.objects.create(session=self.recent_message, content='hello')
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def test_archive_and_restore_round_trip(self):
+        sessions, messages, paths = archive_sessions(90, batch_size=2, delete_chunk=1, archive_dir=self.archive_dir)
+        self.assertEqual((sessions, messages, len(paths)), (3, 6, 2))
+        self.assertEqual(
+            set(ChatSession.objects.values_list('session_id', flat=True)), {'active', 'recent-message'},
+        )
+        self.assertEqual(ChatMessage.objects.count(), 2)
+        with gzip.open(paths[0], 'rt') as fh:
+            self.assertEqual([json.loads(line)['session_id'] for line in fh], ['stale-0', 'stale-1'])
+
+        for path in paths:
+            restore_archive(path)
+        self.assertEqual(restore_archive(paths[0]), (0, 2))
+        restored = ChatSession.objects.get(session_id='stale-1')
+        messages = list(restored.messages.order_by('id'))
+        self.assertEqual([m.content for m in messages], ['m0', 'm1'])
+        self.assertLess(messages[0].timestamp, timezone.now() - timedelta(days=100))
+        self.assertEqual(restored.summarized_through, messages[0].pk)
+
+    def test_sessions_active_again_after_the_write_are_kept(self):
+        real_write = retention._write_batch
+        def write_then_reply(path, sessions):
+            archived = real_write(path, sessions)
+            # A reply lands between the archive write and the delete.
+            ChatMessage.objects.create(session=self.stale[0], content='late reply')
+            return archived
+        with mock.patch('chat.retention._write_batch', side_effect=write_then_reply):
+            sessions, messages, _ = archive_sessions(90, batch_size=5, delete_chunk=1, archive_dir=self.archive_dir)
+        self.assertEqual((sessions, messages), (2, 6))
+        kept = ChatSession.objects.get(session_id='stale-0')
+        self.assertEqual(sorted(kept.messages.values_list('content', flat=True)), ['late reply', 'm0', 'm1'])
+        self.assertFalse(ChatSession.objects.filter(session_id__in=['stale-1', 'stale-2']).exists())
+
+    def test_session_spanning_delete_chunks_is_deleted_whole(self):
+        real_inactive = retention.inactive_sessions
+        calls = []
+        def inactive_then_reply(days):
+            calls.append(days)
+            # The first call selects the batch; the third re-checks the second chunk.
+            if len(calls) == 3 and ChatSession.objects.filter(pk=self.stale[0].pk).exists():
+                ChatMessage.objects.create(session=self.stale[0], content='late reply')
+            return real_inactive(days)
+        with mock.patch('chat.retention.inactive_sessions', side_effect=inactive_then_reply):
+            sessions, _, paths = archive_sessions(90, batch_size=5, delete_chunk=1, archive_dir=self.archive_dir)
+        # stale-0's two messages were deleted together with it, not one chunk at a time.
+        self.assertEqual(sessions, 3)
+        self.assertFalse(ChatSession.objects.filter(session_id__startswith='stale').exists())
+        self.assertEqual(restore_archive(paths[0]), (3, 0))
+        self.assertEqual(ChatSession.objects.get(session_id='stale-0').messages.count(), 2)
+
+    def test_command_dry_run_keeps_rows(self):
+        call_command('archive_chat_sessions', '--dry-run', '--days', '90', stdout=io.StringIO())
+        self.assertEqual(ChatSession.objects.count(), 5)
@@ -1,9 +1,11 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import ChatSessionViewSet, ChatMessageViewSet
+from .views import ChatSessionViewSet, ChatMessageViewSet, stream_reply
 
 router = DefaultRouter()
 router.register('sessions', ChatSessionViewSet, basename='chat-session')
 router.register('messages', ChatMessageViewSet, basename='chat-message')
 
-urlpatterns = router.urls 
\ No newline at end of file
+urlpatterns = [
+    path('sessions/<str:session_id>/stream/', stream_reply, name='chat-stream-reply'),
+] + router.urls 
\ No newline at end of file
@@ -1,9 +1,30 @@
-from rest_framework import viewsets, permissions
+import asyncio
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import viewsets, permissions, exceptions
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
+
+from authentication.authentication import CachedTokenAuthentication
+from .context import build_context, update_summary
+from .llm import ChatLLMError, stream_chat_completion
 from .models import ChatSession, ChatMessage
 from .serializers import ChatSessionSerializer, ChatMessageSerializer
-import uuid
+
+logger = logging.getLogger(__name__)
+
+class ChatMessagePagination(CursorPagination):
+    """Keyset pages over one session's messages, served from the (session, timestamp) index."""
+    ordering = ('timestamp', 'id')
+    page_size = 50
 
 class ChatSessionViewSet(viewsets.ModelViewSet):
     queryset = ChatSession.objects.all()
@@ -17,6 +38,15 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         serializer = ChatSessionSerializer(session)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        session = self.get_object()
+        paginator = ChatMessagePagination()
+        queryset = ChatMessage.objects.filter(session_id=session.pk).select_related('session')
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ChatMessageSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 class ChatMessageViewSet(viewsets.ModelViewSet):
     queryset = ChatMessage.objects.all()
     serializer_class = ChatMessageSerializer
@@ -24,11 +54,135 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """
-        Optionally restricts the returned messages to a given session,
-        by filtering against a `session_id` query parameter in the URL.
+        Restricts the returned messages to a given session, by filtering
+        against a `session_id` query parameter in the URL. Listing requires
+        it, so the endpoint never pages through every stored message.
         """
-        queryset = ChatMessage.objects.all()
+        queryset = ChatMessage.objects.select_related('session')
         session_id = self.request.query_params.get('session_id', None)
+        if session_id is None and self.action == 'list':
+            raise exceptions.ValidationError({'session_id': 'This query parameter is required.'})
         if session_id is not None:
-            queryset = queryset.filter(session_id=session_id)
-        return queryset 
\ No newline at end of file
+            # Resolve the session first so messages are read by the indexed FK.
+            session_pk = ChatSession.objects.filter(session_id=session_id).values_list('pk', flat=True).first()
+            queryset = queryset.filter(session_id=session_pk)
+        return queryset
+
+class _CSRFCheck(CsrfViewMiddleware):
+    def _reject(self, request, reason):
+        # Return the failure reason instead of a response, as DRF's session auth does.
+        return reason
+
+def _enforce_csrf(request):
+    check = _CSRFCheck(lambda request: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason:
+        raise exceptions.PermissionDenied(f'CSRF Failed: {reason}')
+
+async def _authenticate(request):
+    """
+    Resolve the user from a DRF token header, falling back to the session.
+
+    The view itself is CSRF exempt so token clients need no CSRF token, but
+    session-authenticated requests still have to pass the CSRF check.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) == 2 and auth[0].lower() == 'token':
+        try:
+            user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(auth[1])
+            return user
+        except exceptions.AuthenticationFailed:
+            return None
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+    _enforce_csrf(request)
+    return user
+
+# Strong references to detached tasks so they are not garbage-collected mid-run.
+_background_tasks = set()
+
+async def _update_summary_in_background(session):
+    # Each pass folds a bounded batch, so keep going until the backlog is below the trigger.
+    try:
+        while await update_summary(session):
+            pass
+    except Exception as e:
+        logger.error(f"Error updating summary for chat session {session.session_id}: {e}")
+
+def _background_task_done(task):
+    _background_tasks.discard(task)
+    if task.cancelled():
+        # e.g. a WSGI server's per-response event loop ended before the task did.
+        logger.warning(f"Background task {task.get_name()} was cancelled before it finished")
+
+def _detach(coroutine, name=None):
+    task = asyncio.create_task(coroutine, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@csrf_exempt
+@require_POST
+async def stream_reply(request, session_id):
+    """
+    Append a user message to a session and stream the assistant's reply as
+    server-sent events: ``token`` events while generating, then ``done``
+    with the stored assistant message (or ``error``).
+
+    The view is async, so under ASGI a connection waiting on the model does
+    not occupy a worker thread.
+    """
+    try:
+        user = await _authenticate(request)
+    except exceptions.PermissionDenied as e:
+        return JsonResponse({'detail': str(e.detail)}, status=403)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    try:
+        content = (json.loads(request.body or b'{}').get('content') or '').strip()
+    except (ValueError, AttributeError):
+        content = ''
+    if not content:
+        return JsonResponse({'error': 'content is required'}, status=400)
+    session = await ChatSession.objects.filter(session_id=session_id).afirst()
+    if session is None:
+        return JsonResponse({'error': 'Session not found'}, status=404)
+
+    user_message = await ChatMessage.objects.acreate(session=session, content=content, is_user_message=True)
+    prompt = await build_context(session)
+
+    async def events():
+        yield _sse('message', ChatMessageSerializer(user_message).data)
+        parts = []
+        try:
+            async for token in stream_chat_completion(prompt):
+                parts.append(token)
+                yield _sse('token', {'content': token})
+        except asyncio.CancelledError:
+            # Client went away: keep whatever was generated so far.
+            if parts:
+                await asyncio.shield(ChatMessage.objects.acreate(
+                    session=session, content=''.join(parts), is_user_message=False,
+                ))
+            raise
+        except (ChatLLMError, OSError, asyncio.TimeoutError) as e:
+            logger.error(f"Error streaming chat reply for session {session.session_id}: {e}")
+            yield _sse('error', {'error': 'The assistant is unavailable right now.'})
+            return
+        reply = await ChatMessage.objects.acreate(
+            session=session, content=''.join(parts), is_user_message=False,
+        )
+        # Summarize without holding up ``done``. A run that is cut short is
+        # logged; whatever it did not fold is picked up after the next reply.
+        _detach(_update_summary_in_background(session), name=f'chat summary for session {session.session_id}')
+        yield _sse('done', ChatMessageSerializer(reply).data)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
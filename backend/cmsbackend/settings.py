@@ -162,7 +162,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',  # Token authentication
+        'authentication.authentication.CachedTokenAuthentication',  # Token authentication
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
@@ -212,6 +212,103 @@ except ImportError:
     HAS_PIL = False
     print("WARNING: Pillow is not installed. Image processing features will be limited.")
 
+# Research data uploads: part size for chunked uploads and where parts are staged
+RESEARCH_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+RESEARCH_UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'research_uploads')
+# Seconds without a new part before cleanup_research_uploads aborts a session
+RESEARCH_UPLOAD_EXPIRY = 24 * 60 * 60
+
+# Extract row counts, schema and column statistics into ResearchData.metadata after upload
+RESEARCH_INGEST_ON_UPLOAD = True
+
+# AI analyses: run them in the web process's thread pool (set False when using
+# `manage.py run_analysis_worker`), and rows read per chunk while analysing
+RESEARCH_ANALYSIS_IN_PROCESS = True
+RESEARCH_ANALYSIS_CHUNK_ROWS = 50000
+# Analyses in processing for longer than this (seconds) are assumed dead and
+# requeued; duplicates waiting on an in-flight analysis check back this often
+RESEARCH_ANALYSIS_STALE_AFTER = 30 * 60
+RESEARCH_ANALYSIS_RETRY_INTERVAL = 5
+# Keep a memory-mapped float64 copy of each dataset's columns next to the file
+# so repeated analyses skip parsing
+RESEARCH_DATASET_COLUMNAR_CACHE = True
+# Total size budget for cached analysis results (least recently used evicted first)
+RESEARCH_ANALYSIS_RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Research data downloads: '' streams from Django, 'nginx' uses X-Accel-Redirect
+# (internal location RESEARCH_DOWNLOAD_ACCEL_PREFIX mapped to MEDIA_ROOT), 'sendfile' uses X-Sendfile
+RESEARCH_DOWNLOAD_SENDFILE_BACKEND = os.environ.get('RESEARCH_DOWNLOAD_SENDFILE_BACKEND', '')
+RESEARCH_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Public site URL used for absolute links in sitemaps and feeds
+SITE_URL = os.environ.get('SITE_URL', 'https://kavoshai.com')
+# URLs per sitemap file (the sitemap protocol allows at most 50,000)
+SITEMAP_SHARD_SIZE = 50000
+# Entries per RSS/Atom feed
+BLOG_FEED_ITEMS = 20
+
+# Site/SEO settings are served from a per-process copy, invalidated through the
+# cache on save; this bounds staleness when CACHES is not shared between processes
+SINGLETON_SETTINGS_MAX_AGE = 60
+
+# Seconds a resolved auth token (and its user) is cached; deleting the token or
+# saving the user drops the entry immediately
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+# Auth tokens expire this many seconds after they were last extended; use
+# extends them, at most once per refresh interval
+AUTH_TOKEN_TTL = 60 * 60 * 24 * 14
+AUTH_TOKEN_REFRESH_INTERVAL = 60 * 60
+# Tokens kept per user (each login issues one); older ones are deleted
+AUTH_TOKEN_MAX_PER_USER = 10
+
+# Chat replies (streamed from the same provider as the blog generator)
+CHAT_LLM_MODEL = os.environ.get('CHAT_LLM_MODEL', '')  # blank: provider default
+CHAT_LLM_MAX_TOKENS = 1024
+CHAT_LLM_TIMEOUT = 120  # seconds for a whole reply
+CHAT_LLM_READ_TIMEOUT = 30  # seconds without a streamed chunk
+CHAT_SYSTEM_PROMPT = 'You are a helpful assistant.'
+# Prompt budget per reply: recent messages up to CHAT_CONTEXT_TOKENS, older ones
+# folded into a rolling session summary once CHAT_SUMMARY_TRIGGER_TOKENS accumulate
+CHAT_CONTEXT_TOKENS = 3000
+CHAT_SUMMARY_MAX_TOKENS = 300
+CHAT_SUMMARY_TRIGGER_TOKENS = 500
+# Retention: archive_chat_sessions moves sessions idle this long to CHAT_ARCHIVE_DIR
+CHAT_RETENTION_DAYS = 90
+CHAT_ARCHIVE_DIR = os.environ.get('CHAT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'chat_archives'))
+
+# Token buckets for endpoints that queue AI blog generation: capacity, and
+# seconds to refill one token, per user and shared by all users
+AI_BLOG_THROTTLE_USER_CAPACITY = 5
+AI_BLOG_THROTTLE_USER_REFILL = 60
+AI_BLOG_THROTTLE_GLOBAL_CAPACITY = 30
+AI_BLOG_THROTTLE_GLOBAL_REFILL = 6
+# Identical requests are joined onto a queued/running job updated this recently
+AI_BLOG_COALESCE_WINDOW = 15 * 60
+# Worker threads for generation jobs, scheduled fairly between users; batch
+# jobs queued this many seconds go ahead of interactive ones
+AI_BLOG_WORKERS = 5
+AI_BLOG_BATCH_MAX_WAIT = 60
+# Completion calls: retries for rate limiting/server errors, and seconds to wait
+# for the next streamed chunk
+AI_LLM_MAX_RETRIES = 2
+AI_LLM_READ_TIMEOUT = 120
+# Estimated input tokens per generation prompt (system prompt included); search
+# snippets are trimmed to fit, and keywords are capped separately
+AI_PROMPT_INPUT_TOKENS = 3000
+AI_PROMPT_KEYWORD_TOKENS = 60
+# Retrieval for requests that allow web search: providers queried in parallel,
+# total seconds to wait for them, results per provider, and how long complete
+# answers are cached per query
+AI_SEARCH_PROVIDERS = ['ai_blog_generator.retrieval.LocalPostProvider']
+AI_SEARCH_TIMEOUT = 3
+AI_SEARCH_RESULTS_PER_PROVIDER = 5
+AI_SEARCH_CACHE_TIMEOUT = 60 * 60
+# USD per million (prompt, completion) tokens, for usage cost estimates
+AI_LLM_PRICING = {
+    'deepseek-r1-distill-llama-70b': (0.75, 0.99),
+    'gpt-4o': (2.50, 10.00),
+}
+
 # AI Blog Generator settings
 AI_AUTO_PUBLISH_POSTS = True  # Set to True to auto-publish AI-generated blog posts
 
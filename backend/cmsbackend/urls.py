@@ -15,13 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 
 from blog.views import BlogPostViewSet, CategoryViewSet, TagViewSet
 from admin_panel.views import SiteSettingsViewSet, SEOSettingsViewSet
+from blog.sitemaps import sitemap_index, sitemap_shard, robots_txt
+from blog.feeds import posts_feed, category_feed, tag_feed
 from .views import CustomObtainAuthToken, RegenerateAuthToken
 
 # Set up the API router
@@ -43,6 +45,12 @@ urlpatterns = [
     path('api/research/', include('research.urls')),  # Add research URLs
     path('api/blog/', include('blog.urls')),
     path('api/chat/', include('chat.urls')),
+    re_path(r'^api/feeds/posts\.(?P<ext>xml|atom)$', posts_feed, name='posts-feed'),
+    re_path(r'^api/feeds/categories/(?P<slug>[-\w]+)\.(?P<ext>xml|atom)$', category_feed, name='category-feed'),
+    re_path(r'^api/feeds/tags/(?P<slug>[-\w]+)\.(?P<ext>xml|atom)$', tag_feed, name='tag-feed'),
+    path('sitemap.xml', sitemap_index, name='sitemap-index'),
+    path('sitemaps/<int:shard>.xml', sitemap_shard, name='sitemap-shard'),
+    path('robots.txt', robots_txt, name='robots-txt'),
 ]
 
 # Serve media files in development
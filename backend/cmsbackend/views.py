@@ -4,11 +4,12 @@ from django.contrib.auth import authenticate
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.views import APIView
 
+from authentication.models import AuthToken
+
 logger = logging.getLogger(__name__)
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -31,10 +32,10 @@ class CustomObtainAuthToken(ObtainAuthToken):
         # Authenticate user
         user = authenticate(username=username, password=password)
         if user:
-            # Get or create token
-            token, created = Token.objects.get_or_create(user=user)
-            logger.info(f"Token {'created' if created else 'retrieved'} for user {username}")
-            return Response({'token': token.key})
+            # Keys are stored hashed, so every login issues a new token
+            token, key = AuthToken.issue(user)
+            logger.info(f"Token {token.pk} issued for user {username}")
+            return Response({'token': key})
         else:
             logger.warning(f"Failed authentication attempt for username {username}")
             return Response(
@@ -50,10 +51,10 @@ class RegenerateAuthToken(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        # Delete existing token
-        Token.objects.filter(user=request.user).delete()
+        # Delete existing tokens
+        AuthToken.objects.filter(user=request.user).delete()
         
         # Create new token
-        token = Token.objects.create(user=request.user)
+        _, key = AuthToken.issue(request.user)
         
-        return Response({'token': token.key}) 
\ No newline at end of file
+        return Response({'token': key})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, ResearchProject, ResearchData, AIAnalysis, Comment
+from .models import UserProfile, ResearchProject, ResearchData, ResearchUpload, AIAnalysis, AnalysisResult, Comment
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -23,6 +23,13 @@ class ResearchDataAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'project__title')
     date_hierarchy = 'created_at'
 
+@admin.register(ResearchUpload)
+class ResearchUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'project', 'uploaded_by', 'total_size', 'status', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('filename', 'title', 'project__title')
+    readonly_fields = ('id', 'data', 'created_at', 'updated_at')
+
 @admin.register(AIAnalysis)
 class AIAnalysisAdmin(admin.ModelAdmin):
     list_display = ('title', 'project', 'analysis_type', 'status', 'requested_by', 'created_at')
@@ -30,6 +37,12 @@ class AIAnalysisAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'project__title')
     date_hierarchy = 'created_at'
 
+@admin.register(AnalysisResult)
+class AnalysisResultAdmin(admin.ModelAdmin):
+    list_display = ('analysis_type', 'data', 'size_bytes', 'hit_count', 'last_used_at', 'created_at')
+    list_filter = ('analysis_type',)
+    readonly_fields = ('key', 'data', 'analysis_type', 'results', 'size_bytes', 'hit_count', 'created_at', 'last_used_at')
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('author', 'project', 'parent', 'created_at')
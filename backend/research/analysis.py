@@ -0,0 +1,433 @@
+"""
+Execution engine for AIAnalysis jobs.
+
+Pending analyses are claimed with a compare-and-set status update (so any
+number of workers can poll the same table), dispatched by ``analysis_type``
+to a registered handler, and their results, errors and timing written back.
+
+Handlers receive a ``Dataset`` and the analysis ``parameters`` and return a
+JSON-serialisable dict. They stream the dataset chunk by chunk and combine
+per-chunk NumPy aggregates, so memory stays bounded for any file size.
+Register new handlers with ``@register_handler('name')`` or through the
+``RESEARCH_ANALYSIS_HANDLERS`` setting (``{'name': 'dotted.path'}``).
+
+Each analysis is keyed by a hash of (data file checksum, data version,
+analysis type, canonicalised parameters). Completed results are kept in
+``AnalysisResult`` and reused for later analyses with the same key, and
+duplicates submitted while one is in flight wait for it and share its
+outcome instead of computing again.
+
+An analysis left in ``processing`` longer than ``RESEARCH_ANALYSIS_STALE_AFTER``
+seconds (its worker died or the process restarted) is put back to pending
+and rescheduled by ``requeue_stale_analyses``, which runs on every
+submission and in each worker poll. Duplicates are scheduled too: while
+the analysis they wait on is in flight they check back every
+``RESEARCH_ANALYSIS_RETRY_INTERVAL`` seconds, so they either pick up its
+shared outcome or, if it was requeued, run themselves.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .datasets import Dataset, DatasetError
+from .models import AIAnalysis, AnalysisResult, ResearchData
+
+logger = logging.getLogger(__name__)
+
+# Thread pool for running analyses inside the web process
+analysis_pool = ThreadPoolExecutor(max_workers=2)
+
+ANALYSIS_HANDLERS = {}
+
+# Bump when handler output changes so stale cached results stop matching.
+RESULT_CACHE_VERSION = 1
+
+class AnalysisError(Exception):
+    """Raised by handlers for invalid parameters or unusable data."""
+
+def register_handler(analysis_type):
+    """Decorator registering a handler function for ``analysis_type``."""
+    def decorator(func):
+        ANALYSIS_HANDLERS[analysis_type] = func
+        return func
+    return decorator
+
+def get_handler(analysis_type):
+    configured = getattr(settings, 'RESEARCH_ANALYSIS_HANDLERS', {})
+    if analysis_type in configured:
+        return import_string(configured[analysis_type])
+    handler = ANALYSIS_HANDLERS.get(analysis_type)
+    if handler is None:
+        raise AnalysisError(f"Unknown analysis type: {analysis_type}")
+    return handler
+
+def _resolve_columns(dataset, parameters, minimum=1):
+    columns = parameters.get('columns') or dataset.numeric_columns()
+    if isinstance(columns, str):
+        columns = [columns]
+    if len(columns) < minimum:
+        raise AnalysisError(f"At least {minimum} numeric column(s) are required")
+    return list(columns)
+
+def _float_or_none(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+@register_handler('descriptive_stats')
+def descriptive_stats(dataset, parameters):
+    """Count, nulls, mean, std, min and max per column (Chan's parallel merge)."""
+    columns = _resolve_columns(dataset, parameters)
+    state = {name: [0, 0, 0.0, 0.0, np.inf, -np.inf] for name in columns}  # n, nulls, mean, M2, min, max
+    for chunk in dataset.iter_chunks(columns):
+        for name in columns:
+            values = chunk[name]
+            valid = values[~np.isnan(values)]
+            stats = state[name]
+            stats[1] += len(values) - len(valid)
+            n_b = len(valid)
+            if not n_b:
+                continue
+            mean_b = valid.mean()
+            m2_b = ((valid - mean_b) ** 2).sum()
+            n_a, mean_a, m2_a = stats[0], stats[2], stats[3]
+            n = n_a + n_b
+            delta = mean_b - mean_a
+            stats[0] = n
+            stats[2] = mean_a + delta * n_b / n
+            stats[3] = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+            stats[4] = min(stats[4], valid.min())
+            stats[5] = max(stats[5], valid.max())
+
+    results = {}
+    for name, (n, nulls, mean, m2, minimum, maximum) in state.items():
+        results[name] = {
+            'count': n,
+            'null_count': nulls,
+            'mean': _float_or_none(mean) if n else None,
+            'std': _float_or_none(np.sqrt(m2 / (n - 1))) if n > 1 else None,
+            'min': _float_or_none(minimum) if n else None,
+            'max': _float_or_none(maximum) if n else None,
+        }
+    return {'columns': results}
+
+@register_handler('correlation')
+def correlation_matrix(dataset, parameters):
+    """Pearson correlation over rows complete in every selected column."""
+    columns = _resolve_columns(dataset, parameters, minimum=2)
+    k = len(columns)
+    n = 0
+    sums = np.zeros(k)
+    cross = np.zeros((k, k))
+    for chunk in dataset.iter_chunks(columns):
+        block = np.column_stack([chunk[name] for name in columns])
+        block = block[~np.isnan(block).any(axis=1)]
+        n += len(block)
+        sums += block.sum(axis=0)
+        cross += block.T @ block
+    if n < 2:
+        raise AnalysisError("Not enough complete rows to compute correlations")
+    mean = sums / n
+    covariance = (cross - n * np.outer(mean, mean)) / (n - 1)
+    std = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = covariance / np.outer(std, std)
+    matrix = [[_float_or_none(value) for value in row] for row in corr]
+    return {'columns': columns, 'matrix': matrix, 'rows_used': n}
+
+@register_handler('histogram')
+def histogram(dataset, parameters):
+    """Fixed-width histogram per column; bin edges come from the data range."""
+    columns = _resolve_columns(dataset, parameters)
+    bins = int(parameters.get('bins', 20))
+    if not 1 <= bins <= 1000:
+        raise AnalysisError("bins must be between 1 and 1000")
+
+    ranges = {}
+    value_range = parameters.get('range')
+    if value_range:
+        ranges = {name: (float(value_range[0]), float(value_range[1])) for name in columns}
+    else:
+        bounds = {name: [np.inf, -np.inf] for name in columns}
+        for chunk in dataset.iter_chunks(columns):
+            for name in columns:
+                values = chunk[name]
+                if np.isnan(values).all():
+                    continue
+                bounds[name][0] = min(bounds[name][0], np.nanmin(values))
+                bounds[name][1] = max(bounds[name][1], np.nanmax(values))
+        for name, (low, high) in bounds.items():
+            if np.isinf(low):
+                low, high = 0.0, 1.0
+            elif low == high:
+                low, high = low - 0.5, high + 0.5
+            ranges[name] = (float(low), float(high))
+
+    edges = {name: np.linspace(low, high, bins + 1) for name, (low, high) in ranges.items()}
+    counts = {name: np.zeros(bins, dtype=np.int64) for name in columns}
+    for chunk in dataset.iter_chunks(columns):
+        for name in columns:
+            values = chunk[name]
+            counts[name] += np.histogram(values[~np.isnan(values)], bins=edges[name])[0]
+
+    return {
+        'bins': bins,
+        'columns': {
+            name: {'edges': edges[name].tolist(), 'counts': counts[name].tolist()}
+            for name in columns
+        },
+    }
+
+def canonicalize(value):
+    """Normalise parameters so equivalent requests hash identically."""
+    if isinstance(value, dict):
+        return {str(key): canonicalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def get_data_checksum(data):
+    """Return the dataset's SHA-256, computing and storing it if missing."""
+    if not data.checksum:
+        hasher = hashlib.sha256()
+        with data.file.storage.open(data.file.name, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        data.checksum = hasher.hexdigest()
+        ResearchData.objects.filter(pk=data.pk).update(checksum=data.checksum)
+    return data.checksum
+
+def compute_result_key(analysis, checksum):
+    payload = json.dumps(
+        [RESULT_CACHE_VERSION, checksum, analysis.data.version, analysis.analysis_type,
+         canonicalize(analysis.parameters or {})],
+        sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def lookup_cached_result(key):
+    """Return cached results for ``key`` and mark the entry as recently used."""
+    entry = AnalysisResult.objects.filter(key=key).values_list('pk', 'results').first()
+    if entry is None:
+        return None
+    AnalysisResult.objects.filter(pk=entry[0]).update(last_used_at=timezone.now(), hit_count=F('hit_count') + 1)
+    return entry[1]
+
+def store_cached_result(analysis):
+    size = len(json.dumps(analysis.results, separators=(',', ':')))
+    max_bytes = getattr(settings, 'RESEARCH_ANALYSIS_RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    if size > max_bytes:
+        return
+    AnalysisResult.objects.update_or_create(
+        key=analysis.result_key,
+        defaults={
+            'data': analysis.data,
+            'analysis_type': analysis.analysis_type,
+            'results': analysis.results,
+            'size_bytes': size,
+            'last_used_at': timezone.now(),
+        },
+    )
+    evict_cached_results(max_bytes)
+
+def evict_cached_results(max_bytes=None):
+    """Delete least-recently-used cache entries until the total fits ``max_bytes``."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'RESEARCH_ANALYSIS_RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    total = AnalysisResult.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    if total <= max_bytes:
+        return 0
+    evicted = []
+    for pk, size in AnalysisResult.objects.order_by('last_used_at').values_list('pk', 'size_bytes').iterator():
+        if total <= max_bytes:
+            break
+        evicted.append(pk)
+        total -= size
+    AnalysisResult.objects.filter(pk__in=evicted).delete()
+    logger.info(f"Evicted {len(evicted)} cached analysis results")
+    return len(evicted)
+
+def _complete_from_cache(analysis, results):
+    now = timezone.now()
+    analysis.results = results
+    analysis.status = 'completed'
+    analysis.error_message = ''
+    analysis.cache_hit = True
+    analysis.started_at = analysis.completed_at = now
+    analysis.duration_ms = 0
+
+def get_stale_after():
+    return timedelta(seconds=getattr(settings, 'RESEARCH_ANALYSIS_STALE_AFTER', 30 * 60))
+
+def requeue_stale_analyses():
+    """Put analyses stuck in ``processing`` back to pending and reschedule them."""
+    cutoff = timezone.now() - get_stale_after()
+    stale = list(AIAnalysis.objects.filter(status='processing', started_at__lt=cutoff).values_list('pk', flat=True))
+    if not stale:
+        return 0
+    requeued = AIAnalysis.objects.filter(pk__in=stale, status='processing', started_at__lt=cutoff).update(
+        status='pending', updated_at=timezone.now(),
+    )
+    for analysis in AIAnalysis.objects.filter(pk__in=stale, status='pending'):
+        schedule_analysis(analysis)
+    logger.warning(f"Requeued {requeued} analyses stuck in processing since before {cutoff}")
+    return requeued
+
+def submit_analysis(analysis):
+    """
+    Queue a pending analysis, answering it immediately from the result cache
+    when possible. When an identical analysis is already in flight this one
+    waits for it and shares its outcome.
+    """
+    requeue_stale_analyses()
+    if analysis.data.checksum:
+        analysis.result_key = compute_result_key(analysis, analysis.data.checksum)
+        cached = lookup_cached_result(analysis.result_key)
+        if cached is not None:
+            _complete_from_cache(analysis, cached)
+            analysis.save()
+            return analysis
+        analysis.save(update_fields=['result_key', 'updated_at'])
+    schedule_analysis(analysis)
+    return analysis
+
+def _share_outcome(analysis):
+    """Give duplicates that waited on ``analysis`` the same outcome."""
+    if not analysis.result_key:
+        return 0
+    now = timezone.now()
+    fields = {
+        'status': analysis.status,
+        'error_message': analysis.error_message,
+        'started_at': now,
+        'completed_at': now,
+        'duration_ms': 0,
+        'updated_at': now,
+    }
+    if analysis.status == 'completed':
+        fields.update(results=analysis.results, cache_hit=True)
+    return AIAnalysis.objects.filter(
+        result_key=analysis.result_key, status='pending',
+    ).exclude(pk=analysis.pk).update(**fields)
+
+def claim_analysis(analysis_id=None):
+    """
+    Atomically move one pending analysis to ``processing`` and return it.
+
+    With ``analysis_id`` only that analysis is claimed; otherwise the oldest
+    pending one. Analyses stuck in ``processing`` past the stale timeout can
+    be claimed again, and only live ones hold back their pending duplicates.
+    Returns None when there is nothing (left) to claim.
+    """
+    cutoff = timezone.now() - get_stale_after()
+    in_flight_keys = AIAnalysis.objects.filter(
+        status='processing', started_at__gte=cutoff,
+    ).exclude(result_key='').values('result_key')
+    claimable = Q(status='pending') | Q(status='processing', started_at__lt=cutoff)
+    while True:
+        queryset = AIAnalysis.objects.filter(claimable).exclude(status='pending', result_key__in=in_flight_keys)
+        if analysis_id is not None:
+            queryset = queryset.filter(pk=analysis_id)
+        candidate = queryset.order_by('created_at').values('pk', 'status', 'started_at').first()
+        if candidate is None:
+            return None
+        # Compare-and-set on what was read, so only one worker wins.
+        claimed = AIAnalysis.objects.filter(
+            pk=candidate['pk'], status=candidate['status'], started_at=candidate['started_at'],
+        ).update(status='processing', started_at=timezone.now(), completed_at=None, duration_ms=None)
+        if claimed:
+            if candidate['status'] == 'processing':
+                logger.warning(f"Reclaimed analysis {candidate['pk']} stuck in processing since {candidate['started_at']}")
+            return AIAnalysis.objects.select_related('data').get(pk=candidate['pk'])
+        if analysis_id is not None:
+            return None
+
+def run_analysis(analysis):
+    """Execute a claimed analysis (or reuse a cached result) and persist its outcome."""
+    started = time.perf_counter()
+    analysis.cache_hit = False
+    try:
+        if not analysis.result_key:
+            analysis.result_key = compute_result_key(analysis, get_data_checksum(analysis.data))
+        cached = lookup_cached_result(analysis.result_key)
+        if cached is not None:
+            analysis.results = cached
+            analysis.cache_hit = True
+        else:
+            handler = get_handler(analysis.analysis_type)
+            dataset = Dataset(analysis.data)
+            analysis.results = handler(dataset, analysis.parameters or {})
+        analysis.status = 'completed'
+        analysis.error_message = ''
+    except (AnalysisError, DatasetError, ValueError, KeyError, OSError) as e:
+        logger.warning(f"Analysis {analysis.pk} failed: {e}")
+        analysis.status = 'failed'
+        analysis.error_message = str(e)
+    except Exception as e:
+        logger.error(f"Unexpected error running analysis {analysis.pk}: {e}")
+        logger.error(traceback.format_exc())
+        analysis.status = 'failed'
+        analysis.error_message = str(e)
+    analysis.duration_ms = int((time.perf_counter() - started) * 1000)
+    analysis.completed_at = timezone.now()
+    analysis.save(update_fields=['results', 'status', 'error_message', 'duration_ms', 'completed_at',
+                                 'result_key', 'cache_hit', 'updated_at'])
+    if analysis.status == 'completed' and not analysis.cache_hit:
+        store_cached_result(analysis)
+    shared = _share_outcome(analysis)
+    logger.info(
+        f"Analysis {analysis.pk} ({analysis.analysis_type}) {analysis.status} in {analysis.duration_ms} ms"
+        f"{' from cache' if analysis.cache_hit else ''}{f', shared with {shared} duplicates' if shared else ''}"
+    )
+    return analysis
+
+def process_analysis(analysis_id):
+    """Claim and run a specific analysis if no worker has taken it yet."""
+    analysis = claim_analysis(analysis_id)
+    if analysis is not None:
+        run_analysis(analysis)
+    return analysis
+
+def _waiting_on_duplicate(analysis_id):
+    # Still pending after a claim attempt: an identical analysis is in flight.
+    return AIAnalysis.objects.filter(pk=analysis_id, status='pending').exists()
+
+def schedule_analysis(analysis):
+    """
+    Run an analysis in the web process after the current transaction commits.
+    Disabled with ``RESEARCH_ANALYSIS_IN_PROCESS = False`` when dedicated
+    ``run_analysis_worker`` processes are used instead.
+    """
+    if not getattr(settings, 'RESEARCH_ANALYSIS_IN_PROCESS', True):
+        return
+
+    def run_background_task():
+        try:
+            if process_analysis(analysis.pk) is None and _waiting_on_duplicate(analysis.pk):
+                # Check back later without holding a pool thread while waiting.
+                timer = threading.Timer(
+                    getattr(settings, 'RESEARCH_ANALYSIS_RETRY_INTERVAL', 5),
+                    analysis_pool.submit, [run_background_task],
+                )
+                timer.daemon = True
+                timer.start()
+        except Exception as e:
+            logger.error(f"Error in analysis background task: {e}")
+            logger.error(traceback.format_exc())
+
+    transaction.on_commit(lambda: analysis_pool.submit(run_background_task))
@@ -0,0 +1,316 @@
+"""
+Chunked, columnar access to ResearchData files for analysis.
+
+``Dataset.iter_chunks`` yields blocks of at most ``chunk_rows`` rows as
+``{column: numpy.ndarray}`` (float64, NaN for missing or non-numeric cells),
+so analyses run vectorized per block while memory stays bounded by the
+chunk size rather than the file size.
+
+Local source files are memory-mapped and parsed line by line. The first
+full pass over a dataset also writes a columnar cache next to the file
+(``<file>.columns/``: one raw little-endian float64 file per column plus a
+``manifest.json``). Later passes memory-map those column files and yield
+slices of them directly, skipping parsing entirely. The cache is rebuilt
+whenever the source file's size or modification time changes.
+"""
+import codecs
+import csv
+import itertools
+import json
+import mmap
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from .ingest import HAS_PYARROW, NULL_VALUES, detect_format
+
+if HAS_PYARROW:
+    import pyarrow.parquet as pq
+
+NUMERIC_TYPES = {'integer', 'float', 'boolean'}
+
+CACHE_VERSION = 1
+CACHE_DTYPE = np.dtype('<f8')
+MANIFEST_NAME = 'manifest.json'
+
+class DatasetError(Exception):
+    """Raised when a dataset cannot be read for analysis."""
+
+def _to_float_array(values):
+    """Convert a list of raw cells to float64, mapping anything else to NaN."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    out = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered in NULL_VALUES:
+                out[i] = np.nan
+                continue
+            if lowered in ('true', 'false'):
+                out[i] = 1.0 if lowered == 'true' else 0.0
+                continue
+        try:
+            out[i] = float(value)
+        except (TypeError, ValueError):
+            out[i] = np.nan
+    return out
+
+def get_cache_dir(data):
+    """Directory holding the columnar cache for ``data``, or None for non-local storage."""
+    try:
+        return f'{data.file.path}.columns'
+    except NotImplementedError:
+        return None
+
+def clear_columnar_cache(data):
+    cache_dir = get_cache_dir(data)
+    if cache_dir:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+class _CacheWriter:
+    """Append-only writer for a columnar cache being built in a temp directory."""
+
+    def __init__(self, cache_dir, source_stat):
+        self.cache_dir = cache_dir
+        self.tmp_dir = f'{cache_dir}.tmp-{uuid.uuid4().hex}'
+        os.makedirs(self.tmp_dir)
+        self.source_stat = source_stat
+        self.rows = 0
+        self.columns = {}  # name -> [file index, handle, has_values]
+
+    def append(self, chunk):
+        length = len(next(iter(chunk.values()))) if chunk else 0
+        for name, values in chunk.items():
+            column = self.columns.get(name)
+            if column is None:
+                index = len(self.columns)
+                handle = open(os.path.join(self.tmp_dir, f'{index:05d}.f64'), 'wb')
+                column = self.columns[name] = [index, handle, False]
+                # Columns first seen mid-file (JSON-lines) are NaN before that.
+                np.full(self.rows, np.nan, dtype=CACHE_DTYPE).tofile(handle)
+            values.astype(CACHE_DTYPE, copy=False).tofile(column[1])
+            column[2] = column[2] or not np.isnan(values).all()
+        for name, column in self.columns.items():
+            if name not in chunk:
+                np.full(length, np.nan, dtype=CACHE_DTYPE).tofile(column[1])
+        self.rows += length
+
+    def commit(self):
+        for _, handle, _ in self.columns.values():
+            handle.close()
+        manifest = {
+            'version': CACHE_VERSION,
+            'source_size': self.source_stat.st_size,
+            'source_mtime_ns': self.source_stat.st_mtime_ns,
+            'rows': self.rows,
+            'columns': {},
+            'empty_columns': [],
+        }
+        for name, (index, _, has_values) in self.columns.items():
+            filename = f'{index:05d}.f64'
+            if has_values:
+                manifest['columns'][name] = filename
+            else:
+                manifest['empty_columns'].append(name)
+                os.remove(os.path.join(self.tmp_dir, filename))
+        with open(os.path.join(self.tmp_dir, MANIFEST_NAME), 'w') as fh:
+            json.dump(manifest, fh)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        try:
+            os.rename(self.tmp_dir, self.cache_dir)
+        except OSError:
+            # Another process published the cache first; keep theirs.
+            self.discard()
+
+    def discard(self):
+        for _, handle, _ in self.columns.values():
+            handle.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+class Dataset:
+    """Read-only view of a ResearchData file as numeric column chunks."""
+
+    def __init__(self, data, chunk_rows=None, use_cache=None):
+        self.data = data
+        self.format = detect_format(data.file.name)
+        if self.format is None:
+            raise DatasetError(f"Unsupported dataset format: {data.file.name}")
+        if self.format == 'parquet' and not HAS_PYARROW:
+            raise DatasetError("Reading Parquet datasets requires pyarrow")
+        self.chunk_rows = chunk_rows or getattr(settings, 'RESEARCH_ANALYSIS_CHUNK_ROWS', 50000)
+        if use_cache is None:
+            use_cache = getattr(settings, 'RESEARCH_DATASET_COLUMNAR_CACHE', True)
+        self.cache_dir = get_cache_dir(data) if use_cache else None
+
+    def _summary_columns(self):
+        summary = (self.data.metadata or {}).get('summary') or {}
+        if summary.get('status') == 'completed':
+            return summary.get('columns') or []
+        return None
+
+    def numeric_columns(self):
+        """Names of columns that hold numbers, from the cache or ingest summary if available."""
+        manifest = self._load_manifest()
+        if manifest is not None:
+            return list(manifest['columns'])
+        columns = self._summary_columns()
+        if columns is not None:
+            return [c['name'] for c in columns if c['type'] in NUMERIC_TYPES or c['type'].startswith(('int', 'uint', 'float', 'double'))]
+        chunks = self._iter_source()
+        try:
+            first = next(chunks, {})
+        finally:
+            chunks.close()
+        return [name for name, values in first.items() if len(values) and not np.isnan(values).all()]
+
+    def iter_chunks(self, columns=None):
+        """Yield ``{column: float64 array}`` blocks of at most ``chunk_rows`` rows."""
+        manifest = self._load_manifest()
+        if manifest is not None:
+            yield from self._iter_cached(manifest, columns)
+        elif self.cache_dir:
+            yield from self._iter_building_cache(columns)
+        else:
+            yield from (self._select(chunk, columns) for chunk in self._iter_source())
+
+    def build_cache(self):
+        """Parse the source once so later passes read the columnar cache."""
+        if not self.cache_dir:
+            return False
+        for _ in self.iter_chunks():
+            pass
+        return self._load_manifest() is not None
+
+    def _select(self, chunk, columns):
+        if columns is None:
+            return chunk
+        length = len(next(iter(chunk.values()))) if chunk else 0
+        selected = {}
+        for name in columns:
+            if name in chunk:
+                selected[name] = chunk[name]
+            elif self.format == 'jsonl':
+                selected[name] = np.full(length, np.nan)
+            else:
+                raise DatasetError(f"Unknown column: {name}")
+        return selected
+
+    # Columnar cache
+
+    def _load_manifest(self):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, MANIFEST_NAME)) as fh:
+                manifest = json.load(fh)
+            source_stat = os.stat(self.data.file.path)
+        except (OSError, ValueError):
+            return None
+        if (manifest.get('version') != CACHE_VERSION
+                or manifest.get('source_size') != source_stat.st_size
+                or manifest.get('source_mtime_ns') != source_stat.st_mtime_ns):
+            return None
+        return manifest
+
+    def _iter_cached(self, manifest, columns):
+        rows = manifest['rows']
+        known = set(manifest['columns']) | set(manifest['empty_columns'])
+        wanted = list(columns) if columns is not None else list(manifest['columns'])
+        unknown = [name for name in wanted if name not in known]
+        if unknown and self.format != 'jsonl':
+            raise DatasetError(f"Unknown columns: {unknown}")
+        if rows == 0:
+            return
+        arrays = {}
+        for name in wanted:
+            if name in manifest['columns']:
+                path = os.path.join(self.cache_dir, manifest['columns'][name])
+                arrays[name] = np.memmap(path, dtype=CACHE_DTYPE, mode='r', shape=(rows,))
+        for start in range(0, rows, self.chunk_rows):
+            stop = min(start + self.chunk_rows, rows)
+            yield {
+                name: arrays[name][start:stop] if name in arrays else np.full(stop - start, np.nan)
+                for name in wanted
+            }
+
+    def _iter_building_cache(self, columns):
+        writer = _CacheWriter(self.cache_dir, os.stat(self.data.file.path))
+        try:
+            for chunk in self._iter_source():
+                writer.append(chunk)
+                yield self._select(chunk, columns)
+        except BaseException:
+            # Includes GeneratorExit when a caller stops early: the cache
+            # would be incomplete, so drop it.
+            writer.discard()
+            raise
+        writer.commit()
+
+    # Source parsing
+
+    @contextmanager
+    def _open_lines(self):
+        """Yield an iterator of decoded text lines, memory-mapping local files."""
+        try:
+            path = self.data.file.path
+        except NotImplementedError:
+            path = None
+        if path and os.path.getsize(path) > 0:
+            with open(path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                yield (line.decode('utf-8', errors='replace') for line in iter(mm.readline, b''))
+        else:
+            with self.data.file.storage.open(self.data.file.name, 'rb') as raw:
+                yield codecs.getreader('utf-8')(raw, errors='replace')
+
+    def _iter_source(self):
+        """Parse the original file into chunks containing every column."""
+        if self.format == 'parquet':
+            yield from self._iter_parquet()
+            return
+        with self._open_lines() as lines:
+            if self.format == 'jsonl':
+                yield from self._iter_jsonl(lines)
+            else:
+                yield from self._iter_delimited(lines, '\t' if self.format == 'tsv' else ',')
+
+    def _iter_delimited(self, lines, delimiter):
+        reader = csv.reader(lines, delimiter=delimiter)
+        header = next(reader, None) or []
+        rows = (row for row in reader if row)
+        while True:
+            block = list(itertools.islice(rows, self.chunk_rows))
+            if not block:
+                break
+            yield {
+                name: _to_float_array([row[i] if i < len(row) else '' for row in block])
+                for i, name in enumerate(header)
+            }
+
+    def _iter_jsonl(self, lines):
+        records = (json.loads(line) for line in lines if line.strip())
+        while True:
+            block = list(itertools.islice(records, self.chunk_rows))
+            if not block:
+                break
+            names = dict.fromkeys(key for record in block for key in record)
+            yield {
+                name: _to_float_array([record.get(name) for record in block])
+                for name in names
+            }
+
+    def _iter_parquet(self):
+        parquet_file = pq.ParquetFile(self.data.file.path)
+        for batch in parquet_file.iter_batches(batch_size=self.chunk_rows):
+            yield {
+                name: _to_float_array(batch.column(name).to_pylist())
+                for name in batch.schema.names
+            }
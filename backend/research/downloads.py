@@ -0,0 +1,146 @@
+"""
+Authenticated file delivery for research datasets.
+
+Files are streamed in fixed-size chunks with support for single-range
+``Range`` requests (so clients can resume or split downloads) and for
+``ETag``/``Last-Modified`` conditional requests. In production the actual
+byte transfer can be handed to the web server with ``X-Accel-Redirect``
+(nginx) or ``X-Sendfile`` (Apache/lighttpd) via
+``RESEARCH_DOWNLOAD_SENDFILE_BACKEND``.
+"""
+import json
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class DownloadRenderer(BaseRenderer):
+    """
+    Accept any media type for download actions; the file response is built
+    by hand, so only error payloads ever reach ``render``.
+    """
+    media_type = '*/*'
+    format = None
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode('utf-8')
+
+def get_etag(data, size):
+    if data.checksum:
+        return f'"{data.checksum}"'
+    return f'"{data.pk:x}-{size:x}-{int(data.updated_at.timestamp()):x}"'
+
+def parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range into an inclusive ``(start, end)`` pair.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range) and raises ValueError when it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        raise ValueError("Range not satisfiable")
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    # A date validator only matches the exact Last-Modified (RFC 9110 13.1.5).
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+def _stream_range(fh, start, length):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+def _sendfile_response(data, backend, filename):
+    response = HttpResponse()
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    if backend == 'nginx':
+        prefix = getattr(settings, 'RESEARCH_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + data.file.name
+    else:
+        response['X-Sendfile'] = data.file.path
+    # Let the web server fill in the body and content type.
+    del response['Content-Type']
+    return response
+
+def serve_research_data(request, data):
+    """Build the download response for a ResearchData row."""
+    size = data.file.size
+    last_modified = data.updated_at.timestamp()
+    etag = get_etag(data, size)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        return not_modified
+
+    filename = os.path.basename(data.file.name)
+    backend = getattr(settings, 'RESEARCH_DOWNLOAD_SENDFILE_BACKEND', '')
+    if backend:
+        response = _sendfile_response(data, backend, filename)
+    else:
+        byte_range = None
+        if _if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE', ''), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        fh = data.file.storage.open(data.file.name, 'rb')
+        if byte_range is None:
+            response = FileResponse(fh, as_attachment=True, filename=filename)
+            response.block_size = STREAM_CHUNK_SIZE
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(_stream_range(fh, start, length), status=206)
+            response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Disposition'] = content_disposition_header(True, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,282 @@
+"""
+Metadata extraction for uploaded research datasets.
+
+After a file is uploaded it is streamed once, row by row, to compute a
+summary (format, row count, schema, per-column null counts and min/max,
+and a small sample) that is stored under ``ResearchData.metadata['summary']``.
+Memory use is proportional to the number of columns, not the file size.
+
+CSV/TSV and JSON-lines files are parsed with the standard library. Parquet
+files are summarised from their footer statistics when ``pyarrow`` is
+installed; otherwise they are marked as skipped.
+"""
+import codecs
+import csv
+import json
+import logging
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ResearchData
+
+try:
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+# Thread pool for ingesting uploads in the background
+ingest_pool = ThreadPoolExecutor(max_workers=2)
+
+SAMPLE_ROWS = 5
+NULL_VALUES = {'', 'na', 'n/a', 'nan', 'null', 'none'}
+MAX_STRING_STAT_LENGTH = 100
+
+FORMAT_BY_EXTENSION = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.tab': 'tsv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.json': 'jsonl',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+}
+
+# Wider types win when a column mixes value types.
+TYPE_ORDER = ['boolean', 'integer', 'float', 'string']
+
+def detect_format(filename):
+    return FORMAT_BY_EXTENSION.get(os.path.splitext(filename)[1].lower())
+
+class ColumnStats:
+    """Running statistics for a single column."""
+    __slots__ = ('name', 'type', 'count', 'null_count', 'num_min', 'num_max', 'str_min', 'str_max')
+
+    def __init__(self, name):
+        self.name = name
+        self.type = None
+        self.count = 0
+        self.null_count = 0
+        self.num_min = self.num_max = None
+        self.str_min = self.str_max = None
+
+    def add(self, value, value_type, text):
+        """Record one non-null value already parsed to ``value_type``."""
+        self.count += 1
+        if self.type is None or TYPE_ORDER.index(value_type) > TYPE_ORDER.index(self.type):
+            self.type = value_type
+        if value_type in ('integer', 'float'):
+            if self.num_min is None or value < self.num_min:
+                self.num_min = value
+            if self.num_max is None or value > self.num_max:
+                self.num_max = value
+        text = text[:MAX_STRING_STAT_LENGTH]
+        if self.str_min is None or text < self.str_min:
+            self.str_min = text
+        if self.str_max is None or text > self.str_max:
+            self.str_max = text
+
+    def as_dict(self, row_count):
+        # Columns missing from some JSON-lines records count those rows as null.
+        null_count = self.null_count + (row_count - self.count - self.null_count)
+        if self.type in ('integer', 'float'):
+            minimum, maximum = self.num_min, self.num_max
+        elif self.type == 'boolean':
+            minimum = maximum = None
+        else:
+            minimum, maximum = self.str_min, self.str_max
+        return {
+            'name': self.name,
+            'type': self.type or 'null',
+            'null_count': null_count,
+            'min': minimum,
+            'max': maximum,
+        }
+
+def _parse_text(text):
+    """Infer the type of a delimited-text cell."""
+    lowered = text.strip().lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true', 'boolean'
+    try:
+        return int(text), 'integer'
+    except ValueError:
+        pass
+    try:
+        value = float(text)
+        if value == value and value not in (float('inf'), float('-inf')):
+            return value, 'float'
+    except ValueError:
+        pass
+    return text, 'string'
+
+def _classify_json(value):
+    if isinstance(value, bool):
+        return value, 'boolean', str(value).lower()
+    if isinstance(value, int):
+        return value, 'integer', str(value)
+    if isinstance(value, float):
+        return value, 'float', repr(value)
+    if isinstance(value, str):
+        return value, 'string', value
+    return value, 'string', json.dumps(value, sort_keys=True)
+
+def summarize_delimited(fh, delimiter=','):
+    """Summarise a CSV/TSV text stream whose first row is the header."""
+    reader = csv.reader(fh, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return {'rows': 0, 'columns': [], 'sample': []}
+    columns = [ColumnStats(name) for name in header]
+    sample = []
+    rows = 0
+    for row in reader:
+        if not row:
+            continue
+        rows += 1
+        if len(sample) < SAMPLE_ROWS:
+            sample.append(dict(zip(header, row)))
+        for column, text in zip(columns, row):
+            if text.strip().lower() in NULL_VALUES:
+                column.null_count += 1
+                continue
+            value, value_type = _parse_text(text)
+            column.add(value, value_type, text)
+    return {
+        'rows': rows,
+        'columns': [column.as_dict(rows) for column in columns],
+        'sample': sample,
+    }
+
+def summarize_jsonl(fh):
+    """Summarise a JSON-lines text stream of objects."""
+    columns = {}
+    sample = []
+    rows = 0
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("JSON-lines records must be objects")
+        rows += 1
+        if len(sample) < SAMPLE_ROWS:
+            sample.append(record)
+        for name, raw in record.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = ColumnStats(name)
+            if raw is None:
+                column.null_count += 1
+                continue
+            value, value_type, text = _classify_json(raw)
+            column.add(value, value_type, text)
+    return {
+        'rows': rows,
+        'columns': [column.as_dict(rows) for column in columns.values()],
+        'sample': sample,
+    }
+
+def _json_safe(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')[:MAX_STRING_STAT_LENGTH]
+    return str(value)
+
+def summarize_parquet(path):
+    """Summarise a Parquet file from its footer and first record batch."""
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    columns = []
+    for index, field in enumerate(schema):
+        null_count = 0
+        minimum = maximum = None
+        for group in range(metadata.num_row_groups):
+            stats = metadata.row_group(group).column(index).statistics
+            if stats is None:
+                continue
+            if stats.has_null_count:
+                null_count += stats.null_count
+            if stats.has_min_max:
+                if minimum is None or stats.min < minimum:
+                    minimum = stats.min
+                if maximum is None or stats.max > maximum:
+                    maximum = stats.max
+        columns.append({
+            'name': field.name,
+            'type': str(field.type),
+            'null_count': null_count,
+            'min': _json_safe(minimum),
+            'max': _json_safe(maximum),
+        })
+    sample = []
+    for batch in parquet_file.iter_batches(batch_size=SAMPLE_ROWS):
+        sample = [{key: _json_safe(value) for key, value in row.items()} for row in batch.to_pylist()]
+        break
+    return {'rows': metadata.num_rows, 'columns': columns, 'sample': sample}
+
+def extract_summary(data):
+    """Compute the summary dict for a ResearchData file."""
+    file_format = detect_format(data.file.name)
+    summary = {'format': file_format, 'size': data.file.size}
+    if file_format is None:
+        summary['status'] = 'unsupported'
+        return summary
+    if file_format == 'parquet':
+        if not HAS_PYARROW:
+            summary['status'] = 'skipped'
+            summary['error'] = 'pyarrow is not installed'
+            return summary
+        summary.update(summarize_parquet(data.file.path))
+    else:
+        with data.file.storage.open(data.file.name, 'rb') as raw:
+            text = codecs.getreader('utf-8')(raw, errors='replace')
+            if file_format == 'jsonl':
+                summary.update(summarize_jsonl(text))
+            else:
+                summary.update(summarize_delimited(text, delimiter='\t' if file_format == 'tsv' else ','))
+    summary['status'] = 'completed'
+    return summary
+
+def ingest_research_data(data_id):
+    """Extract and store the summary for one ResearchData row."""
+    data = ResearchData.objects.get(pk=data_id)
+    try:
+        summary = extract_summary(data)
+    except Exception as e:
+        logger.error(f"Error extracting metadata for research data {data_id}: {e}")
+        summary = {'format': detect_format(data.file.name), 'status': 'failed', 'error': str(e)}
+    summary['extracted_at'] = timezone.now().isoformat()
+
+    # Merge into the latest metadata so hand-edited keys are kept.
+    with transaction.atomic():
+        data = ResearchData.objects.select_for_update().get(pk=data_id)
+        data.metadata = {**data.metadata, 'summary': summary}
+        ResearchData.objects.filter(pk=data_id).update(metadata=data.metadata)
+    logger.info(f"Ingested research data {data_id}: {summary.get('status')}")
+    return summary
+
+def schedule_ingest(data):
+    """Run ingestion in the background once the current transaction commits."""
+    if not getattr(settings, 'RESEARCH_INGEST_ON_UPLOAD', True):
+        return
+
+    def run_background_task():
+        try:
+            ingest_research_data(data.pk)
+        except Exception as e:
+            logger.error(f"Error in ingest background task: {e}")
+            logger.error(traceback.format_exc())
+
+    transaction.on_commit(lambda: ingest_pool.submit(run_background_task))
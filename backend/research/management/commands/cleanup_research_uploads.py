@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from research.uploads import expire_uploads
+
+class Command(BaseCommand):
+    help = 'Abort idle chunked upload sessions and remove leftover staging directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=None,
+            help='Seconds a session may go without a new part (default: RESEARCH_UPLOAD_EXPIRY)',
+        )
+
+    def handle(self, *args, **options):
+        expired, removed = expire_uploads(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Aborted {expired} idle uploads and removed {removed} leftover staging directories'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from research.models import ResearchData
+from research.ingest import ingest_research_data
+
+class Command(BaseCommand):
+    help = 'Extract row counts, schema and column statistics into ResearchData.metadata'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'ids',
+            nargs='*',
+            type=int,
+            help='IDs of the research data to ingest (default: all without a summary)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-ingest every dataset, including ones that already have a summary',
+        )
+
+    def handle(self, *args, **options):
+        queryset = ResearchData.objects.exclude(file='').order_by('pk')
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+        elif not options['all']:
+            queryset = queryset.exclude(metadata__has_key='summary')
+
+        ingested = 0
+        for data_id in queryset.values_list('pk', flat=True).iterator():
+            summary = ingest_research_data(data_id)
+            ingested += 1
+            self.stdout.write(f"Research data #{data_id}: {summary.get('status')} ({summary.get('rows', '-')} rows)")
+
+        self.stdout.write(self.style.SUCCESS(f'Ingested {ingested} datasets'))
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from research.analysis import claim_analysis, requeue_stale_analyses, run_analysis
+from research.models import AIAnalysis
+
+class Command(BaseCommand):
+    help = 'Process pending AI analyses; several workers can run side by side'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when no pending analyses are left instead of polling',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=0,
+            help='Exit after processing this many analyses (0 means no limit)',
+        )
+        parser.add_argument(
+            '--requeue-stale',
+            type=int,
+            default=0,
+            metavar='MINUTES',
+            help='On start, put analyses stuck in processing for this long back to pending',
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_stale']:
+            cutoff = timezone.now() - timedelta(minutes=options['requeue_stale'])
+            requeued = AIAnalysis.objects.filter(status='processing', started_at__lt=cutoff).update(status='pending')
+            self.stdout.write(f'Requeued {requeued} stale analyses')
+
+        processed = 0
+        while not options['max_jobs'] or processed < options['max_jobs']:
+            close_old_connections()
+            analysis = claim_analysis()
+            if analysis is None:
+                # Idle: pick up analyses whose worker died (RESEARCH_ANALYSIS_STALE_AFTER).
+                if requeue_stale_analyses():
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            run_analysis(analysis)
+            processed += 1
+            style = self.style.SUCCESS if analysis.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(
+                f'Analysis #{analysis.pk} ({analysis.analysis_type}): {analysis.status} in {analysis.duration_ms} ms'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} analyses'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0002_researchupload_researchdata_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysis',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='duration_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Execution time of the last run', null=True),
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
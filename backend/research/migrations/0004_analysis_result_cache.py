@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-19 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0003_aianalysis_timing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysis',
+            name='cache_hit',
+            field=models.BooleanField(default=False, help_text='Results were reused rather than computed'),
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='result_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of data checksum, version, analysis type and parameters', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='AnalysisResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('analysis_type', models.CharField(max_length=100)),
+                ('results', models.JSONField(default=dict)),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_results', to='research.researchdata')),
+            ],
+            options={
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-19 13:35
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Comment = apps.get_model('research', 'Comment')
+    parents = dict(Comment.objects.values_list('pk', 'parent_id'))
+    paths = {}
+
+    def path_for(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            prefix = path_for(parent_id) if parent_id else ''
+            paths[pk] = f"{prefix}{pk:010d}/"
+        return paths[pk]
+
+    for pk in parents:
+        path_for(pk)
+    Comment.objects.bulk_update(
+        [Comment(pk=pk, path=path) for pk, path in paths.items()], ['path'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0004_analysis_result_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text="Materialized path of ancestor ids, ending with this comment's id", max_length=255),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
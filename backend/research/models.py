@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Max
+from django.db.models.functions import Concat, Length, Substr
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 import uuid
@@ -16,6 +18,29 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name()}'s Profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_changed_fields(self):
+        """Names of fields edited in memory since the profile was loaded."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and getattr(self, field.attname) != loaded[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
 class ResearchProject(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -62,6 +87,7 @@ class ResearchData(models.Model):
     file = models.FileField(upload_to='research_data/%Y/%m/%d/')
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='uploaded_data')
     version = models.CharField(max_length=50, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the stored file")
     metadata = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -73,6 +99,48 @@ class ResearchData(models.Model):
     def __str__(self):
         return f"{self.title} - {self.project.title}"
 
+class ResearchUpload(models.Model):
+    """
+    A chunked upload session that becomes a ResearchData row once all parts
+    have arrived. Parts live on disk in a staging directory until completion.
+    """
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(ResearchProject, on_delete=models.CASCADE, related_name='uploads')
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='research_uploads')
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    data_type = models.CharField(max_length=20, choices=ResearchData.DATA_TYPE_CHOICES)
+    version = models.CharField(max_length=50, blank=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64, blank=True, help_text="Expected SHA-256 of the assembled file")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    data = models.OneToOneField(ResearchData, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload of {self.filename} ({self.status})"
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def expected_part_size(self, part_number):
+        if part_number < self.part_count:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.part_count - 1)
+
 class AIAnalysis(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -91,6 +159,12 @@ class AIAnalysis(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_message = models.TextField(blank=True)
     requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='requested_analyses')
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Execution time of the last run")
+    result_key = models.CharField(max_length=64, blank=True, db_index=True,
+                                  help_text="Hash of data checksum, version, analysis type and parameters")
+    cache_hit = models.BooleanField(default=False, help_text="Results were reused rather than computed")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -101,11 +175,40 @@ class AIAnalysis(models.Model):
     def __str__(self):
         return f"{self.title} - {self.project.title}"
 
+class AnalysisResult(models.Model):
+    """
+    Cached results of an analysis, shared by every AIAnalysis with the same
+    ``key``. Entries are evicted least-recently-used first once their total
+    size exceeds ``RESEARCH_ANALYSIS_RESULT_CACHE_MAX_BYTES``.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    data = models.ForeignKey(ResearchData, on_delete=models.CASCADE, related_name='cached_results')
+    analysis_type = models.CharField(max_length=100)
+    results = models.JSONField(default=dict)
+    size_bytes = models.PositiveIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+    def __str__(self):
+        return f"{self.analysis_type} result for data #{self.data_id}"
+
 class Comment(models.Model):
+    # Width of each zero-padded id in ``path``; sorting by path gives depth-first thread order.
+    PATH_STEP = 10
+    PATH_MAX_LENGTH = 255
+    # Deepest nesting whose path still fits in ``path`` (a top-level comment is depth 1).
+    MAX_DEPTH = PATH_MAX_LENGTH // (PATH_STEP + 1)
+
     project = models.ForeignKey(ResearchProject, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='research_comments')
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, db_index=True, editable=False,
+                            help_text="Materialized path of ancestor ids, ending with this comment's id")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -113,4 +216,30 @@ class Comment(models.Model):
         ordering = ['created_at']
 
     def __str__(self):
-        return f"Comment by {self.author.username} on {self.project.title}" 
\ No newline at end of file
+        return f"Comment by {self.author.username} on {self.project.title}"
+
+    @property
+    def depth(self):
+        return len(self.path) // (self.PATH_STEP + 1)
+
+    def subtree_depth(self):
+        """Levels in this comment's subtree, counting the comment itself."""
+        longest = Comment.objects.filter(path__startswith=self.path).aggregate(longest=Max(Length('path')))['longest']
+        return (longest or len(self.path)) // (self.PATH_STEP + 1) - self.depth + 1
+
+    def build_path(self):
+        prefix = self.parent.path if self.parent_id else ''
+        return f"{prefix}{self.pk:0{self.PATH_STEP}d}/"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        path = self.build_path()
+        if path == self.path:
+            return
+        old_path, self.path = self.path, path
+        Comment.objects.filter(pk=self.pk).update(path=path)
+        if old_path:
+            # Re-parented: move the whole subtree under the new path.
+            Comment.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(models.Value(path), Substr('path', len(old_path) + 1))
+            )
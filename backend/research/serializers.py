@@ -1,6 +1,19 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import UserProfile, ResearchProject, ResearchData, AIAnalysis, Comment
+from .models import UserProfile, ResearchProject, ResearchData, ResearchUpload, AIAnalysis, Comment
+from .uploads import get_chunk_size, received_parts
+
+class DynamicFieldsMixin:
+    """
+    Accept an optional ``fields`` kwarg and drop every field not listed in it,
+    so list endpoints can be trimmed with ``?fields=id,title``.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,7 +21,13 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
         read_only_fields = ['username', 'email']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+        read_only_fields = fields
+
+class UserProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
@@ -17,7 +36,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
                  'website', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-class ResearchProjectSerializer(serializers.ModelSerializer):
+class ResearchProjectSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     collaborators = UserSerializer(many=True, read_only=True)
     
@@ -31,41 +50,125 @@ class ResearchProjectSerializer(serializers.ModelSerializer):
         validated_data['owner'] = self.context['request'].user
         return super().create(validated_data)
 
-class ResearchDataSerializer(serializers.ModelSerializer):
+class ResearchDataSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     uploaded_by = UserSerializer(read_only=True)
     
     class Meta:
         model = ResearchData
         fields = ['id', 'project', 'title', 'description', 'data_type', 'file', 
-                 'uploaded_by', 'version', 'metadata', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+                 'uploaded_by', 'version', 'checksum', 'metadata', 'created_at', 'updated_at']
+        read_only_fields = ['checksum', 'created_at', 'updated_at']
     
     def create(self, validated_data):
         validated_data['uploaded_by'] = self.context['request'].user
         return super().create(validated_data)
 
-class AIAnalysisSerializer(serializers.ModelSerializer):
+class ResearchUploadSerializer(serializers.ModelSerializer):
+    """Chunked upload session; ``received_parts`` lets clients resume."""
+    chunk_size = serializers.IntegerField(required=False, min_value=1024 * 1024)
+    part_count = serializers.IntegerField(read_only=True)
+    received_parts = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ResearchUpload
+        fields = ['id', 'project', 'title', 'description', 'data_type', 'version',
+                 'filename', 'total_size', 'chunk_size', 'checksum', 'status',
+                 'part_count', 'received_parts', 'data', 'created_at', 'updated_at']
+        read_only_fields = ['status', 'data', 'created_at', 'updated_at']
+
+    def validate_filename(self, value):
+        filename = value.replace('\\', '/').rsplit('/', 1)[-1]
+        if not filename:
+            raise serializers.ValidationError("filename must name a file")
+        return filename
+
+    def validate_total_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError("total_size must not be negative")
+        return value
+
+    def validate_checksum(self, value):
+        return value.lower()
+
+    def get_received_parts(self, obj):
+        return received_parts(obj)
+
+    def create(self, validated_data):
+        validated_data['uploaded_by'] = self.context['request'].user
+        validated_data.setdefault('chunk_size', get_chunk_size())
+        return super().create(validated_data)
+
+class AIAnalysisSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     requested_by = UserSerializer(read_only=True)
     
     class Meta:
         model = AIAnalysis
         fields = ['id', 'project', 'data', 'title', 'description', 'analysis_type', 
                  'parameters', 'results', 'status', 'error_message', 'requested_by', 
-                 'created_at', 'updated_at']
-        read_only_fields = ['results', 'status', 'error_message', 'created_at', 'updated_at']
+                 'started_at', 'completed_at', 'duration_ms', 'cache_hit', 'created_at', 'updated_at']
+        read_only_fields = ['results', 'status', 'error_message', 'started_at', 'completed_at',
+                           'duration_ms', 'cache_hit', 'created_at', 'updated_at']
     
     def create(self, validated_data):
         validated_data['requested_by'] = self.context['request'].user
         return super().create(validated_data)
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     
     class Meta:
         model = Comment
         fields = ['id', 'project', 'author', 'content', 'parent', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
+
+    def validate(self, attrs):
+        parent = attrs.get('parent', getattr(self.instance, 'parent', None))
+        project = attrs.get('project', getattr(self.instance, 'project', None))
+        if parent is not None:
+            if parent.project_id != project.pk:
+                raise serializers.ValidationError({'parent': 'Reply must belong to the same project'})
+            if self.instance is not None and parent.path.startswith(self.instance.path):
+                raise serializers.ValidationError({'parent': 'A comment cannot reply to itself or its replies'})
+            levels = self.instance.subtree_depth() if self.instance is not None else 1
+            if parent.depth + levels > Comment.MAX_DEPTH:
+                raise serializers.ValidationError(
+                    {'parent': f'Replies can be nested at most {Comment.MAX_DEPTH} levels deep'}
+                )
+        return attrs
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
-        return super().create(validated_data) 
\ No newline at end of file
+        return super().create(validated_data)
+
+class ResearchProjectSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Lightweight project rows for dashboard tables (``?view=summary``)."""
+    owner = UserSummarySerializer(read_only=True)
+    collaborators = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    data_sets_count = serializers.IntegerField(read_only=True)
+    ai_analyses_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ResearchProject
+        fields = ['id', 'title', 'slug', 'description', 'owner', 'collaborators', 'status',
+                 'is_public', 'data_sets_count', 'ai_analyses_count', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class ResearchDataSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Lightweight dataset rows for dashboard tables (``?view=summary``)."""
+    uploaded_by = UserSummarySerializer(read_only=True)
+
+    class Meta:
+        model = ResearchData
+        fields = ['id', 'project', 'title', 'data_type', 'uploaded_by', 'version',
+                 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class AIAnalysisSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Lightweight analysis rows for dashboard tables (``?view=summary``)."""
+    requested_by = UserSummarySerializer(read_only=True)
+
+    class Meta:
+        model = AIAnalysis
+        fields = ['id', 'project', 'data', 'title', 'analysis_type', 'status',
+                 'requested_by', 'duration_ms', 'created_at', 'updated_at']
+        read_only_fields = fields
@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, ResearchData
+from .datasets import clear_columnar_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,12 +18,26 @@ def create_user_profile(sender, instance, created, **kwargs):
             logger.error(f"Error creating research profile for user {instance.username}: {str(e)}")
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Ensure UserProfile is saved when User is saved."""
-    try:
-        if not hasattr(instance, 'research_profile'):
-            UserProfile.objects.create(user=instance)
-            logger.info(f"Created missing research profile for user: {instance.username}")
-        instance.research_profile.save()
-    except Exception as e:
-        logger.error(f"Error saving research profile for user {instance.username}: {str(e)}") 
\ No newline at end of file
+def save_user_profile(sender, instance, created, **kwargs):
+    """
+    Persist profile edits made through ``user.research_profile`` when the
+    user is saved. Profiles that were never loaded or are unchanged are left
+    alone, so routine saves such as the ``last_login`` update cost nothing.
+    """
+    if created or not User.research_profile.related.is_cached(instance):
+        return
+    profile = User.research_profile.related.get_cached_value(instance)
+    if profile is None:
+        return
+    changed = profile.get_changed_fields()
+    if changed is None or changed:
+        try:
+            profile.save(update_fields=changed or None)
+        except Exception as e:
+            logger.error(f"Error saving research profile for user {instance.username}: {str(e)}")
+
+@receiver(post_delete, sender=ResearchData)
+def delete_columnar_cache(sender, instance, **kwargs):
+    """Remove the analysis cache stored next to a deleted dataset's file."""
+    if instance.file:
+        clear_columnar_cache(instance)
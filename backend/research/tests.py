@@ -0,0 +1,709 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from unittest import mock
+
+import numpy as np
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+
+from .models import UserProfile, ResearchProject, ResearchData, ResearchUpload, AIAnalysis, AnalysisResult, Comment
+from .views import IsOwnerOrCollaborator
+from .ingest import ingest_research_data, summarize_delimited, summarize_jsonl
+from . import analysis as analysis_module
+from .analysis import (
+    claim_analysis, compute_result_key, process_analysis, run_analysis, schedule_analysis, submit_analysis,
+    evict_cached_results,
+)
+from .datasets import Dataset, get_cache_dir
+from .uploads import get_upload_dir, received_parts, write_part
+
+class UserProfileSignalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='member', password='testpassword')
+
+    def _profile_queries(self, queries):
+        return [q['sql'] for q in queries.captured_queries if 'research_userprofile' in q['sql']]
+
+    def test_profile_created_once_with_user(self):
+        self.assertEqual(UserProfile.objects.filter(user=self.user).count(), 1)
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username='member', password='testpassword'))
+            response = APIClient().post('/api/auth-token/', {'username': 'member', 'password': 'testpassword'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._profile_queries(queries), [])
+
+    def test_profile_edits_saved_with_user(self):
+        user = User.objects.select_related('research_profile').get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertEqual(self._profile_queries(queries), [])
+
+        user.research_profile.institution = 'Kavosh'
+        user.save()
+        self.assertEqual(UserProfile.objects.get(user=self.user).institution, 'Kavosh')
+
+class IsOwnerOrCollaboratorTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.collaborator = User.objects.create_user(username='collaborator', password='testpassword')
+        self.stranger = User.objects.create_user(username='stranger', password='testpassword')
+
+        self.project = ResearchProject.objects.create(
+            title='Private Project',
+            description='Not public',
+            owner=self.owner,
+        )
+        self.project.collaborators.add(self.collaborator)
+
+        self.data = ResearchData.objects.create(
+            project=self.project,
+            title='Dataset',
+            description='Test dataset',
+            data_type='raw',
+            file='research_data/test.csv',
+            uploaded_by=self.owner,
+        )
+        self.comments = [
+            Comment.objects.create(project=self.project, author=self.owner, content=f'Comment {i}')
+            for i in range(3)
+        ]
+        self.factory = APIRequestFactory()
+        self.permission = IsOwnerOrCollaborator()
+
+    def _request(self, user, method='get'):
+        request = Request(getattr(self.factory, method)('/api/research/'))
+        request.user = user
+        return request
+
+    def test_collaborator_can_access_project_objects(self):
+        request = self._request(self.collaborator, method='patch')
+        self.assertTrue(self.permission.has_object_permission(request, None, self.data))
+
+    def test_stranger_is_denied(self):
+        request = self._request(self.stranger)
+        self.assertFalse(self.permission.has_object_permission(request, None, self.data))
+
+    def test_membership_is_cached_per_request(self):
+        request = self._request(self.collaborator)
+        with self.assertNumQueries(1):
+            for obj in [self.data] + self.comments:
+                self.assertTrue(self.permission.has_object_permission(request, None, obj))
+
+class ResearchProjectListQueryTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+
+    def _create_projects(self, count):
+        for i in range(count):
+            project = ResearchProject.objects.create(
+                title=f'Project {ResearchProject.objects.count()}',
+                description='Test project',
+                owner=self.owner,
+            )
+            project.collaborators.add(
+                User.objects.create_user(username=f'collaborator-{project.pk}', password='testpassword')
+            )
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_list_query_count_does_not_grow_with_projects(self):
+        for url in ['/api/research/projects/', '/api/research/projects/?view=summary']:
+            self._create_projects(2)
+            small, _ = self._count_queries(url)
+            self._create_projects(6)
+            large, _ = self._count_queries(url)
+            self.assertEqual(small, large, url)
+
+    def test_summary_view_returns_compact_rows(self):
+        self._create_projects(1)
+        _, response = self._count_queries('/api/research/projects/?view=summary')
+        row = response.data['results'][0]
+        self.assertEqual(row['owner'], {'id': self.owner.pk, 'username': 'owner'})
+        self.assertEqual(row['data_sets_count'], 0)
+        self.assertEqual(len(row['collaborators']), 1)
+
+    def test_fields_parameter_trims_payload(self):
+        self._create_projects(1)
+        _, response = self._count_queries('/api/research/projects/?fields=id,title')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+
+class ResearchUploadTests(TestCase):
+    chunk_size = 1024 * 1024
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.temp_dir, 'media'),
+            RESEARCH_UPLOAD_TEMP_DIR=os.path.join(self.temp_dir, 'uploads'),
+        )
+        self.settings_override.enable()
+
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.project = ResearchProject.objects.create(title='Uploads', description='Test', owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+        self.payload = os.urandom(self.chunk_size * 2 + 1234)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _start(self, **overrides):
+        data = {
+            'project': self.project.pk,
+            'title': 'Big dataset',
+            'description': 'Chunked upload',
+            'data_type': 'raw',
+            'filename': 'measurements.csv',
+            'total_size': len(self.payload),
+            'chunk_size': self.chunk_size,
+            'checksum': hashlib.sha256(self.payload).hexdigest(),
+        }
+        data.update(overrides)
+        response = self.client.post('/api/research/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def _put_part(self, upload_id, part_number, **headers):
+        start = (part_number - 1) * self.chunk_size
+        return self.client.put(
+            f'/api/research/uploads/{upload_id}/parts/{part_number}/',
+            data=self.payload[start:start + self.chunk_size],
+            content_type='application/octet-stream',
+            **headers,
+        )
+
+    def test_resumable_upload_assembles_research_data(self):
+        upload = self._start()
+        self.assertEqual(upload['part_count'], 3)
+
+        self.assertEqual(self._put_part(upload['id'], 3).status_code, 200)
+        self.assertEqual(self._put_part(upload['id'], 1).status_code, 200)
+
+        # A reconnecting client sees which parts already arrived.
+        status = self.client.get(f"/api/research/uploads/{upload['id']}/").data
+        self.assertEqual(sorted(status['received_parts']), [1, 3])
+
+        self.assertEqual(self._put_part(upload['id'], 2).status_code, 200)
+        response = self.client.post(f"/api/research/uploads/{upload['id']}/complete/")
+        self.assertEqual(response.status_code, 201, response.data)
+
+        data = ResearchData.objects.get(pk=response.data['id'])
+        self.assertTrue(data.file.name.startswith('research_data/'))
+        self.assertEqual(data.checksum, hashlib.sha256(self.payload).hexdigest())
+        with data.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.payload)
+        self.assertEqual(ResearchUpload.objects.get(pk=upload['id']).status, 'completed')
+
+    def test_part_checksum_mismatch_is_rejected(self):
+        upload = self._start()
+        response = self._put_part(upload['id'], 1, HTTP_X_PART_CHECKSUM='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        status = self.client.get(f"/api/research/uploads/{upload['id']}/").data
+        self.assertEqual(status['received_parts'], {})
+
+    def test_complete_requires_all_parts(self):
+        upload = self._start()
+        self._put_part(upload['id'], 1)
+        response = self.client.post(f"/api/research/uploads/{upload['id']}/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ResearchData.objects.exists())
+
+    def test_concurrent_writes_of_a_part_use_separate_temp_files(self):
+        upload = ResearchUpload.objects.get(pk=self._start()['id'])
+        part = self.payload[:self.chunk_size]
+        upload_dir = get_upload_dir(upload)
+        halfway = self.chunk_size // 2
+
+        class InterruptedStream(io.BytesIO):
+            # A second write of the same part runs while this one is halfway.
+            def read(self, size=-1):
+                chunk = super().read(size)
+                if self.tell() == halfway:
+                    write_part(upload, 1, io.BytesIO(part))
+                return chunk
+
+        write_part(upload, 1, InterruptedStream(part))
+        self.assertEqual(sorted(os.listdir(upload_dir)), ['000001.part'])
+        with open(os.path.join(upload_dir, '000001.part'), 'rb') as fh:
+            self.assertEqual(fh.read(), part)
+
+    def test_abort_discards_parts(self):
+        upload = self._start()
+        self._put_part(upload['id'], 1)
+        response = self.client.post(f"/api/research/uploads/{upload['id']}/abort/")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['status'], 'aborted')
+        self.assertFalse(os.path.exists(get_upload_dir(ResearchUpload.objects.get(pk=upload['id']))))
+
+        self.assertEqual(self._put_part(upload['id'], 2).status_code, 409)
+        self.assertEqual(self.client.post(f"/api/research/uploads/{upload['id']}/complete/").status_code, 409)
+        self.assertEqual(self.client.post(f"/api/research/uploads/{upload['id']}/abort/").status_code, 409)
+
+    def test_cleanup_expires_idle_uploads(self):
+        idle = self._start()
+        active = self._start()
+        self._put_part(idle['id'], 1)
+        self._put_part(active['id'], 1)
+        long_ago = timezone.now() - timedelta(days=2)
+        ResearchUpload.objects.filter(pk=idle['id']).update(updated_at=long_ago)
+        # A directory whose session is gone.
+        orphan = os.path.join(settings.RESEARCH_UPLOAD_TEMP_DIR, 'orphan')
+        os.makedirs(orphan)
+        os.utime(orphan, (long_ago.timestamp(), long_ago.timestamp()))
+
+        out = io.StringIO()
+        call_command('cleanup_research_uploads', max_age=24 * 60 * 60, stdout=out)
+        self.assertIn('Aborted 1 idle uploads', out.getvalue())
+
+        idle = ResearchUpload.objects.get(pk=idle['id'])
+        active = ResearchUpload.objects.get(pk=active['id'])
+        self.assertEqual(idle.status, 'aborted')
+        self.assertFalse(os.path.exists(get_upload_dir(idle)))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(active.status, 'uploading')
+        self.assertEqual(list(received_parts(active)), [1])
+
+    def test_non_member_cannot_start_upload(self):
+        stranger = User.objects.create_user(username='stranger', password='testpassword')
+        self.client.force_authenticate(user=stranger)
+        response = self.client.post('/api/research/uploads/', {
+            'project': self.project.pk, 'title': 'x', 'description': 'x', 'data_type': 'raw',
+            'filename': 'x.csv', 'total_size': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+class ResearchDataDownloadTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.temp_dir)
+        self.settings_override.enable()
+
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.project = ResearchProject.objects.create(title='Downloads', description='Test', owner=self.owner)
+        self.payload = bytes(range(256)) * 40
+        self.data = ResearchData(
+            project=self.project, title='Dataset', description='Test', data_type='raw',
+            uploaded_by=self.owner, checksum=hashlib.sha256(self.payload).hexdigest(),
+        )
+        self.data.file.save('dataset.bin', ContentFile(self.payload))
+        self.url = f'/api/research/data/{self.data.pk}/download/'
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_full_download(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/octet-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{self.data.checksum}"')
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.payload[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.payload)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.payload)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_stale_if_range_returns_full_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_range_date_must_match_exactly(self):
+        last_modified = int(self.data.updated_at.timestamp())
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(last_modified))
+        self.assertEqual(response.status_code, 206)
+        # A later date is not a match either; the client gets the whole file.
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(last_modified + 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.data.checksum}"')
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(RESEARCH_DOWNLOAD_SENDFILE_BACKEND='nginx')
+    def test_accel_redirect_handoff(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.data.file.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_stranger_cannot_download(self):
+        stranger = User.objects.create_user(username='stranger', password='testpassword')
+        self.client.force_authenticate(user=stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+class ResearchDataIngestTests(TestCase):
+    def test_csv_summary(self):
+        summary = summarize_delimited(io.StringIO(
+            'id,score,label\n'
+            '1,2.5,a\n'
+            '2,,b\n'
+            '3,-1,NA\n'
+        ))
+        self.assertEqual(summary['rows'], 3)
+        columns = {column['name']: column for column in summary['columns']}
+        self.assertEqual(columns['id'], {'name': 'id', 'type': 'integer', 'null_count': 0, 'min': 1, 'max': 3})
+        self.assertEqual(columns['score']['type'], 'float')
+        self.assertEqual((columns['score']['min'], columns['score']['max']), (-1, 2.5))
+        self.assertEqual(columns['score']['null_count'], 1)
+        self.assertEqual(columns['label']['null_count'], 1)
+        self.assertEqual(summary['sample'][0], {'id': '1', 'score': '2.5', 'label': 'a'})
+
+    def test_jsonl_summary_counts_missing_keys_as_null(self):
+        summary = summarize_jsonl(io.StringIO(
+            '{"a": 1, "b": "x"}\n'
+            '{"a": 3}\n'
+            '{"a": null, "b": "y"}\n'
+        ))
+        columns = {column['name']: column for column in summary['columns']}
+        self.assertEqual(summary['rows'], 3)
+        self.assertEqual(columns['a'], {'name': 'a', 'type': 'integer', 'null_count': 1, 'min': 1, 'max': 3})
+        self.assertEqual(columns['b']['null_count'], 1)
+        self.assertEqual((columns['b']['min'], columns['b']['max']), ('x', 'y'))
+
+    def test_ingest_keeps_existing_metadata(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=temp_dir):
+            owner = User.objects.create_user(username='owner', password='testpassword')
+            project = ResearchProject.objects.create(title='Ingest', description='Test', owner=owner)
+            data = ResearchData(
+                project=project, title='Dataset', description='Test', data_type='raw',
+                uploaded_by=owner, metadata={'source': 'lab'},
+            )
+            data.file.save('values.csv', ContentFile(b'x,y\n1,2\n3,4\n'))
+
+            ingest_research_data(data.pk)
+
+            data.refresh_from_db()
+            self.assertEqual(data.metadata['source'], 'lab')
+            self.assertEqual(data.metadata['summary']['status'], 'completed')
+            self.assertEqual(data.metadata['summary']['rows'], 2)
+            self.assertEqual(data.metadata['summary']['format'], 'csv')
+
+@override_settings(RESEARCH_ANALYSIS_CHUNK_ROWS=3)
+class AnalysisTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.temp_dir)
+        self.settings_override.enable()
+
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.project = ResearchProject.objects.create(title='Analysis', description='Test', owner=self.owner)
+        self.data = ResearchData(
+            project=self.project, title='Dataset', description='Test', data_type='raw', uploaded_by=self.owner,
+        )
+        rows = ['x,y,label'] + [f'{i},{2 * i + 1},row{i}' for i in range(10)] + [',5,missing']
+        self.data.file.save('values.csv', ContentFile('\n'.join(rows).encode()))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _run(self, analysis_type, **parameters):
+        analysis = AIAnalysis.objects.create(
+            project=self.project, data=self.data, title=analysis_type, description='Test',
+            analysis_type=analysis_type, parameters=parameters, requested_by=self.owner,
+        )
+        process_analysis(analysis.pk)
+        analysis.refresh_from_db()
+        return analysis
+
+class AIAnalysisEngineTests(AnalysisTestCase):
+    def test_descriptive_stats_across_chunks(self):
+        analysis = self._run('descriptive_stats', columns=['x', 'y'])
+        self.assertEqual(analysis.status, 'completed', analysis.error_message)
+        x = analysis.results['columns']['x']
+        self.assertEqual((x['count'], x['null_count']), (10, 1))
+        self.assertAlmostEqual(x['mean'], 4.5)
+        self.assertAlmostEqual(x['std'], 3.0276503540974917)
+        self.assertEqual((x['min'], x['max']), (0.0, 9.0))
+        self.assertIsNotNone(analysis.duration_ms)
+        self.assertIsNotNone(analysis.completed_at)
+
+    def test_correlation_and_histogram(self):
+        analysis = self._run('correlation', columns=['x', 'y'])
+        self.assertEqual(analysis.results['rows_used'], 10)
+        self.assertAlmostEqual(analysis.results['matrix'][0][1], 1.0)
+
+        analysis = self._run('histogram', columns=['x'], bins=3)
+        self.assertEqual(sum(analysis.results['columns']['x']['counts']), 10)
+
+    def test_unknown_type_fails_cleanly(self):
+        analysis = self._run('sentiment')
+        self.assertEqual(analysis.status, 'failed')
+        self.assertIn('Unknown analysis type', analysis.error_message)
+
+    def test_analysis_is_claimed_once(self):
+        analysis = AIAnalysis.objects.create(
+            project=self.project, data=self.data, title='t', description='t',
+            analysis_type='descriptive_stats', requested_by=self.owner,
+        )
+        self.assertEqual(claim_analysis().pk, analysis.pk)
+        self.assertIsNone(claim_analysis())
+
+class AnalysisResultCacheTests(AnalysisTestCase):
+    def _create(self, **parameters):
+        return AIAnalysis.objects.create(
+            project=self.project, data=self.data, title='t', description='t',
+            analysis_type='descriptive_stats', parameters=parameters, requested_by=self.owner,
+        )
+
+    def test_equivalent_parameters_reuse_cached_result(self):
+        first = self._run('descriptive_stats', columns=['x', 'y'], ddof=1)
+        self.assertFalse(first.cache_hit)
+        self.assertEqual(AnalysisResult.objects.count(), 1)
+
+        self.data.refresh_from_db()
+        second = self._create(ddof=1.0, columns=['x', 'y'])
+        submit_analysis(second)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'completed')
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(second.result_key, first.result_key)
+        self.assertEqual(second.results, first.results)
+        self.assertEqual(AnalysisResult.objects.get().hit_count, 1)
+
+    def test_changed_file_or_version_misses_cache(self):
+        first = self._run('descriptive_stats', columns=['x'])
+        self.data.version = '2.0'
+        self.data.save()
+        second = self._run('descriptive_stats', columns=['x'])
+        self.assertFalse(second.cache_hit)
+        self.assertNotEqual(second.result_key, first.result_key)
+
+    def test_in_flight_duplicates_share_one_run(self):
+        self.data.checksum = hashlib.sha256(self.data.file.read()).hexdigest()
+        self.data.save()
+        first, duplicate = self._create(columns=['x']), self._create(columns=['x'])
+        with mock.patch('research.analysis.schedule_analysis') as schedule:
+            submit_analysis(first)
+            submit_analysis(duplicate)
+        self.assertEqual(schedule.call_count, 2)
+
+        claimed = claim_analysis()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertIsNone(claim_analysis())
+        run_analysis(claimed)
+
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.status, 'completed')
+        self.assertTrue(duplicate.cache_hit)
+        self.assertEqual(duplicate.results, claimed.results)
+
+    @override_settings(RESEARCH_ANALYSIS_STALE_AFTER=60)
+    def test_stale_processing_analysis_is_requeued(self):
+        stuck = self._create(columns=['x'])
+        self.assertEqual(claim_analysis().pk, stuck.pk)
+        AIAnalysis.objects.filter(pk=stuck.pk).update(started_at=timezone.now() - timedelta(minutes=5))
+
+        with mock.patch('research.analysis.schedule_analysis') as schedule:
+            submit_analysis(self._create(columns=['y']))
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, 'pending')
+        self.assertIn(stuck.pk, [call.args[0].pk for call in schedule.call_args_list])
+
+    @override_settings(RESEARCH_ANALYSIS_STALE_AFTER=60)
+    def test_stuck_analysis_does_not_block_duplicates(self):
+        self.data.checksum = hashlib.sha256(self.data.file.read()).hexdigest()
+        self.data.save()
+        stuck, duplicate = self._create(columns=['x']), self._create(columns=['x'])
+        stuck.result_key = duplicate.result_key = compute_result_key(stuck, self.data.checksum)
+        stuck.save()
+        duplicate.save()
+        self.assertEqual(claim_analysis().pk, stuck.pk)
+        self.assertIsNone(claim_analysis())
+
+        AIAnalysis.objects.filter(pk=stuck.pk).update(started_at=timezone.now() - timedelta(minutes=5))
+        # The expired run no longer holds back its duplicate, and is itself reclaimed.
+        self.assertEqual(claim_analysis(duplicate.pk).pk, duplicate.pk)
+        reclaimed = claim_analysis()
+        self.assertEqual(reclaimed.pk, stuck.pk)
+        self.assertGreater(reclaimed.started_at, timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(claim_analysis())
+
+    @override_settings(RESEARCH_ANALYSIS_RETRY_INTERVAL=0.01)
+    def test_scheduled_duplicate_waits_for_shared_outcome(self):
+        self.data.checksum = hashlib.sha256(self.data.file.read()).hexdigest()
+        self.data.save()
+        first, duplicate = self._create(columns=['x']), self._create(columns=['x'])
+        first.result_key = duplicate.result_key = compute_result_key(first, self.data.checksum)
+        first.save()
+        duplicate.save()
+        claimed = claim_analysis(first.pk)
+
+        retried = threading.Event()
+        original = analysis_module.process_analysis
+        def process(analysis_id):
+            result = original(analysis_id)
+            if result is None:
+                retried.set()
+            return result
+        with mock.patch('research.analysis.process_analysis', side_effect=process), \
+                mock.patch('research.analysis.analysis_pool.submit', side_effect=lambda fn: fn()), \
+                mock.patch('research.analysis.transaction.on_commit', side_effect=lambda fn: fn()), \
+                mock.patch('research.analysis.threading.Timer') as timer:
+            schedule_analysis(duplicate)
+            self.assertTrue(retried.is_set())
+            timer.assert_called_once()
+            run_analysis(claimed)
+            # The retry now finds the shared outcome and stops.
+            timer.call_args.args[2][0]()
+            self.assertEqual(timer.call_count, 1)
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.status, 'completed')
+
+    def test_least_recently_used_results_are_evicted(self):
+        self._run('descriptive_stats', columns=['x'])
+        self._run('descriptive_stats', columns=['y'])
+        oldest, newest = AnalysisResult.objects.order_by('last_used_at')
+        self.assertEqual(evict_cached_results(max_bytes=newest.size_bytes), 1)
+        self.assertEqual(list(AnalysisResult.objects.values_list('pk', flat=True)), [newest.pk])
+
+@override_settings(RESEARCH_ANALYSIS_CHUNK_ROWS=4)
+class DatasetCacheTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.temp_dir)
+        self.settings_override.enable()
+
+        owner = User.objects.create_user(username='owner', password='testpassword')
+        project = ResearchProject.objects.create(title='Cache', description='Test', owner=owner)
+        self.data = ResearchData(project=project, title='Dataset', description='Test', data_type='raw', uploaded_by=owner)
+        rows = ['a,b,name'] + [f'{i},{i * 0.5},n{i}' for i in range(10)]
+        self.data.file.save('values.csv', ContentFile('\n'.join(rows).encode()))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _collect(self, dataset, columns):
+        chunks = list(dataset.iter_chunks(columns))
+        return {name: [float(v) for chunk in chunks for v in chunk[name]] for name in columns}, len(chunks)
+
+    def test_second_pass_reads_memory_mapped_cache(self):
+        parsed, chunk_count = self._collect(Dataset(self.data), ['a', 'b'])
+        self.assertEqual(chunk_count, 3)
+        self.assertTrue(os.path.exists(os.path.join(get_cache_dir(self.data), 'manifest.json')))
+
+        dataset = Dataset(self.data)
+        with mock.patch.object(Dataset, '_iter_source', side_effect=AssertionError('source was parsed')):
+            cached, _ = self._collect(dataset, ['a', 'b'])
+            self.assertEqual(dataset.numeric_columns(), ['a', 'b'])
+        self.assertEqual(cached, parsed)
+        chunk = next(dataset.iter_chunks(['a']))
+        self.assertIsInstance(chunk['a'].base, np.memmap)
+
+    def test_partial_pass_does_not_publish_cache(self):
+        next(Dataset(self.data).iter_chunks(['a']))
+        self.assertFalse(os.path.exists(get_cache_dir(self.data)))
+
+    def test_cache_is_rebuilt_when_source_changes(self):
+        Dataset(self.data).build_cache()
+        with open(self.data.file.path, 'w') as fh:
+            fh.write('a,b,name\n100,1,x\n')
+        values, _ = self._collect(Dataset(self.data), ['a'])
+        self.assertEqual(values['a'], [100.0])
+
+    def test_cache_removed_with_dataset(self):
+        Dataset(self.data).build_cache()
+        cache_dir = get_cache_dir(self.data)
+        self.data.delete()
+        self.assertFalse(os.path.exists(cache_dir))
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.stranger = User.objects.create_user(username='stranger', password='testpassword')
+        self.project = ResearchProject.objects.create(title='Threads', description='Test', owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _comment(self, content, parent=None):
+        return Comment.objects.create(project=self.project, author=self.owner, content=content, parent=parent)
+
+    def test_threads_are_nested_with_constant_queries(self):
+        first = self._comment('first')
+        reply = self._comment('reply', first)
+        self._comment('nested', reply)
+        self._comment('second reply', first)
+        self._comment('second')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/research/comments/threads/', {'project': self.project.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 4)
+        self.assertEqual(response.data['count'], 2)
+        threads = response.data['results']
+        self.assertEqual([t['content'] for t in threads], ['first', 'second'])
+        self.assertEqual([r['content'] for r in threads[0]['replies']], ['reply', 'second reply'])
+        self.assertEqual(threads[0]['replies'][0]['replies'][0]['content'], 'nested')
+
+    def test_reparenting_moves_subtree_path(self):
+        first, second = self._comment('first'), self._comment('second')
+        reply = self._comment('reply', first)
+        nested = self._comment('nested', reply)
+        reply.parent = second
+        reply.save()
+        nested.refresh_from_db()
+        self.assertTrue(nested.path.startswith(second.path))
+
+        response = self.client.patch(f'/api/research/comments/{second.pk}/', {'parent': nested.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_nesting_depth_is_limited(self):
+        comment = self._comment('level 1')
+        for level in range(2, Comment.MAX_DEPTH + 1):
+            comment = self._comment(f'level {level}', comment)
+        self.assertEqual(comment.depth, Comment.MAX_DEPTH)
+
+        response = self.client.post('/api/research/comments/', {
+            'project': self.project.pk, 'content': 'too deep', 'parent': comment.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.data)
+
+        # Moving a two-level subtree under the deepest allowed parent would overflow too.
+        top = self._comment('top')
+        self._comment('child', top)
+        response = self.client.patch(f'/api/research/comments/{top.pk}/', {'parent': comment.parent_id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_private_project_threads_require_membership(self):
+        self.client.force_authenticate(self.stranger)
+        response = self.client.get('/api/research/comments/threads/', {'project': self.project.pk})
+        self.assertEqual(response.status_code, 403)
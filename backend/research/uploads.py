@@ -0,0 +1,216 @@
+"""
+Chunked, resumable uploads for research datasets.
+
+Each upload session gets a staging directory. Parts are streamed from the
+request body to a temporary file unique to that write (so two concurrent
+sends of the same part cannot interleave) in fixed-size reads and
+atomically renamed to ``<n>.part`` once their size (and optional checksum)
+is verified, so the set of ``.part`` files on disk is always the
+authoritative list of received parts and a client can resume by re-sending
+whatever is missing.
+
+A session that is aborted, or that receives nothing for
+``RESEARCH_UPLOAD_EXPIRY`` seconds (see ``cleanup_research_uploads``), is
+marked ``aborted`` and its staging directory removed.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ResearchData, ResearchUpload
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+class UploadError(Exception):
+    """Raised when a part or the assembled file fails validation."""
+
+class AssembledUploadFile(File):
+    """
+    Wrap the assembled staging file so FileSystemStorage moves it into
+    place (``temporary_file_path`` support) instead of copying it again.
+    """
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+def get_chunk_size():
+    return getattr(settings, 'RESEARCH_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+def get_upload_expiry():
+    return getattr(settings, 'RESEARCH_UPLOAD_EXPIRY', 24 * 60 * 60)
+
+def _base_dir():
+    return getattr(settings, 'RESEARCH_UPLOAD_TEMP_DIR', os.path.join(settings.BASE_DIR, 'research_uploads'))
+
+def get_upload_dir(upload):
+    return os.path.join(_base_dir(), str(upload.id))
+
+def _part_path(upload, part_number):
+    return os.path.join(get_upload_dir(upload), f'{part_number:06d}.part')
+
+def received_parts(upload):
+    """Return ``{part_number: size}`` for every verified part on disk."""
+    upload_dir = get_upload_dir(upload)
+    if not os.path.isdir(upload_dir):
+        return {}
+    parts = {}
+    for entry in os.scandir(upload_dir):
+        if entry.name.endswith('.part'):
+            parts[int(entry.name[:-len('.part')])] = entry.stat().st_size
+    return dict(sorted(parts.items()))
+
+def write_part(upload, part_number, stream, expected_checksum=''):
+    """
+    Stream one part from ``stream`` to disk without buffering it in memory.
+
+    Returns ``(size, sha256)`` of the stored part. Re-sending a part that was
+    already received simply replaces it.
+    """
+    if not 1 <= part_number <= upload.part_count:
+        raise UploadError(f"Part number must be between 1 and {upload.part_count}")
+
+    expected_size = upload.expected_part_size(part_number)
+    upload_dir = get_upload_dir(upload)
+    os.makedirs(upload_dir, exist_ok=True)
+    final_path = _part_path(upload, part_number)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{part_number:06d}.', suffix='.tmp', dir=upload_dir)
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            while True:
+                chunk = stream.read(READ_SIZE) if stream is not None else b''
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > expected_size:
+                    raise UploadError(f"Part {part_number} exceeds the expected size of {expected_size} bytes")
+                hasher.update(chunk)
+                fh.write(chunk)
+        if size != expected_size:
+            raise UploadError(f"Part {part_number} is {size} bytes, expected {expected_size}")
+        digest = hasher.hexdigest()
+        if expected_checksum and expected_checksum.lower() != digest:
+            raise UploadError(f"Checksum mismatch for part {part_number}")
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Parts do not save the session, so record the activity for expiry.
+    ResearchUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now())
+    return size, digest
+
+def complete_upload(upload):
+    """
+    Concatenate all parts, verify the whole-file checksum and store the
+    result as a new ResearchData under its usual ``upload_to`` path.
+    """
+    parts = received_parts(upload)
+    missing = [n for n in range(1, upload.part_count + 1) if n not in parts]
+    if missing:
+        raise UploadError(f"Missing parts: {missing}")
+
+    upload_dir = get_upload_dir(upload)
+    assembled_path = os.path.join(upload_dir, 'assembled')
+    hasher = hashlib.sha256()
+    with open(assembled_path, 'wb') as out:
+        for part_number in range(1, upload.part_count + 1):
+            with open(_part_path(upload, part_number), 'rb') as fh:
+                while True:
+                    chunk = fh.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    out.write(chunk)
+    digest = hasher.hexdigest()
+    if upload.checksum and upload.checksum.lower() != digest:
+        os.remove(assembled_path)
+        raise UploadError("Checksum mismatch for assembled file")
+
+    data = ResearchData(
+        project=upload.project,
+        title=upload.title,
+        description=upload.description,
+        data_type=upload.data_type,
+        uploaded_by=upload.uploaded_by,
+        version=upload.version,
+        checksum=digest,
+    )
+    content = AssembledUploadFile(assembled_path, upload.filename)
+    try:
+        data.file.save(upload.filename, content, save=False)
+    finally:
+        content.close()
+    data.save()
+
+    upload.data = data
+    upload.status = 'completed'
+    upload.save(update_fields=['data', 'status', 'updated_at'])
+    discard_parts(upload)
+    logger.info(f"Assembled upload {upload.id} into research data {data.id} ({upload.total_size} bytes)")
+    return data
+
+def discard_parts(upload):
+    """Remove the staging directory for an upload."""
+    shutil.rmtree(get_upload_dir(upload), ignore_errors=True)
+
+def abort_upload(upload):
+    """Mark an upload session aborted and remove its parts."""
+    upload.status = 'aborted'
+    upload.save(update_fields=['status', 'updated_at'])
+    discard_parts(upload)
+    logger.info(f"Aborted upload {upload.id}")
+
+def expire_uploads(max_age=None):
+    """
+    Abort upload sessions idle for more than ``max_age`` seconds (default
+    ``RESEARCH_UPLOAD_EXPIRY``) and remove staging directories that no
+    longer belong to an open session.
+
+    Returns ``(expired_sessions, removed_directories)``.
+    """
+    max_age = get_upload_expiry() if max_age is None else max_age
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+
+    expired = 0
+    stale = ResearchUpload.objects.filter(status='uploading', updated_at__lt=cutoff)
+    for pk in stale.values_list('pk', flat=True):
+        with transaction.atomic():
+            # Re-check under the lock: a part or ``complete`` may have arrived since.
+            upload = stale.select_for_update().filter(pk=pk).first()
+            if upload is None:
+                continue
+            abort_upload(upload)
+            expired += 1
+
+    # Directories left behind by aborted or deleted sessions, or by a part
+    # that was still being written when its session was aborted. Only old
+    # ones are touched, so a session created during this sweep is safe.
+    removed = 0
+    base_dir = _base_dir()
+    if os.path.isdir(base_dir):
+        open_ids = {str(pk) for pk in ResearchUpload.objects.filter(status='uploading').values_list('pk', flat=True)}
+        for entry in os.scandir(base_dir):
+            if not entry.is_dir() or entry.name in open_ids:
+                continue
+            if entry.stat().st_mtime >= cutoff.timestamp():
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+
+    return expired, removed
@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register(r'profiles', views.UserProfileViewSet)
 router.register(r'projects', views.ResearchProjectViewSet)
 router.register(r'data', views.ResearchDataViewSet)
+router.register(r'uploads', views.ResearchUploadViewSet, basename='researchupload')
 router.register(r'analyses', views.AIAnalysisViewSet)
 router.register(r'comments', views.CommentViewSet)
 
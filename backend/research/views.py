@@ -1,26 +1,98 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import UserProfile, ResearchProject, ResearchData, AIAnalysis, Comment
+from .models import UserProfile, ResearchProject, ResearchData, ResearchUpload, AIAnalysis, Comment
+from .downloads import DownloadRenderer, serve_research_data
+from .ingest import schedule_ingest
+from .analysis import submit_analysis
+from .uploads import UploadError, write_part, complete_upload, abort_upload, discard_parts
 from .serializers import (
     UserProfileSerializer, ResearchProjectSerializer,
-    ResearchDataSerializer, AIAnalysisSerializer, CommentSerializer
+    ResearchDataSerializer, ResearchUploadSerializer, AIAnalysisSerializer, CommentSerializer,
+    ResearchProjectSummarySerializer, ResearchDataSummarySerializer,
+    AIAnalysisSummarySerializer
 )
 
 class IsOwnerOrCollaborator(permissions.BasePermission):
+    """
+    Object-level access for projects and the data, analyses and comments
+    that hang off them.
+
+    Project access is resolved with a single query per project (owner,
+    visibility and an EXISTS check on the collaborators table) and cached on
+    the request, so checking many objects from the same project does not
+    reload the collaborator list each time.
+    """
+    cache_attr = '_research_project_access'
+
     def has_object_permission(self, request, view, obj):
-        if request.method in permissions.SAFE_METHODS and obj.is_public:
+        if isinstance(obj, ResearchProject):
+            if request.method in permissions.SAFE_METHODS and obj.is_public:
+                return True
+            return obj.owner_id == request.user.pk
+        project_id = getattr(obj, 'project_id', None)
+        if project_id is None:
+            return False
+        access = self.get_project_access(request, project_id)
+        if access is None:
+            return False
+        if request.method in permissions.SAFE_METHODS and access['is_public']:
             return True
-        if hasattr(obj, 'owner'):
-            return obj.owner == request.user
-        if hasattr(obj, 'project'):
-            return (obj.project.owner == request.user or 
-                   request.user in obj.project.collaborators.all())
-        return False
+        return access['owner_id'] == request.user.pk or access['is_member']
+
+    @classmethod
+    def get_project_access(cls, request, project_id):
+        """Return owner/visibility/membership for a project, cached per request."""
+        cache = getattr(request, cls.cache_attr, None)
+        if cache is None:
+            cache = {}
+            setattr(request, cls.cache_attr, cache)
+        if project_id not in cache:
+            memberships = ResearchProject.collaborators.through.objects.filter(
+                researchproject_id=models.OuterRef('pk'),
+                user_id=request.user.pk,
+            )
+            cache[project_id] = (
+                ResearchProject.objects
+                .filter(pk=project_id)
+                .annotate(is_member=models.Exists(memberships))
+                .values('owner_id', 'is_public', 'is_member')
+                .first()
+            )
+        return cache[project_id]
+
+class SummaryViewMixin:
+    """
+    Read-only payload shaping for research viewsets.
+
+    ``?view=summary`` swaps in ``summary_serializer_class`` and
+    ``?fields=a,b,c`` drops every other field from the serialized rows.
+    """
+    summary_serializer_class = None
+
+    def is_summary_view(self):
+        return (
+            self.summary_serializer_class is not None
+            and self.request.method in permissions.SAFE_METHODS
+            and self.request.query_params.get('view') == 'summary'
+        )
+
+    def get_serializer_class(self):
+        if self.is_summary_view():
+            return self.summary_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.request.query_params.get('fields')
+        if fields and self.request.method in permissions.SAFE_METHODS:
+            kwargs['fields'] = [name.strip() for name in fields.split(',') if name.strip()]
+        return super().get_serializer(*args, **kwargs)
 
 class UserProfileViewSet(viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
@@ -30,13 +102,15 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     search_fields = ['user__username', 'institution', 'research_interests']
 
     def get_queryset(self):
+        queryset = UserProfile.objects.select_related('user')
         if self.action == 'list':
-            return UserProfile.objects.filter(user=self.request.user)
-        return UserProfile.objects.all()
+            return queryset.filter(user=self.request.user)
+        return queryset
 
-class ResearchProjectViewSet(viewsets.ModelViewSet):
+class ResearchProjectViewSet(SummaryViewMixin, viewsets.ModelViewSet):
     queryset = ResearchProject.objects.all()
     serializer_class = ResearchProjectSerializer
+    summary_serializer_class = ResearchProjectSummarySerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrCollaborator]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'is_public']
@@ -45,11 +119,19 @@ class ResearchProjectViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return ResearchProject.objects.filter(
+        queryset = ResearchProject.objects.filter(
             models.Q(owner=user) |
             models.Q(collaborators=user) |
             models.Q(is_public=True)
         ).distinct()
+        if self.is_summary_view():
+            return queryset.select_related('owner').prefetch_related(
+                models.Prefetch('collaborators', queryset=User.objects.only('id'))
+            ).annotate(
+                data_sets_count=models.Count('data_sets', distinct=True),
+                ai_analyses_count=models.Count('ai_analyses', distinct=True),
+            ).order_by('-created_at')
+        return queryset.select_related('owner').prefetch_related('collaborators')
 
     @action(detail=True, methods=['post'])
     def add_collaborator(self, request, pk=None):
@@ -67,9 +149,10 @@ class ResearchProjectViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=404)
 
-class ResearchDataViewSet(viewsets.ModelViewSet):
+class ResearchDataViewSet(SummaryViewMixin, viewsets.ModelViewSet):
     queryset = ResearchData.objects.all()
     serializer_class = ResearchDataSerializer
+    summary_serializer_class = ResearchDataSummarySerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrCollaborator]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['data_type', 'project']
@@ -81,11 +164,105 @@ class ResearchDataViewSet(viewsets.ModelViewSet):
             models.Q(project__owner=user) |
             models.Q(project__collaborators=user) |
             models.Q(project__is_public=True)
-        ).distinct()
+        ).distinct().select_related('uploaded_by')
+
+    def perform_create(self, serializer):
+        data = serializer.save()
+        schedule_ingest(data)
+
+    def perform_update(self, serializer):
+        if 'file' in serializer.validated_data:
+            # A new file invalidates the stored checksum (and so cached analysis results).
+            data = serializer.save(checksum='')
+            schedule_ingest(data)
+        else:
+            serializer.save()
+
+    @action(detail=True, methods=['get'],
+            renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [DownloadRenderer])
+    def download(self, request, pk=None):
+        """
+        Stream the dataset file with Range and conditional request support,
+        or hand it to the web server when a sendfile backend is configured.
+        """
+        data = self.get_object()
+        if not data.file:
+            return Response({'error': 'No file attached'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_research_data(request, data)
+
+class ResearchUploadViewSet(mixins.CreateModelMixin,
+                            mixins.RetrieveModelMixin,
+                            mixins.DestroyModelMixin,
+                            viewsets.GenericViewSet):
+    """
+    Chunked, resumable dataset uploads.
+
+    POST ``uploads/`` starts a session, PUT ``uploads/<id>/parts/<n>/`` sends
+    part ``n`` as the raw request body (optionally with an ``X-Part-Checksum``
+    SHA-256 header), GET ``uploads/<id>/`` lists received parts for resuming,
+    POST ``uploads/<id>/complete/`` assembles the ResearchData file, and
+    POST ``uploads/<id>/abort/`` abandons the session and frees its parts.
+    """
+    serializer_class = ResearchUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ResearchUpload.objects.filter(uploaded_by=self.request.user)
+
+    def perform_create(self, serializer):
+        project = serializer.validated_data['project']
+        access = IsOwnerOrCollaborator.get_project_access(self.request, project.pk)
+        if not access or not (access['owner_id'] == self.request.user.pk or access['is_member']):
+            raise PermissionDenied('Only project owners and collaborators can upload data')
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        discard_parts(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['put'], url_path=r'parts/(?P<part_number>[0-9]+)')
+    def upload_part(self, request, pk=None, part_number=None):
+        upload = self.get_object()
+        if upload.status != 'uploading':
+            return Response({'error': f'Upload is {upload.status}'}, status=status.HTTP_409_CONFLICT)
+        try:
+            size, checksum = write_part(
+                upload, int(part_number), request.stream,
+                expected_checksum=request.headers.get('X-Part-Checksum', ''),
+            )
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'part': int(part_number), 'size': size, 'checksum': checksum})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        self.get_object()
+        with transaction.atomic():
+            upload = ResearchUpload.objects.select_for_update().select_related('project', 'uploaded_by').get(pk=pk)
+            if upload.status != 'uploading':
+                return Response({'error': f'Upload is {upload.status}'}, status=status.HTTP_409_CONFLICT)
+            try:
+                data = complete_upload(upload)
+            except UploadError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            schedule_ingest(data)
+        serializer = ResearchDataSerializer(data, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def abort(self, request, pk=None):
+        self.get_object()
+        with transaction.atomic():
+            upload = ResearchUpload.objects.select_for_update().get(pk=pk)
+            if upload.status != 'uploading':
+                return Response({'error': f'Upload is {upload.status}'}, status=status.HTTP_409_CONFLICT)
+            abort_upload(upload)
+        return Response(self.get_serializer(upload).data)
 
-class AIAnalysisViewSet(viewsets.ModelViewSet):
+class AIAnalysisViewSet(SummaryViewMixin, viewsets.ModelViewSet):
     queryset = AIAnalysis.objects.all()
     serializer_class = AIAnalysisSerializer
+    summary_serializer_class = AIAnalysisSummarySerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrCollaborator]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['status', 'analysis_type', 'project']
@@ -97,7 +274,11 @@ class AIAnalysisViewSet(viewsets.ModelViewSet):
             models.Q(project__owner=user) |
             models.Q(project__collaborators=user) |
             models.Q(project__is_public=True)
-        ).distinct()
+        ).distinct().select_related('requested_by')
+
+    def perform_create(self, serializer):
+        analysis = serializer.save()
+        submit_analysis(analysis)
 
     @action(detail=True, methods=['post'])
     def retry_analysis(self, request, pk=None):
@@ -108,10 +289,10 @@ class AIAnalysisViewSet(viewsets.ModelViewSet):
         analysis.status = 'pending'
         analysis.error_message = ''
         analysis.save()
-        # Here you would typically trigger your async analysis task
+        submit_analysis(analysis)
         return Response({'status': 'analysis queued'})
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SummaryViewMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrCollaborator]
@@ -124,4 +305,55 @@ class CommentViewSet(viewsets.ModelViewSet):
             models.Q(project__owner=user) |
             models.Q(project__collaborators=user) |
             models.Q(project__is_public=True)
-        ).distinct() 
\ No newline at end of file
+        ).distinct().select_related('author')
+
+    @action(detail=False, methods=['get'])
+    def threads(self, request):
+        """
+        Comment threads for ``?project=<id>``, paginated by top-level comment.
+
+        Each page costs a fixed number of queries however deep the threads
+        go: the page of roots, then every descendant of those roots in one
+        query by materialized path, assembled into nested ``replies``.
+        """
+        project_id = request.query_params.get('project')
+        if not project_id or not project_id.isdigit():
+            return Response({'error': 'project is required'}, status=400)
+        access = IsOwnerOrCollaborator.get_project_access(request, int(project_id))
+        if access is None:
+            return Response({'error': 'Project not found'}, status=404)
+        if not (access['is_public'] or access['owner_id'] == request.user.pk or access['is_member']):
+            raise PermissionDenied()
+
+        roots = Comment.objects.filter(project_id=project_id, parent__isnull=True).order_by('created_at', 'pk')
+        page = self.paginate_queryset(roots.values_list('path', flat=True))
+        paths = page if page is not None else list(roots.values_list('path', flat=True))
+        comments = []
+        if paths:
+            subtree = models.Q()
+            for path in paths:
+                subtree |= models.Q(path__startswith=path)
+            comments = Comment.objects.filter(subtree, project_id=project_id).select_related('author').order_by('path')
+        threads = build_comment_tree(CommentSerializer(comments, many=True).data)
+        if page is not None:
+            return self.get_paginated_response(threads)
+        return Response(threads)
+
+def build_comment_tree(rows):
+    """
+    Nest serialized comments under their parents in one pass.
+
+    ``rows`` must be in materialized-path order, so every parent precedes
+    its replies and siblings keep their creation order.
+    """
+    nodes = {}
+    roots = []
+    for row in rows:
+        node = {**row, 'replies': []}
+        nodes[node['id']] = node
+        parent = nodes.get(node['parent'])
+        if parent is None:
+            roots.append(node)
+        else:
+            parent['replies'].append(node)
+    return roots
@@ -20,27 +20,27 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cmsbackend.settings')
 django.setup()
 
 from django.contrib.auth.models import User
-from rest_framework.authtoken.models import Token
+from authentication.models import AuthToken
 
 def test_token(token_key):
     """Test if the token is valid and get the associated user."""
     print(f"\n----- Testing Token: {token_key[:5]}... -----")
     
-    try:
-        token = Token.objects.get(key=token_key)
+    token = AuthToken.lookup(token_key)
+    if token:
         print(f"✓ Token exists in database")
         print(f"✓ Associated user: {token.user.username} (ID: {token.user.id})")
-        print(f"✓ Token created: {token.created}")
+        print(f"✓ Token created: {token.created}, expires: {token.expires_at}")
         return token.user
-    except Token.DoesNotExist:
-        print("✗ Token does not exist in database")
+    else:
+        print("✗ Token does not exist in database or has expired")
         
         # Check if any tokens exist
-        all_tokens = Token.objects.all()
+        all_tokens = AuthToken.objects.select_related('user')
         if all_tokens.exists():
             print(f"  Info: {all_tokens.count()} tokens exist in the database")
             for t in all_tokens:
-                print(f"  - Token: {t.key[:5]}... for user: {t.user.username}")
+                print(f"  - Token: {t.prefix[:5]}... for user: {t.user.username}")
         else:
             print("  Info: No tokens exist in the database")
         return None
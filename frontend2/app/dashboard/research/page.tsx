@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
-import { ResearchProject } from '@/types/research';
+import { ResearchProjectSummary } from '@/types/research';
 import { researchApi } from '@/services/researchApi';
 import { Card, CardContent, CardHeader } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -19,7 +19,7 @@ import { PlusIcon, SearchIcon } from '@heroicons/react/24/outline';
 
 export default function ResearchDashboard() {
     const router = useRouter();
-    const [projects, setProjects] = useState<ResearchProject[]>([]);
+    const [projects, setProjects] = useState<ResearchProjectSummary[]>([]);
     const [loading, setLoading] = useState(true);
     const [searchQuery, setSearchQuery] = useState('');
     const [statusFilter, setStatusFilter] = useState('all');
@@ -38,7 +38,7 @@ export default function ResearchDashboard() {
             if (statusFilter !== 'all') {
                 params.status = statusFilter;
             }
-            const data = await researchApi.getProjects(params);
+            const data = await researchApi.getProjectSummaries(params);
             setProjects(data);
         } catch (error) {
             console.error('Error loading projects:', error);
@@ -132,7 +132,7 @@ export default function ResearchDashboard() {
                                         {project.title}
                                     </h3>
                                     <p className="text-sm text-gray-500">
-                                        by {project.owner_name}
+                                        by {project.owner.username}
                                     </p>
                                 </div>
                                 <Badge className={`${getStatusColor(project.status)} text-white`}>
@@ -144,8 +144,8 @@ export default function ResearchDashboard() {
                                     {project.description}
                                 </p>
                                 <div className="flex justify-between text-sm text-gray-500">
-                                    <span>{project.data_sets.length} datasets</span>
-                                    <span>{project.ai_analyses.length} analyses</span>
+                                    <span>{project.data_sets_count} datasets</span>
+                                    <span>{project.ai_analyses_count} analyses</span>
                                     <span>{project.collaborators.length} collaborators</span>
                                 </div>
                             </CardContent>
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { UserProfile, ResearchProject, ResearchData, AIAnalysis, Comment } from '@/types/research';
+import { UserProfile, ResearchProject, ResearchProjectSummary, ResearchData, AIAnalysis, Comment } from '@/types/research';
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
@@ -41,6 +41,16 @@ export const researchApi = {
         return response.data;
     },
 
+    // Compact rows (owner id/username, collaborator ids, counts) for dashboard tables
+    getProjectSummaries: async (params?: {
+        status?: string,
+        search?: string,
+        ordering?: string
+    }): Promise<ResearchProjectSummary[]> => {
+        const response = await api.get('/projects/', { params: { ...params, view: 'summary' } });
+        return response.data;
+    },
+
     getProject: async (id: number): Promise<ResearchProject> => {
         const response = await api.get(`/projects/${id}/`);
         return response.data;
@@ -83,6 +93,32 @@ export const researchApi = {
         return response.data;
     },
 
+    // Chunked, resumable upload for large datasets. Parts already on the
+    // server (e.g. after a dropped connection) are skipped on retry.
+    uploadDataChunked: async (
+        file: File,
+        data: { project: number, title: string, description: string, data_type: ResearchData['data_type'], version?: string },
+        onProgress?: (uploadedBytes: number, totalBytes: number) => void,
+        uploadId?: string,
+    ): Promise<ResearchData> => {
+        const session = uploadId
+            ? (await api.get(`/uploads/${uploadId}/`)).data
+            : (await api.post('/uploads/', { ...data, filename: file.name, total_size: file.size })).data;
+        const received: Record<string, number> = session.received_parts || {};
+        let uploaded = Object.values(received).reduce((total, size) => total + size, 0);
+        for (let part = 1; part <= session.part_count; part++) {
+            if (received[part] !== undefined) continue;
+            const blob = file.slice((part - 1) * session.chunk_size, part * session.chunk_size);
+            await api.put(`/uploads/${session.id}/parts/${part}/`, blob, {
+                headers: { 'Content-Type': 'application/octet-stream' },
+            });
+            uploaded += blob.size;
+            onProgress?.(uploaded, file.size);
+        }
+        const response = await api.post(`/uploads/${session.id}/complete/`);
+        return response.data;
+    },
+
     // AI Analysis
     getAnalyses: async (params?: {
         project?: number,
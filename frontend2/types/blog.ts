@@ -37,6 +37,7 @@ export interface BlogPost {
 export interface BlogPostDetail extends BlogPost {
   content: string;
   content_format: string;
+  rendered_content: string;
   created_at: string;
   updated_at: string;
   canonical_url: string;
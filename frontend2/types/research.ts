@@ -53,6 +53,9 @@ export interface AIAnalysis {
     error_message: string;
     requested_by: number;
     requested_by_name: string;
+    started_at: string | null;
+    completed_at: string | null;
+    duration_ms: number | null;
     created_at: string;
     updated_at: string;
 }
@@ -75,4 +78,24 @@ export interface ResearchProject {
     comments: Comment[];
     created_at: string;
     updated_at: string;
-} 
\ No newline at end of file
+}
+
+export interface UserSummary {
+    id: number;
+    username: string;
+}
+
+export interface ResearchProjectSummary {
+    id: number;
+    title: string;
+    slug: string;
+    description: string;
+    owner: UserSummary;
+    collaborators: number[];
+    status: 'draft' | 'active' | 'completed' | 'archived';
+    is_public: boolean;
+    data_sets_count: number;
+    ai_analyses_count: number;
+    created_at: string;
+    updated_at: string;
+}